@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+图片预处理基准测试
+对比不同预处理参数下的上传体积、OCR耗时和文字保真度（以原图OCR结果为基准）
+
+用法:
+    python3 bench_image_preprocess.py /path/to/img1.png /path/to/img2.jpg
+"""
+
+import os
+import sys
+import time
+import difflib
+import argparse
+
+# 添加modules目录到路径
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'modules'))
+
+from ocr_extractor import OCRExtractor
+from image_preprocessor import ImagePreprocessor
+
+# 待对比的预处理参数
+SETTINGS = [
+    ('jpeg-2048-gray-q85', dict(max_long_edge=2048, grayscale=True, output_format='JPEG', quality=85)),
+    ('jpeg-1600-gray-q85', dict(max_long_edge=1600, grayscale=True, output_format='JPEG', quality=85)),
+    ('jpeg-1600-color-q85', dict(max_long_edge=1600, grayscale=False, output_format='JPEG', quality=85)),
+    ('jpeg-1280-gray-q75', dict(max_long_edge=1280, grayscale=True, output_format='JPEG', quality=75)),
+    ('jpeg-1024-gray-q70', dict(max_long_edge=1024, grayscale=True, output_format='JPEG', quality=70)),
+    ('webp-1600-gray-q80', dict(max_long_edge=1600, grayscale=True, output_format='WEBP', quality=80)),
+]
+
+
+def text_fidelity(reference, text):
+    """文字保真度（与基准文字的相似度，0-1）"""
+    return difflib.SequenceMatcher(None, reference, text).ratio()
+
+
+def run_ocr(extractor, image_path):
+    """执行一次OCR，返回(文字, 上传字节数, 耗时)"""
+    before = extractor.preprocessor.stats['processed_bytes']
+    start = time.time()
+    text, _ = extractor.extract_text(image_path)
+    elapsed = time.time() - start
+    return text, extractor.preprocessor.stats['processed_bytes'] - before, elapsed
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description='图片预处理基准测试')
+    parser.add_argument('images', nargs='+', help='测试图片路径')
+    args = parser.parse_args()
+
+    images = [p for p in args.images if os.path.exists(p)]
+    if not images:
+        print("❌ 没有可用的测试图片")
+        return 1
+
+    print("=" * 80)
+    print(f"图片预处理基准测试（{len(images)}张图片）")
+    print("=" * 80)
+
+    # 基准：原图直接上传
+    baseline = OCRExtractor(preprocessor=ImagePreprocessor(enabled=False))
+    references = {}
+    base_bytes = 0
+    base_time = 0
+    for path in images:
+        text, size, elapsed = run_ocr(baseline, path)
+        references[path] = text
+        base_bytes += size
+        base_time += elapsed
+
+    print(f"{'参数':<22}{'体积':>12}{'节省':>8}{'平均耗时':>10}{'保真度':>10}")
+    print("-" * 80)
+    print(f"{'raw':<22}{base_bytes / 1024:>10.0f}KB{'0%':>8}"
+          f"{base_time / len(images):>9.2f}s{1.0:>10.3f}")
+
+    for name, options in SETTINGS:
+        extractor = OCRExtractor(preprocessor=ImagePreprocessor(**options))
+        total_bytes = 0
+        total_time = 0
+        fidelity = []
+
+        for path in images:
+            text, size, elapsed = run_ocr(extractor, path)
+            total_bytes += size
+            total_time += elapsed
+            fidelity.append(text_fidelity(references[path], text))
+
+        saved = 1 - total_bytes / base_bytes if base_bytes else 0
+        print(f"{name:<22}{total_bytes / 1024:>10.0f}KB{saved:>8.0%}"
+              f"{total_time / len(images):>9.2f}s{sum(fidelity) / len(fidelity):>10.3f}")
+
+    print("=" * 80)
+    print("💡 保真度为与原图OCR结果的文字相似度，建议选择保真度≥0.98且体积最小的参数")
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
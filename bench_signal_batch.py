@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+批量评分基准测试
+对比逐条调用SignalAnalyzer.predict_smile与BatchSignalScorer向量化评分的耗时
+
+用法:
+    python3 bench_signal_batch.py --records 10000 --configs 1000
+"""
+
+import os
+import sys
+import time
+import random
+import argparse
+
+# 添加modules目录到路径
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'modules'))
+
+from signal_analyzer import SignalAnalyzer
+from signal_batch import BatchSignalScorer
+from test_signal_batch import random_record
+
+
+def timed(func, *args, **kwargs):
+    """执行函数，返回(结果, 耗时)"""
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description='批量评分基准测试')
+    parser.add_argument('--records', type=int, default=10000, help='历史记录条数')
+    parser.add_argument('--configs', type=int, default=1000, help='同时评估的配置组数')
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    records = [random_record(rng) for _ in range(args.records)]
+
+    analyzer = SignalAnalyzer()
+    scorer = BatchSignalScorer(analyzer)
+
+    print("=" * 60)
+    print(f"批量评分基准测试（{args.records}条记录）")
+    print("=" * 60)
+
+    _, loop_time = timed(lambda: [analyzer.predict_smile(r) for r in records])
+    columns, encode_time = timed(scorer.encode, records)
+    _, score_time = timed(scorer.score, columns)
+
+    print(f"{'逐条predict_smile':<24}{loop_time * 1000:>10.1f}ms")
+    print(f"{'批量编码（一次）':<24}{encode_time * 1000:>10.1f}ms")
+    print(f"{'批量评分':<24}{score_time * 1000:>10.1f}ms"
+          f"{loop_time / max(score_time, 1e-9):>10.0f}x")
+
+    # 回测场景：编码一次，评估多组权重
+    values = [rng.uniform(0, 5) for _ in range(args.configs)]
+    _, grid_time = timed(scorer.score, columns, weights={'market_cycle': values})
+    print(f"{f'{args.configs}组配置':<24}{grid_time * 1000:>10.1f}ms"
+          f"{args.configs / grid_time:>10.0f}组/秒")
+    print(f"{'逐条循环等效':<24}{loop_time * args.configs:>10.1f}s")
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -7,22 +7,25 @@
 功能：
 1. 笑脸反馈收集（企业微信交互）
 2. 每日性能统计
-3. 每周性能评估报告
-4. 模型优化建议
+3. 每周/每月/任意时间段性能评估报告
+4. 季度趋势报告
+5. 模型优化建议
+
+报告由daily_metrics汇总表（按日期和预测类型累计）计算，耗时只与天数有关
 """
 
 import os
 import sys
 import json
-import sqlite3
 import logging
 from datetime import datetime, timedelta
-from collections import defaultdict
 
 # 添加当前目录到路径
 sys.path.insert(0, os.path.dirname(__file__))
 
-from maoge_image_handler import MaogeImageHandler, send_wechat_message, MaogeConfig
+from maoge_image_handler import (MaogeImageHandler, send_wechat_message, MaogeConfig,
+                                 parse_feedback_text, format_feedback_summary)
+from prediction_store import PredictionRepository
 
 # 配置日志
 logger = logging.getLogger('feedback_manager')
@@ -43,6 +46,9 @@ class FeedbackManager:
         self.db_path = db_path or MaogeConfig.DB_PATH
         self.handler = MaogeImageHandler()
         
+        # 报告查询通过统一的数据访问层（predictions视图）
+        self.repo = PredictionRepository(self.db_path)
+        
         logger.info(f"反馈管理器初始化完成，数据库: {self.db_path}")
     
     def collect_feedback_interactive(self):
@@ -88,26 +94,10 @@ class FeedbackManager:
             list: 待反馈记录列表
         """
         try:
-            conn = sqlite3.connect(self.db_path)
-            conn.row_factory = sqlite3.Row
-            cursor = conn.cursor()
-            
             # 查询待反馈记录
             since_date = (datetime.now() - timedelta(days=days)).strftime('%Y-%m-%d')
             
-            cursor.execute("""
-                SELECT id, date, predicted_smile, confidence, predicted_count
-                FROM predictions
-                WHERE actual_smile IS NULL
-                AND date >= ?
-                ORDER BY date DESC
-            """, (since_date,))
-            
-            records = [dict(row) for row in cursor.fetchall()]
-            
-            conn.close()
-            
-            return records
+            return self.repo.pending_feedback(since_date)
             
         except Exception as e:
             logger.error(f"查询待反馈记录异常: {e}", exc_info=True)
@@ -115,48 +105,25 @@ class FeedbackManager:
     
     def batch_feedback(self, feedbacks):
         """
-        批量反馈
+        批量反馈（全部条目在一个事务中写入，只触发一次模型优化）
         
         Args:
             feedbacks: 反馈列表，格式 [(id, actual_smile, actual_count), ...]
         
         Returns:
-            dict: 反馈结果统计
+            dict: 反馈结果统计，results为逐条结果
         """
-        success_count = 0
-        fail_count = 0
-        
-        for prediction_id, actual_smile, actual_count in feedbacks:
-            try:
-                success = self.handler.save_feedback(
-                    prediction_id=prediction_id,
-                    actual_smile=actual_smile,
-                    actual_count=actual_count
-                )
-                
-                if success:
-                    success_count += 1
-                else:
-                    fail_count += 1
-                    
-            except Exception as e:
-                logger.error(f"保存反馈异常: ID={prediction_id}, {e}")
-                fail_count += 1
-        
-        # 发送反馈结果
-        msg = f"""📝 批量反馈完成
-
-✅ 成功: {success_count}条
-❌ 失败: {fail_count}条
-
-系统已根据反馈优化模型。"""
+        results = self.handler.save_feedbacks(feedbacks)
+        success_count = sum(1 for r in results if r['success'])
         
-        send_wechat_message(msg)
+        # 发送反馈结果（逐条列出）
+        send_wechat_message(format_feedback_summary(results))
         
         return {
             'success': success_count,
-            'fail': fail_count,
-            'total': success_count + fail_count
+            'fail': len(results) - success_count,
+            'total': len(results),
+            'results': results
         }
     
     def generate_daily_report(self, date=None):
@@ -173,45 +140,24 @@ class FeedbackManager:
             date = (datetime.now() - timedelta(days=1)).strftime('%Y-%m-%d')
         
         try:
-            conn = sqlite3.connect(self.db_path)
-            conn.row_factory = sqlite3.Row
-            cursor = conn.cursor()
-            
-            # 查询当天的预测和反馈
-            cursor.execute("""
-                SELECT 
-                    COUNT(*) as total,
-                    SUM(CASE WHEN actual_smile IS NOT NULL THEN 1 ELSE 0 END) as feedback_count,
-                    SUM(CASE WHEN predicted_smile = actual_smile THEN 1 ELSE 0 END) as correct_count,
-                    AVG(confidence) as avg_confidence
-                FROM predictions
-                WHERE date = ?
-            """, (date,))
-            
-            stats = dict(cursor.fetchone())
-            
-            conn.close()
-            
-            # 计算准确率
-            if stats['feedback_count'] and stats['feedback_count'] > 0:
-                accuracy = stats['correct_count'] / stats['feedback_count'] * 100
-            else:
-                accuracy = 0
+            # 汇总当天的预测和反馈
+            stats = self.repo.statistics(date, date)
+            accuracy = stats['accuracy'] * 100
             
             # 生成报告
             report = f"""📊 每日性能报告 - {date}
 
 📈 预测统计:
 • 总预测数: {stats['total']}
-• 已反馈数: {stats['feedback_count']}
-• 预测正确: {stats['correct_count']}
+• 已反馈数: {stats['verified']}
+• 预测正确: {stats['correct']}
 • 平均置信度: {stats['avg_confidence']:.1%}
 
 🎯 准确率: {accuracy:.1f}%
 
 """
             
-            if stats['feedback_count'] == 0:
+            if stats['verified'] == 0:
                 report += "⚠️ 今日暂无反馈数据\n"
             elif accuracy >= 80:
                 report += "🎉 表现优秀！\n"
@@ -241,55 +187,52 @@ class FeedbackManager:
         
         start_date = (datetime.strptime(end_date, '%Y-%m-%d') - timedelta(days=6)).strftime('%Y-%m-%d')
         
+        return self.generate_period_report(start_date, end_date, title='每周性能评估报告', period='本周')
+    
+    def generate_monthly_report(self, month=None):
+        """
+        生成月度性能评估报告
+        
+        Args:
+            month: 月份（YYYY-MM），默认为上个月
+        
+        Returns:
+            str: 报告内容
+        """
+        if not month:
+            month = (datetime.now().replace(day=1) - timedelta(days=1)).strftime('%Y-%m')
+        
+        start = datetime.strptime(month, '%Y-%m')
+        end = (start + timedelta(days=32)).replace(day=1) - timedelta(days=1)
+        
+        return self.generate_period_report(start.strftime('%Y-%m-%d'), end.strftime('%Y-%m-%d'),
+                                           title='月度性能评估报告', period='本月')
+    
+    def generate_period_report(self, start_date, end_date, title='性能评估报告', period='本期'):
+        """
+        生成任意时间段的性能评估报告
+        
+        Args:
+            start_date: 起始日期（YYYY-MM-DD，含）
+            end_date: 结束日期（YYYY-MM-DD，含）
+            title: 报告标题
+            period: 评估用语中的时间段称呼（本周/本月等）
+        
+        Returns:
+            str: 报告内容
+        """
         try:
-            conn = sqlite3.connect(self.db_path)
-            conn.row_factory = sqlite3.Row
-            cursor = conn.cursor()
-            
-            # 查询本周的预测和反馈
-            cursor.execute("""
-                SELECT 
-                    date,
-                    predicted_smile,
-                    actual_smile,
-                    confidence,
-                    predicted_count,
-                    actual_count
-                FROM predictions
-                WHERE date BETWEEN ? AND ?
-                ORDER BY date
-            """, (start_date, end_date))
-            
-            records = [dict(row) for row in cursor.fetchall()]
-            
-            conn.close()
+            # 汇总时间段内的预测和反馈
+            stats = self.repo.statistics(start_date, end_date)
             
-            # 统计分析
-            total = len(records)
-            feedback_records = [r for r in records if r['actual_smile'] is not None]
-            feedback_count = len(feedback_records)
-            
-            if feedback_count > 0:
-                correct_count = sum(1 for r in feedback_records if r['predicted_smile'] == r['actual_smile'])
-                accuracy = correct_count / feedback_count * 100
-                avg_confidence = sum(r['confidence'] for r in records) / total
-                
-                # 按类型统计
-                type_stats = defaultdict(lambda: {'total': 0, 'correct': 0})
-                for r in feedback_records:
-                    predicted = r['predicted_smile']
-                    type_stats[predicted]['total'] += 1
-                    if r['predicted_smile'] == r['actual_smile']:
-                        type_stats[predicted]['correct'] += 1
-                
-            else:
-                correct_count = 0
-                accuracy = 0
-                avg_confidence = 0
-                type_stats = {}
+            total = stats['total']
+            feedback_count = stats['verified']
+            correct_count = stats['correct']
+            accuracy = stats['accuracy'] * 100
+            avg_confidence = stats['avg_confidence']
             
             # 生成报告
-            report = f"""📊 每周性能评估报告
+            report = f"""📊 {title}
 📅 {start_date} 至 {end_date}
 
 ━━━━━━━━━━━━━━━━━━━━━━
@@ -308,26 +251,27 @@ class FeedbackManager:
 📋 分类统计:
 """
             
-            for smile_type, stats in type_stats.items():
-                type_accuracy = stats['correct'] / stats['total'] * 100 if stats['total'] > 0 else 0
+            for smile_type, type_stats in stats['by_prediction'].items():
+                if not type_stats['verified']:
+                    continue
                 report += f"\n{smile_type}:\n"
-                report += f"  预测: {stats['total']}次\n"
-                report += f"  正确: {stats['correct']}次\n"
-                report += f"  准确率: {type_accuracy:.1f}%\n"
+                report += f"  预测: {type_stats['verified']}次\n"
+                report += f"  正确: {type_stats['correct']}次\n"
+                report += f"  准确率: {type_stats['accuracy'] * 100:.1f}%\n"
             
             report += "\n━━━━━━━━━━━━━━━━━━━━━━\n\n"
             
             # 评估和建议
             if feedback_count == 0:
-                report += "⚠️ 本周暂无反馈数据，请及时反馈以优化模型。\n"
+                report += f"⚠️ {period}暂无反馈数据，请及时反馈以优化模型。\n"
             elif accuracy >= 80:
-                report += "🎉 本周表现优秀！继续保持！\n"
+                report += f"🎉 {period}表现优秀！继续保持！\n"
                 report += "💡 建议: 继续积累数据，提升置信度\n"
             elif accuracy >= 60:
-                report += "👍 本周表现良好，有提升空间\n"
+                report += f"👍 {period}表现良好，有提升空间\n"
                 report += "💡 建议: 分析错误案例，优化特征提取\n"
             else:
-                report += "⚠️ 本周表现需要改进\n"
+                report += f"⚠️ {period}表现需要改进\n"
                 report += "💡 建议:\n"
                 report += "  1. 检查OCR和语义分析质量\n"
                 report += "  2. 增加训练样本数量\n"
@@ -351,8 +295,63 @@ class FeedbackManager:
             return report
             
         except Exception as e:
-            logger.error(f"生成周报异常: {e}", exc_info=True)
-            return f"生成周报失败: {e}"
+            logger.error(f"生成{title}异常: {e}", exc_info=True)
+            return f"生成{title}失败: {e}"
+    
+    def generate_trend_report(self, end_date=None, days=91, bucket_days=7):
+        """
+        生成准确率趋势报告（默认最近一个季度，按周汇总）
+        
+        Args:
+            end_date: 结束日期（YYYY-MM-DD），默认为昨天
+            days: 统计天数
+            bucket_days: 每个汇总区间的天数
+        
+        Returns:
+            str: 报告内容
+        """
+        if not end_date:
+            end_date = (datetime.now() - timedelta(days=1)).strftime('%Y-%m-%d')
+        
+        end = datetime.strptime(end_date, '%Y-%m-%d')
+        start = end - timedelta(days=days - 1)
+        
+        try:
+            # 每天一行，按区间累加
+            daily = {row['date']: row for row in self.repo.daily_series(
+                start.strftime('%Y-%m-%d'), end_date)}
+            
+            report = f"""📈 准确率趋势报告
+📅 {start.strftime('%Y-%m-%d')} 至 {end_date}（每{bucket_days}天）
+
+━━━━━━━━━━━━━━━━━━━━━━
+"""
+            
+            bucket_start = start
+            while bucket_start <= end:
+                bucket_end = min(bucket_start + timedelta(days=bucket_days - 1), end)
+                total = verified = correct = 0
+                day = bucket_start
+                while day <= bucket_end:
+                    row = daily.get(day.strftime('%Y-%m-%d'))
+                    if row:
+                        total += row['total']
+                        verified += row['verified']
+                        correct += row['correct']
+                    day += timedelta(days=1)
+                
+                accuracy = correct / verified * 100 if verified else 0
+                bar = '█' * int(accuracy / 10) + '░' * (10 - int(accuracy / 10))
+                report += (f"\n{bucket_start.strftime('%m-%d')}~{bucket_end.strftime('%m-%d')} "
+                           f"{bar} {accuracy:5.1f}%（{correct}/{verified}，共{total}条）")
+                
+                bucket_start = bucket_end + timedelta(days=1)
+            
+            return report + "\n"
+            
+        except Exception as e:
+            logger.error(f"生成趋势报告异常: {e}", exc_info=True)
+            return f"生成趋势报告失败: {e}"
     
     def send_daily_report(self, date=None):
         """发送每日报告到企业微信"""
@@ -367,6 +366,13 @@ class FeedbackManager:
         send_wechat_message(report)
         logger.info(f"周报已发送: {end_date}")
         return report
+    
+    def send_monthly_report(self, month=None):
+        """发送月报到企业微信"""
+        report = self.generate_monthly_report(month)
+        send_wechat_message(report)
+        logger.info(f"月报已发送: {month}")
+        return report
 
 
 # ==================== 定时任务 ====================
@@ -420,9 +426,14 @@ def main():
     import argparse
     
     parser = argparse.ArgumentParser(description='笑脸反馈和性能评估管理器')
-    parser.add_argument('--action', choices=['pending', 'daily', 'weekly', 'schedule-daily', 'schedule-weekly'],
+    parser.add_argument('--action', choices=['pending', 'feedback', 'daily', 'weekly', 'monthly', 'range',
+                                             'trend', 'schedule-daily', 'schedule-weekly'],
                        required=True, help='操作类型')
-    parser.add_argument('--date', help='日期（YYYY-MM-DD）')
+    parser.add_argument('--date', help='日期（YYYY-MM-DD），range/trend为结束日期')
+    parser.add_argument('--start', help='起始日期（YYYY-MM-DD），用于range')
+    parser.add_argument('--month', help='月份（YYYY-MM），用于monthly')
+    parser.add_argument('--days', type=int, default=91, help='趋势报告天数')
+    parser.add_argument('--feedback', help='批量反馈，格式 ID:实际笑脸:数量，多条用逗号分隔；为-时从标准输入读取')
     
     args = parser.parse_args()
     
@@ -432,6 +443,14 @@ def main():
         # 显示待反馈列表
         manager.collect_feedback_interactive()
         
+    elif args.action == 'feedback':
+        # 批量反馈
+        if not args.feedback:
+            parser.error('feedback需要--feedback')
+        text = sys.stdin.read() if args.feedback == '-' else args.feedback
+        result = manager.batch_feedback(parse_feedback_text(text))
+        print(format_feedback_summary(result['results']))
+        
     elif args.action == 'daily':
         # 生成并发送每日报告
         manager.send_daily_report(args.date)
@@ -440,6 +459,20 @@ def main():
         # 生成并发送周报
         manager.send_weekly_report(args.date)
         
+    elif args.action == 'monthly':
+        # 生成并发送月报
+        manager.send_monthly_report(args.month)
+        
+    elif args.action == 'range':
+        # 生成任意时间段报告
+        if not args.start or not args.date:
+            parser.error('range需要--start和--date')
+        print(manager.generate_period_report(args.start, args.date))
+        
+    elif args.action == 'trend':
+        # 生成趋势报告
+        print(manager.generate_trend_report(args.date, days=args.days))
+        
     elif args.action == 'schedule-daily':
         # 启动每日报告定时任务
         schedule_daily_report()
@@ -14,10 +14,13 @@
 import os
 import sys
 import json
+import time
+import hashlib
 import logging
 import sqlite3
 from datetime import datetime
 from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
 
 # 添加modules目录到路径
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'modules'))
@@ -26,6 +29,9 @@ from ocr_extractor import OCRExtractor
 from semantic_analyzer import SemanticAnalyzer
 from signal_analyzer import SignalAnalyzer
 from learning_optimizer import LearningOptimizer
+from async_pipeline import AsyncAnalysisPipeline
+from dedup_store import DedupStore
+from file_hash import file_digests, new_digest
 
 # 配置日志
 logger = logging.getLogger('maoge_image_handler')
@@ -41,12 +47,45 @@ class MaogeConfig:
     # 图文存储路径
     IMAGE_STORAGE_PATH = '/root/maoge_advisor/maoge_images'
     
+    # API结果缓存数据库路径
+    CACHE_DB_PATH = '/root/maoge_advisor/maoge_cache.db'
+    
+    # 已处理内容去重索引数据库路径（所有入口共用）
+    DEDUP_DB_PATH = '/root/maoge_advisor/maoge_dedup.db'
+    
+    # 预测参数配置（config_tuner.py调优输出，不存在时使用默认权重和阈值）
+    PREDICTION_CONFIG_PATH = '/root/maoge_advisor/prediction_config.json'
+    
     # 企业微信Webhook
     WECHAT_WEBHOOK = 'https://qyapi.weixin.qq.com/cgi-bin/webhook/send?key=24b66ce0-84ed-46d4-ae37-89a4e71cc7fa'
     
     # 笑脸反馈接口（企业微信交互）
     FEEDBACK_ENABLED = True
     
+    # 融合模式：一次视觉调用同时完成文字提取和语义分析（失败时回退两步流程）
+    FUSED_MODE = False
+    
+    # 预测方式：rules（规则）、model（机器学习模型）、blend（融合），可按请求覆盖用于对比
+    PREDICTION_MODE = 'rules'
+    MODEL_WEIGHT = 0.5
+    
+    # 推理模型：forest（训练进程产出的随机森林）或online（随每条反馈增量更新的在线学习模型）
+    MODEL_TYPE = 'forest'
+    
+    # 多图并发分析：最大并发API调用数及各阶段超时（秒）
+    MAX_WORKERS = 4
+    OCR_TIMEOUT = 60
+    SEMANTIC_TIMEOUT = 60
+    
+    # 目录监控：处理队列的工作线程数，排队超过上限时补扫等生产方暂停入队
+    QUEUE_WORKERS = 2
+    QUEUE_MAX_DEPTH = 100
+    
+    # 目录补扫：启动时及每隔一段时间（秒）扫描监控目录，补处理停机期间或漏掉事件的图片
+    RECONCILE_INTERVAL = 600
+    RECONCILE_RATE = 2
+    RECONCILE_HASH_WORKERS = 4
+    
     @classmethod
     def init_paths(cls):
         """初始化路径"""
@@ -63,6 +102,9 @@ class MaogeConfig:
                 Path(base).mkdir(parents=True, exist_ok=True)
                 cls.DB_PATH = os.path.join(base, 'maoge_predictions.db')
                 cls.IMAGE_STORAGE_PATH = os.path.join(base, 'maoge_images')
+                cls.CACHE_DB_PATH = os.path.join(base, 'maoge_cache.db')
+                cls.DEDUP_DB_PATH = os.path.join(base, 'maoge_dedup.db')
+                cls.PREDICTION_CONFIG_PATH = os.path.join(base, 'prediction_config.json')
                 Path(cls.IMAGE_STORAGE_PATH).mkdir(parents=True, exist_ok=True)
                 logger.info(f"数据路径初始化成功: {base}")
                 return True
@@ -72,6 +114,9 @@ class MaogeConfig:
         logger.warning("无法初始化数据路径，使用当前目录")
         cls.DB_PATH = './maoge_predictions.db'
         cls.IMAGE_STORAGE_PATH = './maoge_images'
+        cls.CACHE_DB_PATH = './maoge_cache.db'
+        cls.DEDUP_DB_PATH = './maoge_dedup.db'
+        cls.PREDICTION_CONFIG_PATH = './prediction_config.json'
         Path(cls.IMAGE_STORAGE_PATH).mkdir(parents=True, exist_ok=True)
         return False
 
@@ -81,26 +126,120 @@ class MaogeConfig:
 class MaogeImageHandler:
     """猫哥图文处理器"""
     
-    def __init__(self):
-        """初始化处理器"""
+    def __init__(self, fused_mode=None, run_pending_optimize=False):
+        """
+        初始化处理器
+        
+        Args:
+            fused_mode: 是否启用融合模式，默认使用MaogeConfig.FUSED_MODE
+            run_pending_optimize: 是否负责执行其他进程留下的后台优化（只在常驻的目录监控服务中启用）
+        """
         # 初始化路径
         MaogeConfig.init_paths()
         
+        self.fused_mode = MaogeConfig.FUSED_MODE if fused_mode is None else fused_mode
+        
+        # 去重索引负责初始化所在的库；其文件哈希在去重和OCR缓存键之间共用，同一图片只读取一次
+        self.dedup = DedupStore(MaogeConfig.DEDUP_DB_PATH)
+        self.hasher = self.dedup.hasher
+        self._import_processed_list()
+        
         # 初始化组件
-        self.ocr = OCRExtractor()
-        self.semantic = SemanticAnalyzer()
-        self.signal = SignalAnalyzer()
-        self.optimizer = LearningOptimizer(MaogeConfig.DB_PATH)
+        self.ocr = OCRExtractor(cache_path=MaogeConfig.CACHE_DB_PATH, hasher=self.hasher)
+        self.semantic = SemanticAnalyzer(cache_path=MaogeConfig.CACHE_DB_PATH)
+        self.signal = SignalAnalyzer(
+            MaogeConfig.PREDICTION_CONFIG_PATH
+            if os.path.exists(MaogeConfig.PREDICTION_CONFIG_PATH) else None
+        )
+        self.optimizer = LearningOptimizer(MaogeConfig.DB_PATH, model_type=MaogeConfig.MODEL_TYPE,
+                                           run_pending=run_pending_optimize)
+        self.pipeline = AsyncAnalysisPipeline(
+            self.ocr,
+            self.semantic,
+            max_workers=MaogeConfig.MAX_WORKERS,
+            ocr_timeout=MaogeConfig.OCR_TIMEOUT,
+            semantic_timeout=MaogeConfig.SEMANTIC_TIMEOUT
+        )
+        
+        # 进程启动时加载一次模型（之后由注册表按版本热更新）
+        self.optimizer.get_predictor()
         
         logger.info("猫哥图文处理器初始化完成")
     
-    def process_image(self, image_path, source='manual'):
+    def _import_processed_list(self):
+        """把旧版目录监控的processed_images.txt导入去重索引（只导入一次）"""
+        processed_file = os.path.join(os.path.dirname(MaogeConfig.DB_PATH), 'processed_images.txt')
+        if not os.path.exists(processed_file):
+            return
+        
+        try:
+            self.dedup.import_lines(processed_file, source='directory_monitor')
+            os.replace(processed_file, processed_file + '.imported')
+        except Exception as e:
+            logger.error(f"导入已处理文件列表失败: {e}")
+    
+    def process_unique_image(self, image_path, source='manual', mode=None):
+        """
+        处理单张图文（按内容哈希去重，已成功处理过或正在处理的图片不再调用OCR和语义分析）
+        
+        Args:
+            image_path: 图片路径
+            source: 来源
+            mode: 预测方式（rules/model/blend），默认使用MaogeConfig.PREDICTION_MODE
+        
+        Returns:
+            dict: 处理结果；重复图片返回{'success': False, 'duplicate': True, 'prediction_id': 原预测ID}，
+                相同内容正在处理中时prediction_id为None
+        """
+        file_hash = self._get_file_hash(image_path)
+        
+        # 先领取内容哈希再处理：相同内容的图片同时到达时只有一个被处理，其余视为重复
+        if file_hash and not self.dedup.claim(file_hash, path=image_path, source=source):
+            record = self.dedup.get(file_hash) or {}
+            if record.get('status') == 'processing':
+                error = '相同内容的图片正在处理中'
+            else:
+                # 处理中的记录不更新最近时间，以免延后超时重新领取
+                self.dedup.record(file_hash, status='duplicate', source=source)
+                error = '图片已处理过'
+            logger.info(f"{error}（预测ID: {record.get('prediction_id')}），跳过: {image_path}")
+            return {
+                'success': False,
+                'duplicate': True,
+                'prediction_id': record.get('prediction_id'),
+                'error': error
+            }
+        
+        try:
+            result = self.process_image(image_path, source=source, mode=mode)
+        except Exception as e:
+            # 处理异常时释放领取，允许重新处理
+            if file_hash:
+                self.dedup.record(file_hash, status='failed', path=image_path, source=source,
+                                  error=str(e))
+            raise
+        
+        if file_hash:
+            self.dedup.record(
+                file_hash,
+                status='done' if result['success'] else 'failed',
+                path=image_path,
+                source=source,
+                prediction_id=result.get('prediction_id'),
+                error=result.get('error')
+            )
+        
+        return result
+    
+    def process_image(self, image_path, source='manual', fused=None, mode=None):
         """
         处理单张图文
         
         Args:
             image_path: 图片路径
             source: 来源（manual/wechat）
+            fused: 是否使用融合模式，默认使用处理器设置
+            mode: 预测方式（rules/model/blend），默认使用MaogeConfig.PREDICTION_MODE
         
         Returns:
             dict: 处理结果
@@ -108,83 +247,302 @@ class MaogeImageHandler:
         try:
             logger.info(f"开始处理图文: {image_path}")
             
-            # 1. OCR提取文字
-            logger.info("步骤1: 提取文字...")
-            text_content = self.ocr.extract_text(image_path)
+            use_fused = self.fused_mode if fused is None else fused
+            fused_result = self._fused_analyze(image_path) if use_fused else None
             
-            if not text_content or len(text_content) < 10:
-                logger.warning(f"文字提取失败或内容过短，实际内容: {repr(text_content)}")
-                return {
-                    'success': False,
-                    'error': f'文字提取失败或内容过短: {repr(text_content)}'
-                }
+            if fused_result:
+                text_content, analysis = fused_result
+                logger.info(f"融合分析成功，共{len(text_content)}字")
+            else:
+                if use_fused:
+                    logger.info("融合分析失败，回退到两步流程")
+                
+                # 1. OCR提取文字
+                logger.info("步骤1: 提取文字...")
+                text_content, _ = self.ocr.extract_text(image_path)
+                
+                if not text_content or len(text_content) < 10:
+                    logger.warning(f"文字提取失败或内容过短，实际内容: {repr(text_content)}")
+                    return {
+                        'success': False,
+                        'error': f'文字提取失败或内容过短: {repr(text_content)}'
+                    }
+                
+                logger.info(f"文字提取成功，共{len(text_content)}字")
+                
+                # 2. 语义分析
+                logger.info("步骤2: 语义分析...")
+                analysis = self.semantic.analyze_content(text_content)
+                
+                if not analysis:
+                    logger.warning("语义分析失败")
+                    return {
+                        'success': False,
+                        'error': '语义分析失败'
+                    }
+                
+                logger.info("语义分析完成")
             
-            logger.info(f"文字提取成功，共{len(text_content)}字")
+            # 3-6. 信号分析、保存预测并生成消息
+            return self._predict_and_save(text_content, analysis, image_path, mode)
             
-            # 2. 语义分析
-            logger.info("步骤2: 语义分析...")
-            analysis = self.semantic.analyze(text_content)
+        except Exception as e:
+            logger.error(f"处理图文异常: {e}", exc_info=True)
+            return {
+                'success': False,
+                'error': str(e)
+            }
+    
+    def _predict_and_save(self, text_content, analysis, image_path, mode=None):
+        """
+        信号分析、笑脸预测、保存预测记录并生成推送消息
+        
+        Args:
+            text_content: 文字内容
+            analysis: 语义分析结果
+            image_path: 图片路径（多图时为分号分隔的路径）
+            mode: 预测方式（rules/model/blend），默认使用MaogeConfig.PREDICTION_MODE
+        
+        Returns:
+            dict: 处理结果
+        """
+        # 3. 信号分析和笑脸预测
+        logger.info("步骤3: 信号分析和笑脸预测...")
+        prediction = self.signal.analyze(analysis)['smile_prediction']
+        
+        if not prediction:
+            logger.warning("信号分析失败")
+            return {
+                'success': False,
+                'error': '信号分析失败'
+            }
+        
+        # 机器学习模型替换或融合规则预测（特征向量随预测记录保存）
+        prediction = self.optimizer.apply_model(
+            analysis,
+            prediction,
+            mode=mode or MaogeConfig.PREDICTION_MODE,
+            model_weight=MaogeConfig.MODEL_WEIGHT
+        )
+        
+        logger.info(f"预测完成: {prediction['prediction']}, 置信度: {prediction['confidence']:.1%}, "
+                   f"来源: {prediction['source']}")
+        
+        # 4. 保存预测记录
+        prediction_id = self.optimizer.save_prediction(
+            date=analysis.get('date', datetime.now().strftime('%Y-%m-%d')),
+            image_path=image_path,
+            text_content=text_content,
+            analysis_result=json.dumps(analysis, ensure_ascii=False),
+            predicted_smile=prediction['prediction'],
+            confidence=prediction['confidence'],
+            predicted_count=prediction.get('predicted_count', 1.0),
+            source=prediction['source'],
+            model_version=prediction['model_version'],
+            features=prediction['features']
+        )
+        
+        logger.info(f"预测记录已保存，ID: {prediction_id}")
+        
+        # 5. 生成推送消息
+        message = self._format_analysis_message(
+            analysis, 
+            prediction, 
+            image_path,
+            prediction_id
+        )
+        
+        # 6. 返回结果
+        return {
+            'success': True,
+            'prediction_id': prediction_id,
+            'analysis': analysis,
+            'prediction': prediction,
+            'message': message,
+            'text_length': len(text_content)
+        }
+    
+    def process_images(self, image_paths, title=None, source='xiaoe_monitor', mode=None):
+        """
+        批量处理同一帖子的多张图文
+        
+        并发提取每张图片的文字（相同图片只处理一次），合并为一篇帖子文本后
+        只做一次语义分析和笑脸预测
+        
+        Args:
+            image_paths: 图片路径列表
+            title: 帖子标题（可选）
+            source: 来源
+            mode: 预测方式（rules/model/blend），默认使用MaogeConfig.PREDICTION_MODE
+        
+        Returns:
+            dict: 处理结果（含throughput吞吐量统计）
+        """
+        start = time.time()
+        
+        try:
+            logger.info(f"开始批量处理图文: {len(image_paths)}张 ({source})")
             
-            if not analysis:
-                logger.warning("语义分析失败")
-                return {
-                    'success': False,
-                    'error': '语义分析失败'
-                }
+            # 1. 按内容哈希去重
+            unique_paths = []
+            seen_hashes = {}
+            for path in image_paths:
+                file_hash = self._get_file_hash(path)
+                if file_hash is None or file_hash in seen_hashes:
+                    logger.info(f"跳过重复或无法读取的图片: {path}")
+                    continue
+                seen_hashes[file_hash] = path
+                unique_paths.append(path)
             
-            logger.info("语义分析完成")
+            if not unique_paths:
+                return {'success': False, 'error': '没有可处理的图片'}
             
-            # 3. 信号分析和笑脸预测
-            logger.info("步骤3: 信号分析和笑脸预测...")
-            prediction = self.signal.analyze_and_predict(analysis)
+            # 2. 并发提取文字
+            logger.info(f"步骤1: 并发提取{len(unique_paths)}张图片文字...")
+            ocr_start = time.time()
+            ocr_results = self.pipeline.run(unique_paths, analyze=False)
+            ocr_elapsed = time.time() - ocr_start
             
-            if not prediction:
-                logger.warning("信号分析失败")
-                return {
-                    'success': False,
-                    'error': '信号分析失败'
-                }
+            # 3. 合并为帖子文本
+            sections = []
+            for idx, item in enumerate(ocr_results, 1):
+                if item['error'] or not item['text']:
+                    logger.warning(f"图片文字提取失败: {item['image_path']}, {item['error']}")
+                    continue
+                sections.append(f"【图{idx}】\n{item['text']}")
             
-            logger.info(f"预测完成: {prediction['prediction']}, 置信度: {prediction['confidence']:.1%}")
+            if not sections:
+                return {'success': False, 'error': '所有图片文字提取失败'}
             
-            # 4. 保存预测记录
-            prediction_id = self.optimizer.save_prediction(
-                date=analysis.get('date', datetime.now().strftime('%Y-%m-%d')),
-                image_path=image_path,
-                text_content=text_content,
-                analysis_result=json.dumps(analysis, ensure_ascii=False),
-                predicted_smile=prediction['prediction'],
-                confidence=prediction['confidence'],
-                predicted_count=prediction.get('predicted_count', 1.0)
-            )
+            if title:
+                sections.insert(0, f"标题：{title}")
+            text_content = '\n\n'.join(sections)
             
-            logger.info(f"预测记录已保存，ID: {prediction_id}")
+            logger.info(f"文字提取成功，合并后共{len(text_content)}字")
             
-            # 5. 生成推送消息
-            message = self._format_analysis_message(
-                analysis, 
-                prediction, 
-                image_path,
-                prediction_id
-            )
+            # 4. 整帖语义分析
+            logger.info("步骤2: 语义分析...")
+            analysis = self.semantic.analyze_content(text_content)
             
-            # 6. 返回结果
-            return {
-                'success': True,
-                'prediction_id': prediction_id,
-                'analysis': analysis,
-                'prediction': prediction,
-                'message': message,
-                'text_length': len(text_content)
+            if not analysis:
+                return {'success': False, 'error': '语义分析失败'}
+            
+            # 5. 信号分析、保存预测并生成消息
+            result = self._predict_and_save(text_content, analysis, ';'.join(unique_paths), mode)
+            
+            # 记入去重索引，其他入口（如目录监控）不再单独处理这些图片
+            if result['success']:
+                self.dedup.record_many([
+                    {'key': file_hash, 'path': path, 'source': source, 'title': title,
+                     'prediction_id': result['prediction_id']}
+                    for file_hash, path in seen_hashes.items()
+                ])
+            
+            elapsed = time.time() - start
+            result['throughput'] = {
+                'images': len(image_paths),
+                'unique_images': len(unique_paths),
+                'ocr_elapsed': ocr_elapsed,
+                'elapsed': elapsed,
+                'images_per_second': len(unique_paths) / elapsed if elapsed > 0 else 0
             }
             
+            logger.info(f"批量处理完成: {len(unique_paths)}张图片，耗时{elapsed:.1f}秒")
+            
+            return result
+            
         except Exception as e:
-            logger.error(f"处理图文异常: {e}", exc_info=True)
+            logger.error(f"批量处理图文异常: {e}", exc_info=True)
             return {
                 'success': False,
                 'error': str(e)
             }
     
+    def _get_file_hash(self, file_path):
+        """获取文件内容哈希（文件未变化时使用缓存）"""
+        try:
+            return self.hasher.digest(file_path)
+        except Exception:
+            return None
+    
+    def migrate_legacy_hashes(self, file_paths, workers=4):
+        """
+        把去重索引中旧版MD5哈希的记录迁移到新的内容哈希（只在存在旧记录时执行）
+        
+        每个文件只读取一次，同时计算两种哈希；找不到对应文件的旧记录移入image_md5命名空间
+        
+        Args:
+            file_paths: 需要对照的图片路径（监控目录中的全部图片）
+            workers: 并行线程数
+        
+        Returns:
+            迁移的记录数
+        """
+        legacy = self.dedup.legacy_keys()
+        if not legacy:
+            return 0
+        
+        file_paths = list(file_paths)
+        
+        logger.info(f"去重索引中有{len(legacy)}条旧版MD5记录，开始迁移...")
+        
+        def compute(path):
+            try:
+                stat = os.stat(path)
+                return (stat.st_size, stat.st_mtime_ns), file_digests(path, [hashlib.md5(), new_digest()])
+            except OSError:
+                return None
+        
+        mapping = {}
+        items = {}
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            for path, computed in zip(file_paths, executor.map(compute, file_paths)):
+                if computed is None:
+                    continue
+                (size, mtime_ns), (md5_hash, digest) = computed
+                items[path] = (size, mtime_ns, digest)
+                if md5_hash in legacy:
+                    mapping[md5_hash] = digest
+        
+        self.hasher.store(items)
+        return self.dedup.migrate_keys(mapping, archive_namespace='image_md5')
+    
+    def analyze_images(self, image_paths):
+        """
+        并发分析多张图片（OCR和语义分析，不做预测）
+        
+        Args:
+            image_paths: 图片路径列表
+        
+        Returns:
+            list: 每张图片的 {'image_path', 'text', 'analysis', 'error', 'elapsed'}
+        """
+        try:
+            return self.pipeline.run(image_paths)
+        except Exception as e:
+            logger.error(f"并发分析异常: {e}", exc_info=True)
+            return [
+                {'image_path': path, 'text': None, 'analysis': None, 'error': str(e), 'elapsed': 0}
+                for path in image_paths
+            ]
+    
+    def _fused_analyze(self, image_path):
+        """
+        融合模式分析（一次视觉调用返回原文和结构化分析）
+        
+        Args:
+            image_path: 图片路径
+        
+        Returns:
+            tuple: (原文, 分析结果)，失败时返回None
+        """
+        try:
+            image_url = self.ocr.encode_image(image_path)
+            return self.semantic.analyze_image(image_url)
+        except Exception as e:
+            logger.error(f"融合分析异常: {e}", exc_info=True)
+            return None
+    
     def _format_analysis_message(self, analysis, prediction, image_path, prediction_id):
         """格式化分析结果消息"""
         
@@ -212,9 +570,14 @@ class MaogeImageHandler:
 
 {emoji} 笑脸预测: {prediction['prediction']}
 📊 置信度: {confidence:.1%} {conf_bar}
-🔢 预计数量: {prediction.get('predicted_count', 1.0):.1f}个
-
-💡 核心要点:"""
+🔢 预计数量: {prediction.get('predicted_count', 1.0):.1f}个"""
+        
+        # 规则和模型对比
+        if prediction.get('model_prediction'):
+            message += (f"\n🤖 规则预测: {prediction['rule_prediction']} | "
+                        f"模型预测: {prediction['model_prediction']}（{prediction['model_version']}）")
+        
+        message += "\n\n💡 核心要点:"
         
         # 添加核心要点（最多5条）
         key_points = analysis.get('key_points', [])
@@ -254,17 +617,38 @@ class MaogeImageHandler:
             )
             
             if success:
+                # 准确率计数已随反馈更新，模型优化由学习优化器在后台防抖执行
                 logger.info(f"反馈已保存: ID={prediction_id}, 实际={actual_smile}")
                 
-                # 触发模型优化
-                self.optimizer.optimize_model()
-                
             return success
             
         except Exception as e:
             logger.error(f"保存反馈异常: {e}", exc_info=True)
             return False
     
+    def save_feedbacks(self, feedbacks):
+        """
+        批量保存笑脸反馈（一个事务写入，只安排一次模型优化）
+        
+        Args:
+            feedbacks: 反馈列表，格式 [(id, actual_smile, actual_count), ...]
+        
+        Returns:
+            list: 每条的处理结果（见LearningOptimizer.save_feedbacks）
+        """
+        try:
+            results = self.optimizer.save_feedbacks(feedbacks)
+            success = sum(1 for r in results if r['success'])
+            logger.info(f"批量反馈已保存: 成功{success}条, 失败{len(results) - success}条")
+            return results
+            
+        except Exception as e:
+            logger.error(f"批量保存反馈异常: {e}", exc_info=True)
+            return [
+                {'prediction_id': f[0], 'actual_smile': f[1], 'success': False, 'error': str(e)}
+                for f in feedbacks
+            ]
+    
     def get_performance_stats(self, days=7):
         """
         获取性能统计
@@ -285,6 +669,60 @@ class MaogeImageHandler:
 
 # ==================== 企业微信交互 ====================
 
+def parse_feedback_text(text):
+    """
+    解析反馈文本
+    
+    Args:
+        text: 每条格式为 ID:实际笑脸[:数量]，多条用逗号、分号或换行分隔
+              例如 "1:buy_smile:2, 3:no_smile"
+    
+    Returns:
+        list: [(id, actual_smile, actual_count), ...]（格式校验由save_feedbacks完成）
+    """
+    feedbacks = []
+    for entry in text.replace('，', ',').replace(';', ',').replace('\n', ',').split(','):
+        entry = entry.strip()
+        if not entry:
+            continue
+        parts = [p.strip() for p in entry.replace('：', ':').split(':')]
+        feedbacks.append((parts[0], parts[1] if len(parts) > 1 else None,
+                          parts[2] if len(parts) > 2 else None))
+    return feedbacks
+
+
+def format_feedback_summary(results):
+    """
+    格式化批量反馈结果消息（逐条列出结果）
+    
+    Args:
+        results: save_feedbacks的返回结果
+    
+    Returns:
+        str: 消息内容
+    """
+    success = [r for r in results if r['success']]
+    failed = [r for r in results if not r['success']]
+    
+    message = f"""📝 批量反馈完成
+
+✅ 成功: {len(success)}条
+❌ 失败: {len(failed)}条
+"""
+    
+    for r in results:
+        if r['success']:
+            mark = '✓预测正确' if r['is_correct'] else f"✗预测为{r['predicted']}"
+            message += f"\n✅ ID:{r['prediction_id']} {r['actual_smile']} {mark}"
+        else:
+            message += f"\n❌ ID:{r['prediction_id']} {r['error']}"
+    
+    if success:
+        message += "\n\n系统将根据反馈优化模型。"
+    
+    return message
+
+
 def send_wechat_message(message):
     """发送企业微信消息"""
     import requests
@@ -325,24 +763,22 @@ def main():
     
     parser = argparse.ArgumentParser(description='猫哥图文解读处理器')
     parser.add_argument('image_path', help='图片路径')
-    parser.add_argument('--feedback', help='反馈笑脸 (格式: prediction_id:actual_smile:count)')
+    parser.add_argument('--feedback', help='反馈笑脸 (格式: prediction_id:actual_smile:count，多条用逗号分隔)')
     parser.add_argument('--stats', action='store_true', help='显示性能统计')
+    parser.add_argument('--fused', action='store_true', help='使用融合模式（一次调用完成文字提取和语义分析）')
+    parser.add_argument('--mode', choices=['rules', 'model', 'blend'], help='预测方式（默认使用配置）')
     
     args = parser.parse_args()
     
     # 初始化处理器
-    handler = MaogeImageHandler()
+    handler = MaogeImageHandler(fused_mode=True if args.fused else None)
     
     # 处理反馈
     if args.feedback:
-        parts = args.feedback.split(':')
-        if len(parts) >= 2:
-            prediction_id = int(parts[0])
-            actual_smile = parts[1]
-            actual_count = float(parts[2]) if len(parts) > 2 else None
-            
-            success = handler.save_feedback(prediction_id, actual_smile, actual_count)
-            print(f"反馈保存{'成功' if success else '失败'}")
+        feedbacks = parse_feedback_text(args.feedback)
+        if feedbacks:
+            results = handler.save_feedbacks(feedbacks)
+            print(format_feedback_summary(results))
         else:
             print("反馈格式错误，应为: prediction_id:actual_smile:count")
         return
@@ -358,7 +794,7 @@ def main():
     
     # 处理图文
     if os.path.exists(args.image_path):
-        result = handler.process_image(args.image_path)
+        result = handler.process_image(args.image_path, mode=args.mode)
         
         if result['success']:
             print("=" * 60)
@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+异步分析流水线模块
+基于AsyncOpenAI并发执行OCR和语义分析，用信号量限制并发数，每个阶段单独超时，
+多图帖子的耗时约等于最慢的一张图，而不是所有图片耗时之和
+"""
+
+import os
+import json
+import time
+import asyncio
+import logging
+from typing import Dict, List, Optional
+from openai import AsyncOpenAI
+
+from ocr_extractor import OCRExtractor, TEXT_PROMPT
+from semantic_analyzer import SemanticAnalyzer
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class AsyncAnalysisPipeline:
+    """异步分析流水线"""
+
+    def __init__(self, ocr: OCRExtractor, semantic: SemanticAnalyzer,
+                 max_workers: int = 4, ocr_timeout: float = 60,
+                 semantic_timeout: float = 60):
+        """
+        初始化异步分析流水线
+
+        Args:
+            ocr: OCR提取器（复用其提示词、图片预处理和结果缓存）
+            semantic: 语义分析器（复用其提示词、规则快速通道和结果缓存）
+            max_workers: 最大并发API调用数
+            ocr_timeout: OCR阶段超时（秒）
+            semantic_timeout: 语义分析阶段超时（秒）
+        """
+        self.ocr = ocr
+        self.semantic = semantic
+        self.max_workers = max_workers
+        self.ocr_timeout = ocr_timeout
+        self.semantic_timeout = semantic_timeout
+
+        # 客户端的连接池绑定创建时的事件循环，每次run()都是新的事件循环，
+        # 因此只保存连接参数，在process_many中创建并关闭客户端
+        self.api_key = os.environ.get("ZZZAPI")
+        self.base_url = "https://api.zhizengzeng.com/v1"
+        logger.info(f"异步分析流水线初始化成功，最大并发: {max_workers}")
+
+    def _create_client(self) -> AsyncOpenAI:
+        """创建异步API客户端（在当前事件循环中使用）"""
+        return AsyncOpenAI(api_key=self.api_key, base_url=self.base_url)
+
+    async def extract_text(self, client: AsyncOpenAI, image_path: str,
+                           semaphore: asyncio.Semaphore) -> str:
+        """
+        异步提取图片文字
+
+        Args:
+            client: 当前事件循环的API客户端
+            image_path: 图片路径
+            semaphore: 并发信号量
+
+        Returns:
+            提取的文字
+        """
+        # 查询缓存（哈希计算在线程中执行，不阻塞事件循环）
+        cache_key = await asyncio.to_thread(self.ocr._cache_key, image_path, TEXT_PROMPT)
+        if cache_key:
+            cached_text = await asyncio.to_thread(self.ocr.cache.get, cache_key)
+            if cached_text is not None:
+                logger.info(f"命中OCR缓存: {image_path}")
+                return cached_text
+
+        image_url = await asyncio.to_thread(self.ocr.encode_image, image_path)
+
+        async with semaphore:
+            response = await asyncio.wait_for(
+                client.chat.completions.create(
+                    model=self.ocr.model,
+                    messages=self.ocr._build_messages(TEXT_PROMPT, image_url),
+                    max_tokens=3000,
+                    temperature=0.1
+                ),
+                timeout=self.ocr_timeout
+            )
+
+        extracted_text = response.choices[0].message.content.strip()
+
+        if cache_key:
+            await asyncio.to_thread(self.ocr.cache.set, cache_key, extracted_text)
+
+        return extracted_text
+
+    async def analyze_content(self, client: AsyncOpenAI, text: str,
+                              semaphore: asyncio.Semaphore) -> Dict:
+        """
+        异步语义分析
+
+        Args:
+            client: 当前事件循环的API客户端
+            text: 文字内容
+            semaphore: 并发信号量
+
+        Returns:
+            结构化分析结果，失败时返回空结果
+        """
+        try:
+            # 模板化图文直接使用规则结果
+            result = self.semantic.try_rules(text)
+            if result is not None:
+                return result
+
+            # 相同文字直接使用缓存结果
+            result = await asyncio.to_thread(self.semantic.get_cached, text)
+            if result is not None:
+                logger.info("命中分析结果缓存")
+                return result
+
+            start = time.time()
+            async with semaphore:
+                response = await asyncio.wait_for(
+                    client.chat.completions.create(
+                        model=self.semantic.model,
+                        messages=self.semantic._build_messages(text),
+                        response_format={"type": "json_object"},
+                        temperature=0.3,
+                        max_tokens=2000
+                    ),
+                    timeout=self.semantic_timeout
+                )
+
+            result = json.loads(response.choices[0].message.content)
+            self.semantic.record_metric('llm', time.time() - start)
+            await asyncio.to_thread(self.semantic.set_cached, text, result)
+            return result
+
+        except asyncio.TimeoutError:
+            logger.error(f"语义分析超时（{self.semantic_timeout}秒）")
+            return self.semantic._get_empty_result()
+        except Exception as e:
+            logger.error(f"内容分析失败: {e}")
+            return self.semantic._get_empty_result()
+
+    async def process(self, client: AsyncOpenAI, image_path: str, semaphore: asyncio.Semaphore,
+                      analyze: bool = True) -> Dict:
+        """
+        异步处理单张图片
+
+        Args:
+            client: 当前事件循环的API客户端
+            image_path: 图片路径
+            semaphore: 并发信号量
+            analyze: 是否执行语义分析（为False时只提取文字）
+
+        Returns:
+            {'image_path', 'text', 'analysis', 'error', 'elapsed'}
+        """
+        start = time.time()
+        result = {
+            'image_path': image_path,
+            'text': None,
+            'analysis': None,
+            'error': None,
+            'elapsed': 0
+        }
+
+        try:
+            result['text'] = await self.extract_text(client, image_path, semaphore)
+
+            if analyze and result['text']:
+                result['analysis'] = await self.analyze_content(client, result['text'], semaphore)
+
+        except asyncio.TimeoutError:
+            result['error'] = f'OCR超时（{self.ocr_timeout}秒）'
+            logger.error(f"{result['error']}: {image_path}")
+        except Exception as e:
+            result['error'] = str(e)
+            logger.error(f"处理图片失败: {image_path}, {e}")
+
+        result['elapsed'] = time.time() - start
+        return result
+
+    async def process_many(self, image_paths: List[str], analyze: bool = True) -> List[Dict]:
+        """
+        并发处理多张图片
+
+        Args:
+            image_paths: 图片路径列表
+            analyze: 是否执行语义分析
+
+        Returns:
+            按输入顺序排列的处理结果列表
+        """
+        semaphore = asyncio.Semaphore(self.max_workers)
+        async with self._create_client() as client:
+            return await asyncio.gather(
+                *(self.process(client, path, semaphore, analyze=analyze) for path in image_paths)
+            )
+
+    def run(self, image_paths: List[str], analyze: bool = True) -> List[Dict]:
+        """
+        同步接口：并发处理多张图片
+
+        Args:
+            image_paths: 图片路径列表
+            analyze: 是否执行语义分析
+
+        Returns:
+            按输入顺序排列的处理结果列表
+        """
+        start = time.time()
+        results = asyncio.run(self.process_many(image_paths, analyze=analyze))
+        logger.info(f"并发处理{len(image_paths)}张图片完成，耗时{time.time() - start:.1f}秒")
+        return results
+
+
+if __name__ == '__main__':
+    # 测试代码
+    import sys
+
+    pipeline = AsyncAnalysisPipeline(OCRExtractor(), SemanticAnalyzer())
+
+    for item in pipeline.run(sys.argv[1:]):
+        print("=" * 60)
+        print(f"{item['image_path']} ({item['elapsed']:.1f}秒)")
+        if item['error']:
+            print(f"错误: {item['error']}")
+        else:
+            print(json.dumps(item['analysis'], ensure_ascii=False, indent=2))
@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+预测参数调优模块
+从特征存储一次读取已验证预测的特征矩阵，用向量化评分在权重/阈值网格上搜索
+与真实笑脸（actual_result）最吻合的配置，输出SignalAnalyzer可直接加载的prediction_config
+"""
+
+import os
+import json
+import time
+import logging
+from datetime import datetime
+from typing import Dict, List
+
+import numpy as np
+
+from signal_analyzer import SignalAnalyzer
+from signal_batch import BatchSignalScorer, PREDICTION_LABELS
+from feature_store import FeatureStore
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# 默认搜索网格（strong_signal_threshold只影响置信度，不影响预测结果，不参与搜索）
+DEFAULT_GRID = {
+    'weights': {
+        'market_cycle': [1, 2, 3, 4, 5],
+        'trend_judgment': [0, 1, 2, 3],
+        'risk_level': [0, 0.5, 1, 2],
+        'operation_suggestion': [0, 0.5, 1, 2],
+        'confidence': [0, 1, 2]
+    },
+    'thresholds': {
+        'buy_smile_threshold': [2, 3, 4, 5, 6],
+        'sell_smile_threshold': [2, 3, 4, 5, 6]
+    }
+}
+
+
+class ConfigTuner:
+    """权重/阈值网格搜索调优器"""
+
+    def __init__(self, db_path: str, analyzer: SignalAnalyzer = None, min_samples: int = 10):
+        """
+        初始化调优器
+
+        Args:
+            db_path: 预测数据库路径（prediction_history和maoge_content）
+            analyzer: 信号分析器，其当前配置作为基准和输出的基础，默认使用内置配置
+            min_samples: 最少已验证样本数
+        """
+        self.db_path = db_path
+        self.scorer = BatchSignalScorer(analyzer)
+        self.min_samples = min_samples
+
+        # 回测特征从特征存储一次读取，编码方式变化时自动补算
+        self.features = FeatureStore(db_path)
+        self.features.register('signal', self.scorer.schema_version(), self.scorer.encode_row)
+
+        self.samples = 0
+        self.columns = None
+        self.label_counts = None
+
+    def load_history(self) -> int:
+        """
+        从特征存储加载已验证预测的特征矩阵
+
+        相同特征的记录合并为一行，按真实结果计数，评估时只需计算不同特征组合的预测
+
+        Returns:
+            有效样本数
+        """
+        _, matrix, actual_results = self.features.load_matrix('signal')
+
+        labels = []
+        keep = []
+        for i, actual_result in enumerate(actual_results):
+            if actual_result in PREDICTION_LABELS:
+                keep.append(i)
+                labels.append(PREDICTION_LABELS.index(actual_result))
+
+        self.samples = len(keep)
+        if not keep:
+            self.columns = None
+            self.label_counts = None
+            return 0
+
+        matrix = matrix[keep].astype(np.int32)
+        unique_rows, inverse = np.unique(matrix, axis=0, return_inverse=True)
+
+        self.columns = self.scorer.columns_from_matrix(unique_rows)
+        self.label_counts = np.zeros((len(unique_rows), len(PREDICTION_LABELS)), dtype=np.int64)
+        np.add.at(self.label_counts, (inverse.ravel(), np.array(labels)), 1)
+
+        logger.info(f"加载已验证样本{self.samples}条，不同特征组合{len(unique_rows)}种")
+        return self.samples
+
+    def evaluate(self, weights: Dict = None, thresholds: Dict = None) -> np.ndarray:
+        """
+        计算配置的准确率
+
+        Args:
+            weights: 权重，取值为长度K的数组时同时评估K组配置
+            thresholds: 阈值，规则同weights
+
+        Returns:
+            准确率，单组配置为标量，K组配置为长度K的数组
+        """
+        codes = self.scorer.predict_codes(self.columns, weights, thresholds)
+        rows = np.arange(len(self.label_counts))
+        correct = self.label_counts[rows, codes].sum(axis=-1)
+        return correct / self.samples
+
+    def grid_search(self, grid: Dict = None, chunk_size: int = 8192) -> Dict:
+        """
+        网格搜索最优配置
+
+        Args:
+            grid: 搜索网格，格式同DEFAULT_GRID，未列出的参数保持当前配置
+            chunk_size: 每次向量化评估的配置组数
+
+        Returns:
+            {'weights', 'thresholds', 'accuracy', 'baseline_accuracy', 'samples',
+             'configs_evaluated', 'elapsed'}，样本不足时返回None
+        """
+        if self.columns is None:
+            self.load_history()
+        if self.samples < self.min_samples:
+            logger.info(f"样本数量不足({self.samples}/{self.min_samples})，暂不调优")
+            return None
+
+        grid = grid or DEFAULT_GRID
+        params = [('weights', name, values) for name, values in grid.get('weights', {}).items()]
+        params += [('thresholds', name, values) for name, values in grid.get('thresholds', {}).items()]
+        values = [np.asarray(v, dtype=np.float64) for _, _, v in params]
+        shape = tuple(len(v) for v in values)
+        total = int(np.prod(shape))
+
+        start = time.time()
+
+        # 当前配置作为基准，准确率相同时保留当前配置
+        config = self.scorer.analyzer.config
+        baseline = float(self.evaluate())
+        best_accuracy = baseline
+        best = {'weights': dict(config['weights']), 'thresholds': dict(config['thresholds'])}
+
+        for offset in range(0, total, chunk_size):
+            indices = np.unravel_index(np.arange(offset, min(offset + chunk_size, total)), shape)
+            candidate = {'weights': {}, 'thresholds': {}}
+            for (group, name, _), choices, index in zip(params, values, indices):
+                candidate[group][name] = choices[index]
+
+            accuracy = self.evaluate(candidate['weights'], candidate['thresholds'])
+            top = int(np.argmax(accuracy))
+            if accuracy[top] > best_accuracy:
+                best_accuracy = float(accuracy[top])
+                for group in ('weights', 'thresholds'):
+                    for name, column in candidate[group].items():
+                        best[group][name] = self._plain(column[top])
+
+        elapsed = time.time() - start
+        logger.info(f"网格搜索完成: {total}组配置，耗时{elapsed:.2f}秒，"
+                    f"准确率{baseline:.2%} -> {best_accuracy:.2%}")
+
+        return {
+            'weights': best['weights'],
+            'thresholds': best['thresholds'],
+            'accuracy': best_accuracy,
+            'baseline_accuracy': baseline,
+            'samples': self.samples,
+            'configs_evaluated': total,
+            'elapsed': elapsed
+        }
+
+    def save_config(self, result: Dict, output_path: str):
+        """
+        写入prediction_config配置文件（保留文件中的其他配置）
+
+        SignalAnalyzer按顶层键覆盖默认配置，因此权重和阈值总是完整写出
+
+        Args:
+            result: grid_search()的返回结果
+            output_path: 配置文件路径
+        """
+        config = {}
+        if os.path.exists(output_path):
+            with open(output_path, 'r', encoding='utf-8') as f:
+                config = json.load(f)
+
+        prediction_config = config.setdefault('prediction_config', {})
+        prediction_config['weights'] = result['weights']
+        prediction_config['thresholds'] = result['thresholds']
+        config['tuning'] = {
+            'accuracy': result['accuracy'],
+            'baseline_accuracy': result['baseline_accuracy'],
+            'samples': result['samples'],
+            'configs_evaluated': result['configs_evaluated'],
+            'tuned_at': datetime.now().isoformat(timespec='seconds')
+        }
+
+        tmp_path = output_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(config, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, output_path)
+
+        logger.info(f"预测配置已保存到: {output_path}")
+
+    @staticmethod
+    def _plain(value) -> float:
+        """NumPy数值转为JSON友好的int/float"""
+        value = float(value)
+        return int(value) if value.is_integer() else value
+
+
+def main():
+    """主函数"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description='预测参数网格搜索调优')
+    parser.add_argument('--db', required=True, help='预测数据库路径')
+    parser.add_argument('--output', required=True, help='输出的prediction_config配置文件路径')
+    parser.add_argument('--grid', help='自定义搜索网格JSON文件（格式同DEFAULT_GRID）')
+    parser.add_argument('--min-samples', type=int, default=10, help='最少已验证样本数')
+    parser.add_argument('--dry-run', action='store_true', help='只输出结果，不写配置文件')
+    args = parser.parse_args()
+
+    grid = None
+    if args.grid:
+        with open(args.grid, 'r', encoding='utf-8') as f:
+            grid = json.load(f)
+
+    # 以现有配置为基准
+    analyzer = SignalAnalyzer(args.output if os.path.exists(args.output) else None)
+    tuner = ConfigTuner(args.db, analyzer, min_samples=args.min_samples)
+    result = tuner.grid_search(grid)
+    if result is None:
+        return 1
+
+    print(json.dumps(result, ensure_ascii=False, indent=2))
+    print(f"评估速度: {result['configs_evaluated'] / max(result['elapsed'], 1e-9):.0f}组/秒")
+
+    if result['accuracy'] <= result['baseline_accuracy']:
+        print("当前配置已是最优，无需更新")
+    elif not args.dry_run:
+        tuner.save_config(result, args.output)
+
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+数据库连接管理模块
+所有模块通过这里打开SQLite连接：启用WAL日志（读写互不阻塞）、设置忙等待超时，
+目录监控、HTTP服务、训练进程等多个进程同时写入同一个库时不再出现"database is locked"；
+线程内复用长连接，SQL语句的预编译结果可以在多次查询之间复用
+"""
+
+import sqlite3
+import logging
+import threading
+from typing import Dict
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# 等待其他进程释放写锁的时间（秒）
+BUSY_TIMEOUT = 30
+
+# 每个连接缓存的预编译语句数量
+CACHED_STATEMENTS = 256
+
+# 查询频繁的索引（对应的表存在时才创建）
+# predictions是prediction_history的视图（见prediction_store），按日期和反馈过滤的索引建在底层表上
+INDEXES = [
+    # 反馈按内容ID查找未验证的预测，统计按是否已验证过滤
+    ('idx_prediction_history_result', 'prediction_history', 'content_id, actual_result'),
+    # 每日/每周报告按日期范围查询
+    ('idx_prediction_history_date', 'prediction_history', 'date'),
+    # 待反馈列表查询actual_smile IS NULL
+    ('idx_prediction_history_actual', 'prediction_history', 'actual_result'),
+]
+
+_wal_enabled = set()
+_wal_lock = threading.Lock()
+
+
+def connect(db_path: str, check_same_thread: bool = True) -> sqlite3.Connection:
+    """
+    打开数据库连接（WAL日志、忙等待超时、预编译语句缓存）
+
+    Args:
+        db_path: 数据库路径
+        check_same_thread: 是否限制只在创建连接的线程中使用
+
+    Returns:
+        数据库连接
+    """
+    conn = sqlite3.connect(db_path, timeout=BUSY_TIMEOUT,
+                           check_same_thread=check_same_thread,
+                           cached_statements=CACHED_STATEMENTS)
+    conn.execute(f'PRAGMA busy_timeout = {BUSY_TIMEOUT * 1000}')
+
+    # WAL模式写入数据库文件后永久有效，每个进程只需设置一次
+    if db_path not in _wal_enabled:
+        with _wal_lock:
+            if db_path not in _wal_enabled:
+                try:
+                    mode = conn.execute('PRAGMA journal_mode = WAL').fetchone()[0]
+                    if mode.lower() != 'wal' and db_path != ':memory:':
+                        logger.warning(f"数据库不支持WAL模式({mode}): {db_path}")
+                except sqlite3.OperationalError as e:
+                    logger.warning(f"启用WAL模式失败: {db_path}, {e}")
+                _wal_enabled.add(db_path)
+
+    # WAL模式下NORMAL已能保证断电不损坏数据库，只可能丢失最后几个事务
+    conn.execute('PRAGMA synchronous = NORMAL')
+    return conn
+
+
+def ensure_indexes(conn: sqlite3.Connection):
+    """
+    创建常用查询的索引（跳过不存在的表）
+
+    Args:
+        conn: 数据库连接
+    """
+    tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    for name, table, columns in INDEXES:
+        if table in tables:
+            conn.execute(f'CREATE INDEX IF NOT EXISTS {name} ON {table}({columns})')
+    conn.commit()
+
+
+class ConnectionManager:
+    """按线程复用的数据库连接（同一线程的多次查询共用一个连接和语句缓存）"""
+
+    def __init__(self, row_factory=None):
+        """
+        初始化连接管理器
+
+        Args:
+            row_factory: 新连接的row_factory（如sqlite3.Row）
+        """
+        self.row_factory = row_factory
+        self._local = threading.local()
+        self._connections = {}
+        self._lock = threading.Lock()
+
+    def get(self, db_path: str) -> sqlite3.Connection:
+        """
+        获取当前线程的连接，不存在时创建
+
+        Args:
+            db_path: 数据库路径
+
+        Returns:
+            数据库连接（由管理器负责关闭，调用方不要关闭）
+        """
+        connections: Dict[str, sqlite3.Connection] = getattr(self._local, 'connections', None)
+        if connections is None:
+            connections = self._local.connections = {}
+
+        conn = connections.get(db_path)
+        if conn is None:
+            # 连接只在创建它的线程中使用，关闭时可能在其他线程，因此不做线程检查
+            conn = connect(db_path, check_same_thread=False)
+            if self.row_factory is not None:
+                conn.row_factory = self.row_factory
+            connections[db_path] = conn
+            with self._lock:
+                self._prune()
+                self._connections[(threading.get_ident(), db_path)] = (threading.current_thread(), conn)
+        return conn
+
+    def _prune(self):
+        """关闭已结束线程的连接（HTTP服务每个请求一个线程，避免连接累积）"""
+        for key, (thread, conn) in list(self._connections.items()):
+            if not thread.is_alive():
+                del self._connections[key]
+                conn.close()
+
+    def close_all(self):
+        """关闭所有线程创建的连接"""
+        with self._lock:
+            connections, self._connections = self._connections, {}
+        for _, conn in connections.values():
+            conn.close()
+        self._local = threading.local()
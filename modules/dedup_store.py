@@ -0,0 +1,423 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+去重索引模块
+所有入口（目录监控、HTTP上传、企业微信回调、小鹅通监控）共用的已处理记录，
+按(命名空间, 键)主键索引存放在SQLite中，查询只走索引，不需要启动时把全部记录读入内存；
+记录处理结果、来源和时间，定期清理过期的失败记录并回收空间
+"""
+
+import json
+import sqlite3
+import logging
+import threading
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Set
+
+from db_manager import connect
+from file_hash import FileHasher
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# 图片按文件内容哈希去重
+IMAGE_NAMESPACE = 'image'
+
+
+class DedupStore:
+    """已处理内容去重索引"""
+
+    # 每写入多少条清理一次
+    COMPACT_INTERVAL = 500
+
+    # IN查询每批的键数（SQLite参数个数上限）
+    LOOKUP_BATCH = 500
+
+    # 处理中的记录超过多少秒未完成视为处理进程已异常退出，可重新领取
+    PROCESSING_TIMEOUT = 3600
+
+    def __init__(self, db_path: str, failed_days: int = 30, retention_days: int = None):
+        """
+        初始化去重索引
+
+        Args:
+            db_path: 数据库路径（独立的库，回收空间不影响预测数据库）
+            failed_days: 处理失败的记录保留天数
+            retention_days: 全部记录的保留天数，None表示处理成功的记录永久保留
+                （监控目录中的历史图片依赖这些记录避免被补扫重复处理）
+        """
+        self.db_path = db_path
+        self.failed_days = failed_days
+        self.retention_days = retention_days
+        self._lock = threading.Lock()
+        self._writes = 0
+
+        self._create_tables()
+
+        # 文件哈希缓存与去重索引同库，在库初始化（设置增量回收）之后再建表
+        self.hasher = FileHasher(db_path)
+
+    def _connect(self) -> sqlite3.Connection:
+        """每次操作使用独立连接，多个服务进程可同时读写"""
+        return connect(self.db_path)
+
+    def _create_tables(self):
+        """创建数据表"""
+        conn = self._connect()
+        try:
+            self._enable_incremental_vacuum(conn)
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS processed_items (
+                    namespace TEXT NOT NULL,
+                    item_key TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    path TEXT,
+                    source TEXT,
+                    title TEXT,
+                    prediction_id INTEGER,
+                    error TEXT,
+                    first_seen TIMESTAMP,
+                    last_seen TIMESTAMP,
+                    hits INTEGER NOT NULL DEFAULT 1,
+                    PRIMARY KEY (namespace, item_key)
+                ) WITHOUT ROWID
+            ''')
+            conn.execute('''
+                CREATE INDEX IF NOT EXISTS idx_processed_items_last_seen
+                ON processed_items(status, last_seen)
+            ''')
+            conn.commit()
+        finally:
+            conn.close()
+
+    def _enable_incremental_vacuum(self, conn: sqlite3.Connection):
+        """
+        启用增量回收（compact中的incremental_vacuum只对auto_vacuum=INCREMENTAL的库有效）
+
+        已写入文件头的库（包括connect启用WAL后的新库）需要执行一次VACUUM才能生效
+        """
+        if conn.execute('PRAGMA auto_vacuum').fetchone()[0] == 2:
+            return
+
+        conn.execute('PRAGMA auto_vacuum = INCREMENTAL')
+        if conn.execute('PRAGMA auto_vacuum').fetchone()[0] != 2:
+            if conn.execute('SELECT COUNT(*) FROM sqlite_master').fetchone()[0]:
+                logger.info(f"去重索引数据库启用增量回收（执行一次VACUUM）: {self.db_path}")
+            conn.execute('VACUUM')
+
+    def get(self, key: str, namespace: str = IMAGE_NAMESPACE) -> Optional[Dict]:
+        """
+        查询一条记录
+
+        Args:
+            key: 内容哈希或内容ID
+            namespace: 命名空间
+
+        Returns:
+            记录字典，不存在时返回None
+        """
+        conn = self._connect()
+        try:
+            conn.row_factory = sqlite3.Row
+            row = conn.execute('''
+                SELECT * FROM processed_items WHERE namespace = ? AND item_key = ?
+            ''', (namespace, key)).fetchone()
+            return dict(row) if row else None
+        finally:
+            conn.close()
+
+    def is_processed(self, key: str, namespace: str = IMAGE_NAMESPACE) -> bool:
+        """是否已成功处理（失败的记录不算，允许重新处理）"""
+        record = self.get(key, namespace)
+        return record is not None and record['status'] == 'done'
+
+    def processed_keys(self, keys: Iterable[str], namespace: str = IMAGE_NAMESPACE) -> Set[str]:
+        """
+        批量查询已成功处理的键
+
+        Args:
+            keys: 内容哈希或内容ID
+            namespace: 命名空间
+
+        Returns:
+            其中已成功处理的键
+        """
+        keys = list(keys)
+        found = set()
+        conn = self._connect()
+        try:
+            for offset in range(0, len(keys), self.LOOKUP_BATCH):
+                batch = keys[offset:offset + self.LOOKUP_BATCH]
+                found.update(row[0] for row in conn.execute(f'''
+                    SELECT item_key FROM processed_items
+                    WHERE namespace = ? AND status = 'done'
+                      AND item_key IN ({','.join('?' * len(batch))})
+                ''', [namespace] + batch))
+        finally:
+            conn.close()
+        return found
+
+    def claim(self, key: str, namespace: str = IMAGE_NAMESPACE, path: str = None,
+              source: str = None) -> bool:
+        """
+        领取一个键开始处理（一条语句完成判断和写入，相同内容同时到达时只有一个领取成功）
+
+        没有记录、上次处理失败或处理中的记录已超时时领取成功，状态改为processing；
+        处理完成后用record()写入done或failed
+
+        Args:
+            key: 内容哈希或内容ID
+            namespace: 命名空间
+            path: 文件路径
+            source: 来源
+
+        Returns:
+            是否领取成功；已处理成功或正在由其他线程/进程处理时返回False
+        """
+        now = datetime.now()
+        conn = self._connect()
+        try:
+            with conn:
+                cursor = conn.execute('''
+                    INSERT INTO processed_items (
+                        namespace, item_key, status, path, source, first_seen, last_seen, hits
+                    ) VALUES (?, ?, 'processing', ?, ?, ?, ?, 0)
+                    ON CONFLICT(namespace, item_key) DO UPDATE SET
+                        status = 'processing',
+                        path = COALESCE(excluded.path, path),
+                        source = COALESCE(excluded.source, source),
+                        error = NULL,
+                        last_seen = excluded.last_seen
+                    WHERE status = 'failed' OR (status = 'processing' AND last_seen < ?)
+                ''', (namespace, key, path, source, now, now,
+                      now - timedelta(seconds=self.PROCESSING_TIMEOUT)))
+                return cursor.rowcount == 1
+        finally:
+            conn.close()
+
+    def record(self, key: str, namespace: str = IMAGE_NAMESPACE, status: str = 'done',
+               path: str = None, source: str = None, title: str = None,
+               prediction_id: int = None, error: str = None):
+        """
+        记录一次处理结果（已存在时更新状态和最近时间，保留首次时间）
+
+        Args:
+            key: 内容哈希或内容ID
+            namespace: 命名空间
+            status: done（处理成功）、failed（处理失败）或duplicate（重复内容再次出现）；
+                processing（处理中）由claim()写入
+            path: 文件路径
+            source: 来源
+            title: 标题
+            prediction_id: 预测记录ID
+            error: 失败原因
+        """
+        self.record_many([{
+            'key': key, 'status': status, 'path': path, 'source': source, 'title': title,
+            'prediction_id': prediction_id, 'error': error
+        }], namespace)
+
+    def record_many(self, items: List[Dict], namespace: str = IMAGE_NAMESPACE):
+        """
+        批量记录处理结果（一个事务）
+
+        Args:
+            items: [{'key', 'status', 'path', 'source', 'title', 'prediction_id', 'error',
+                     'first_seen'}, ...]，除key外均可省略
+            namespace: 命名空间
+        """
+        now = datetime.now()
+        conn = self._connect()
+        try:
+            with conn:
+                # duplicate只更新最近时间和次数，不改变原有状态
+                conn.executemany('''
+                    INSERT INTO processed_items (
+                        namespace, item_key, status, path, source, title, prediction_id, error,
+                        first_seen, last_seen
+                    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                    ON CONFLICT(namespace, item_key) DO UPDATE SET
+                        status = CASE WHEN excluded.status = 'duplicate' THEN status
+                                      ELSE excluded.status END,
+                        path = COALESCE(excluded.path, path),
+                        source = COALESCE(excluded.source, source),
+                        title = COALESCE(excluded.title, title),
+                        prediction_id = COALESCE(excluded.prediction_id, prediction_id),
+                        error = CASE WHEN excluded.status = 'duplicate' THEN error
+                                     ELSE excluded.error END,
+                        last_seen = excluded.last_seen,
+                        hits = hits + 1
+                ''', [
+                    (namespace, item['key'], item.get('status', 'done'), item.get('path'),
+                     item.get('source'), item.get('title'), item.get('prediction_id'),
+                     item.get('error'), item.get('first_seen') or now, now)
+                    for item in items
+                ])
+        finally:
+            conn.close()
+
+        with self._lock:
+            self._writes += len(items)
+            need_compact = self._writes >= self.COMPACT_INTERVAL
+            if need_compact:
+                self._writes = 0
+
+        if need_compact:
+            self.compact()
+
+    def import_lines(self, file_path: str, namespace: str = IMAGE_NAMESPACE,
+                     source: str = None) -> int:
+        """
+        导入旧的每行一个键的已处理列表（如processed_images.txt）
+
+        Args:
+            file_path: 列表文件路径
+            namespace: 命名空间
+            source: 来源
+
+        Returns:
+            导入的条数
+        """
+        with open(file_path, 'r') as f:
+            keys = {line.strip() for line in f if line.strip()}
+
+        self.record_many([{'key': key, 'source': source} for key in keys], namespace)
+        logger.info(f"已导入{len(keys)}条已处理记录: {file_path}")
+        return len(keys)
+
+    def import_json_history(self, file_path: str, namespaces: Dict[str, str],
+                            source: str = None) -> int:
+        """
+        导入旧的JSON内容历史（{分类: {内容ID: {'title', 'downloaded_at'}}}，如content_history.json）
+
+        Args:
+            file_path: JSON文件路径
+            namespaces: {JSON中的分类: 命名空间}
+            source: 来源
+
+        Returns:
+            导入的条数
+        """
+        with open(file_path, 'r', encoding='utf-8') as f:
+            history = json.load(f)
+
+        total = 0
+        for category, namespace in namespaces.items():
+            items = []
+            for key, info in (history.get(category) or {}).items():
+                info = info if isinstance(info, dict) else {}
+                try:
+                    first_seen = datetime.fromisoformat(info['downloaded_at'])
+                except (KeyError, TypeError, ValueError):
+                    first_seen = None
+                items.append({'key': key, 'source': source, 'title': info.get('title'),
+                              'first_seen': first_seen})
+            if items:
+                self.record_many(items, namespace)
+            total += len(items)
+
+        logger.info(f"已导入{total}条内容历史: {file_path}")
+        return total
+
+    def legacy_keys(self, namespace: str = IMAGE_NAMESPACE, key_length: int = 32) -> Set[str]:
+        """
+        旧版哈希算法生成的键（按长度区分，如32位十六进制的MD5）
+
+        Args:
+            namespace: 命名空间
+            key_length: 旧键的长度
+
+        Returns:
+            旧键集合
+        """
+        conn = self._connect()
+        try:
+            return {row[0] for row in conn.execute('''
+                SELECT item_key FROM processed_items WHERE namespace = ? AND length(item_key) = ?
+            ''', (namespace, key_length))}
+        finally:
+            conn.close()
+
+    def migrate_keys(self, mapping: Dict[str, str], namespace: str = IMAGE_NAMESPACE,
+                     archive_namespace: str = None, key_length: int = 32) -> int:
+        """
+        把旧键的记录复制到新键下（一个事务），其余旧键移入归档命名空间
+
+        Args:
+            mapping: {旧键: 新键}
+            namespace: 命名空间
+            archive_namespace: 找不到对应文件的旧键移入的命名空间，None表示保留原处
+            key_length: 旧键的长度
+
+        Returns:
+            迁移的条数
+        """
+        conn = self._connect()
+        try:
+            with conn:
+                migrated = 0
+                for old_key, new_key in mapping.items():
+                    migrated += conn.execute('''
+                        INSERT OR IGNORE INTO processed_items (
+                            namespace, item_key, status, path, source, title, prediction_id, error,
+                            first_seen, last_seen, hits
+                        )
+                        SELECT namespace, ?, status, path, source, title, prediction_id, error,
+                               first_seen, last_seen, hits
+                        FROM processed_items WHERE namespace = ? AND item_key = ?
+                    ''', (new_key, namespace, old_key)).rowcount
+
+                if archive_namespace:
+                    conn.execute('''
+                        UPDATE OR REPLACE processed_items SET namespace = ?
+                        WHERE namespace = ? AND length(item_key) = ?
+                    ''', (archive_namespace, namespace, key_length))
+        finally:
+            conn.close()
+
+        logger.info(f"去重索引迁移{migrated}条旧哈希记录")
+        return migrated
+
+    def compact(self) -> int:
+        """
+        清理过期记录并回收空间
+
+        Returns:
+            删除的条数
+        """
+        now = datetime.now()
+        conn = self._connect()
+        try:
+            with conn:
+                removed = conn.execute('''
+                    DELETE FROM processed_items WHERE status = 'failed' AND last_seen < ?
+                ''', (now - timedelta(days=self.failed_days),)).rowcount
+
+                if self.retention_days is not None:
+                    removed += conn.execute('''
+                        DELETE FROM processed_items WHERE last_seen < ?
+                    ''', (now - timedelta(days=self.retention_days),)).rowcount
+
+            # incremental_vacuum每执行一步释放一页，execute只执行一步，executescript执行到结束
+            conn.executescript('PRAGMA incremental_vacuum;')
+        finally:
+            conn.close()
+
+        if removed:
+            logger.info(f"去重索引清理{removed}条过期记录")
+        return removed
+
+    def get_stats(self) -> Dict:
+        """各命名空间各状态的记录数"""
+        conn = self._connect()
+        try:
+            rows = conn.execute('''
+                SELECT namespace, status, COUNT(*) FROM processed_items GROUP BY namespace, status
+            ''').fetchall()
+        finally:
+            conn.close()
+
+        stats = {}
+        for namespace, status, count in rows:
+            stats.setdefault(namespace, {})[status] = count
+        return stats
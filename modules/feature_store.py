@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+特征存储模块
+记录预测时把特征向量以float64二进制存入prediction_features表，每行带特征集版本号；
+训练和回测一次查询即可读出整个特征矩阵，无需逐条解析structured_data，
+特征提取逻辑变化（版本号变化）时在下次读取前按需补算过期的行
+"""
+
+import json
+import sqlite3
+import logging
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from db_manager import connect
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class FeatureStore:
+    """持久化特征存储"""
+
+    def __init__(self, db_path: str):
+        """
+        初始化特征存储
+
+        Args:
+            db_path: 数据库路径（与预测记录同库）
+        """
+        self.db_path = db_path
+        self.extractors = {}
+        self._create_tables()
+
+    def _connect(self) -> sqlite3.Connection:
+        """每次操作使用独立连接，训练进程和服务进程可同时访问"""
+        return connect(self.db_path)
+
+    def _create_tables(self):
+        """创建数据表"""
+        conn = self._connect()
+        try:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS prediction_features (
+                    prediction_id INTEGER NOT NULL,
+                    feature_set TEXT NOT NULL,
+                    version TEXT NOT NULL,
+                    dims INTEGER NOT NULL,
+                    features BLOB NOT NULL,
+                    created_at TIMESTAMP,
+                    PRIMARY KEY (prediction_id, feature_set)
+                )
+            ''')
+            conn.commit()
+        finally:
+            conn.close()
+
+    def register(self, feature_set: str, version, extractor: Callable[[Dict], List[float]]):
+        """
+        注册特征集
+
+        Args:
+            feature_set: 特征集名称
+            version: 特征集版本（特征提取逻辑变化时必须更换）
+            extractor: 由结构化数据计算特征向量的函数
+        """
+        self.extractors[feature_set] = (str(version), extractor)
+
+    def put(self, prediction_id: int, feature_set: str, features: List[float],
+            conn: sqlite3.Connection = None):
+        """
+        写入一条预测的特征向量
+
+        Args:
+            prediction_id: 预测记录ID
+            feature_set: 特征集名称
+            features: 特征向量
+            conn: 数据库连接（传入时在调用方事务中写入，由调用方提交）
+        """
+        self.put_many(feature_set, [(prediction_id, features)], conn)
+
+    def put_many(self, feature_set: str, items: List[Tuple[int, List[float]]],
+                 conn: sqlite3.Connection = None):
+        """
+        批量写入特征向量
+
+        Args:
+            feature_set: 特征集名称
+            items: [(预测记录ID, 特征向量), ...]
+            conn: 数据库连接（传入时在调用方事务中写入，由调用方提交）
+        """
+        version, _ = self.extractors[feature_set]
+        self._put_many(conn, feature_set, version, items)
+
+    def _put_many(self, conn, feature_set: str, version: str, items):
+        """批量写入特征向量"""
+        own_conn = conn is None
+        conn = conn or self._connect()
+        try:
+            now = datetime.now()
+            conn.executemany('''
+                INSERT OR REPLACE INTO prediction_features (
+                    prediction_id, feature_set, version, dims, features, created_at
+                ) VALUES (?, ?, ?, ?, ?, ?)
+            ''', [
+                (prediction_id, feature_set, version, len(features),
+                 np.asarray(features, dtype=np.float64).tobytes(), now)
+                for prediction_id, features in items
+            ])
+            if own_conn:
+                conn.commit()
+        finally:
+            if own_conn:
+                conn.close()
+
+    def get(self, prediction_id: int, feature_set: str,
+            conn: sqlite3.Connection = None) -> Optional[List[float]]:
+        """
+        读取一条预测的特征向量，缺失或版本过期时由structured_data重新计算并写入
+
+        Args:
+            prediction_id: 预测记录ID
+            feature_set: 特征集名称
+            conn: 数据库连接（传入时在调用方事务中写入，由调用方提交）
+
+        Returns:
+            特征向量，无法计算时返回None
+        """
+        version, extractor = self.extractors[feature_set]
+        own_conn = conn is None
+        conn = conn or self._connect()
+        try:
+            row = conn.execute('''
+                SELECT features FROM prediction_features
+                WHERE prediction_id = ? AND feature_set = ? AND version = ?
+            ''', (prediction_id, feature_set, version)).fetchone()
+            if row:
+                return np.frombuffer(row[0], dtype=np.float64).tolist()
+
+            row = conn.execute('''
+                SELECT mc.structured_data
+                FROM prediction_history ph
+                JOIN maoge_content mc ON ph.content_id = mc.id
+                WHERE ph.id = ?
+            ''', (prediction_id,)).fetchone()
+            if not row:
+                return None
+
+            features = extractor(json.loads(row[0]))
+            self._put_many(conn, feature_set, version, [(prediction_id, features)])
+            if own_conn:
+                conn.commit()
+            return features
+        finally:
+            if own_conn:
+                conn.close()
+
+    def backfill(self, feature_set: str, verified_only: bool = True, batch_size: int = 500) -> int:
+        """
+        补算缺失或版本过期的特征向量
+
+        Args:
+            feature_set: 特征集名称
+            verified_only: 只补算已验证的预测（训练和回测只需要这些）
+            batch_size: 每批写入的行数
+
+        Returns:
+            补算的行数
+        """
+        version, extractor = self.extractors[feature_set]
+
+        conn = self._connect()
+        try:
+            rows = conn.execute(f'''
+                SELECT ph.id, mc.structured_data
+                FROM prediction_history ph
+                JOIN maoge_content mc ON ph.content_id = mc.id
+                LEFT JOIN prediction_features pf
+                    ON pf.prediction_id = ph.id AND pf.feature_set = ?
+                WHERE (pf.prediction_id IS NULL OR pf.version != ?)
+                {'AND ph.actual_result IS NOT NULL' if verified_only else ''}
+            ''', (feature_set, version)).fetchall()
+
+            items = []
+            for prediction_id, structured_data in rows:
+                try:
+                    items.append((prediction_id, extractor(json.loads(structured_data))))
+                except (TypeError, ValueError):
+                    continue
+
+            for offset in range(0, len(items), batch_size):
+                with conn:
+                    self._put_many(conn, feature_set, version, items[offset:offset + batch_size])
+        finally:
+            conn.close()
+
+        if items:
+            logger.info(f"特征集{feature_set}（版本{version}）补算{len(items)}条")
+        return len(items)
+
+    def load_matrix(self, feature_set: str) -> Tuple[np.ndarray, np.ndarray, List[str]]:
+        """
+        读取全部已验证预测的特征矩阵（读取前补算缺失或过期的行）
+
+        Args:
+            feature_set: 特征集名称
+
+        Returns:
+            (预测ID数组, 特征矩阵(N, dims), 真实结果列表)
+        """
+        version, _ = self.extractors[feature_set]
+        self.backfill(feature_set)
+
+        conn = self._connect()
+        try:
+            rows = conn.execute('''
+                SELECT pf.prediction_id, pf.dims, pf.features, ph.actual_result
+                FROM prediction_features pf
+                JOIN prediction_history ph ON ph.id = pf.prediction_id
+                WHERE pf.feature_set = ? AND pf.version = ?
+                  AND ph.actual_result IS NOT NULL
+                ORDER BY pf.prediction_id
+            ''', (feature_set, version)).fetchall()
+        finally:
+            conn.close()
+
+        if not rows:
+            return np.zeros(0, dtype=np.int64), np.zeros((0, 0)), []
+
+        ids, dims, blobs, labels = zip(*rows)
+        matrix = np.frombuffer(b''.join(blobs), dtype=np.float64).reshape(len(rows), dims[0])
+        return np.asarray(ids, dtype=np.int64), matrix, list(labels)
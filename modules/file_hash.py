@@ -0,0 +1,348 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+文件哈希模块
+分块流式计算内容哈希（不把整个文件读入内存，大文件计算时释放GIL，可多线程并行），
+按(路径, 大小, 修改时间)缓存结果，去重索引、OCR缓存键等共用同一个哈希值，同一文件只计算一次；
+大小+首尾采样的快速签名用于补扫时预筛，从未出现过的内容不必先计算完整哈希
+"""
+
+import os
+import sqlite3
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional
+
+from db_manager import connect
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# 分块读取大小
+CHUNK_SIZE = 1024 * 1024
+
+# 快速签名的首尾采样大小
+SAMPLE_SIZE = 64 * 1024
+
+# 内容哈希算法：支持SHA扩展指令的CPU上SHA-256比MD5和BLAKE2b都快，且与OCR缓存原有的键一致；
+# 64位十六进制，与旧版32位十六进制的MD5哈希可以区分
+DIGEST_ALGORITHM = 'sha256'
+
+
+def new_digest():
+    """新建内容哈希对象"""
+    return hashlib.new(DIGEST_ALGORITHM)
+
+
+def file_digests(file_path: str, hashers: List, chunk_size: int = CHUNK_SIZE) -> List[str]:
+    """
+    一次读取同时计算多个哈希（如迁移旧哈希时同时计算MD5和内容哈希）
+
+    Args:
+        file_path: 文件路径
+        hashers: hashlib哈希对象列表
+        chunk_size: 分块读取大小
+
+    Returns:
+        各哈希的十六进制值
+    """
+    buffer = bytearray(chunk_size)
+    view = memoryview(buffer)
+    with open(file_path, 'rb', buffering=0) as f:
+        while True:
+            size = f.readinto(buffer)
+            if not size:
+                break
+            for hasher in hashers:
+                hasher.update(view[:size])
+    return [hasher.hexdigest() for hasher in hashers]
+
+
+def file_digest(file_path: str, chunk_size: int = CHUNK_SIZE) -> str:
+    """
+    分块流式计算文件内容哈希
+
+    Args:
+        file_path: 文件路径
+        chunk_size: 分块读取大小
+
+    Returns:
+        十六进制内容哈希
+    """
+    return file_digests(file_path, [new_digest()], chunk_size)[0]
+
+
+def quick_signature(file_path: str, sample_size: int = SAMPLE_SIZE) -> str:
+    """
+    快速签名：文件大小+开头和结尾各sample_size字节的哈希
+
+    签名不同的文件内容一定不同；签名相同时需要完整哈希确认
+
+    Args:
+        file_path: 文件路径
+        sample_size: 首尾采样大小
+
+    Returns:
+        十六进制签名
+    """
+    hasher = hashlib.blake2b(digest_size=16)
+    with open(file_path, 'rb') as f:
+        f.seek(0, os.SEEK_END)
+        size = f.tell()
+        hasher.update(str(size).encode())
+        f.seek(0)
+        hasher.update(f.read(sample_size))
+        if size > sample_size:
+            f.seek(max(sample_size, size - sample_size))
+            hasher.update(f.read(sample_size))
+    return hasher.hexdigest()
+
+
+class FileHasher:
+    """带缓存的文件内容哈希（文件大小和修改时间不变时不重新读取）"""
+
+    def __init__(self, db_path: Optional[str] = None, max_entries: int = 10000):
+        """
+        初始化文件哈希器
+
+        Args:
+            db_path: 持久化哈希缓存的数据库路径，为None时只缓存在内存中
+            max_entries: 内存缓存的最大条目数
+        """
+        self.db_path = db_path
+        self.max_entries = max_entries
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+
+        if db_path:
+            self._create_tables()
+
+    def _connect(self) -> sqlite3.Connection:
+        """每次操作使用独立连接，多个进程可同时读写"""
+        return connect(self.db_path)
+
+    def _create_tables(self):
+        """创建数据表"""
+        conn = self._connect()
+        try:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS file_digests (
+                    path TEXT PRIMARY KEY,
+                    size INTEGER NOT NULL,
+                    mtime_ns INTEGER NOT NULL,
+                    quick TEXT,
+                    digest TEXT NOT NULL,
+                    hashed_at TIMESTAMP
+                )
+            ''')
+            conn.execute('''
+                CREATE INDEX IF NOT EXISTS idx_file_digests_quick
+                ON file_digests(size, quick)
+            ''')
+            conn.commit()
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _stat(file_path: str):
+        """文件的(大小, 修改时间)"""
+        stat = os.stat(file_path)
+        return stat.st_size, stat.st_mtime_ns
+
+    def _remember(self, file_path: str, size: int, mtime_ns: int, digest: str):
+        """写入内存缓存"""
+        with self._lock:
+            self._memory[file_path] = (size, mtime_ns, digest)
+            self._memory.move_to_end(file_path)
+            while len(self._memory) > self.max_entries:
+                self._memory.popitem(last=False)
+
+    def _lookup_memory(self, file_path: str, size: int, mtime_ns: int) -> Optional[str]:
+        """查询内存缓存（文件变化后视为未命中）"""
+        with self._lock:
+            cached = self._memory.get(file_path)
+        if cached and cached[:2] == (size, mtime_ns):
+            return cached[2]
+        return None
+
+    def cached_digests(self, files: Dict[str, tuple]) -> Dict[str, str]:
+        """
+        查询已缓存且文件未变化的哈希（不读取文件内容）
+
+        Args:
+            files: {路径: (大小, 修改时间纳秒)}
+
+        Returns:
+            {路径: 哈希}
+        """
+        found = {}
+        missing = []
+        for path, (size, mtime_ns) in files.items():
+            digest = self._lookup_memory(path, size, mtime_ns)
+            if digest:
+                found[path] = digest
+            else:
+                missing.append(path)
+
+        if self.db_path and missing:
+            conn = self._connect()
+            try:
+                for offset in range(0, len(missing), 500):
+                    batch = missing[offset:offset + 500]
+                    rows = conn.execute(f'''
+                        SELECT path, size, mtime_ns, digest FROM file_digests
+                        WHERE path IN ({','.join('?' * len(batch))})
+                    ''', batch).fetchall()
+                    for path, size, mtime_ns, digest in rows:
+                        if files[path] == (size, mtime_ns):
+                            found[path] = digest
+                            self._remember(path, size, mtime_ns, digest)
+            finally:
+                conn.close()
+        return found
+
+    def digest(self, file_path: str) -> str:
+        """
+        文件内容哈希（文件未变化时直接返回缓存）
+
+        Args:
+            file_path: 文件路径
+
+        Returns:
+            十六进制内容哈希
+
+        Raises:
+            OSError: 文件无法读取
+        """
+        size, mtime_ns = self._stat(file_path)
+        cached = self.cached_digests({file_path: (size, mtime_ns)})
+        if cached:
+            return cached[file_path]
+
+        digest = file_digest(file_path)
+        self.store({file_path: (size, mtime_ns, digest)})
+        return digest
+
+    def digest_many(self, file_paths: Iterable[str], workers: int = 4) -> Dict[str, str]:
+        """
+        批量计算文件内容哈希（未缓存的文件多线程并行读取）
+
+        Args:
+            file_paths: 文件路径
+            workers: 并行线程数
+
+        Returns:
+            {路径: 哈希}，无法读取的文件不在结果中
+        """
+        files = {}
+        for path in file_paths:
+            try:
+                files[path] = self._stat(path)
+            except OSError:
+                continue
+
+        digests = self.cached_digests(files)
+        missing = [path for path in files if path not in digests]
+        if not missing:
+            return digests
+
+        def compute(path):
+            try:
+                return file_digest(path)
+            except OSError:
+                return None
+
+        computed = {}
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            for path, digest in zip(missing, executor.map(compute, missing)):
+                if digest:
+                    computed[path] = files[path] + (digest,)
+
+        self.store(computed)
+        digests.update({path: item[2] for path, item in computed.items()})
+        return digests
+
+    def store(self, items: Dict[str, tuple], quick: Dict[str, str] = None):
+        """
+        写入哈希缓存
+
+        Args:
+            items: {路径: (大小, 修改时间纳秒, 哈希)}
+            quick: {路径: 快速签名}，未提供时计算
+        """
+        if not items:
+            return
+
+        for path, (size, mtime_ns, digest) in items.items():
+            self._remember(path, size, mtime_ns, digest)
+
+        if not self.db_path:
+            return
+
+        quick = dict(quick or {})
+        for path in items:
+            if path not in quick:
+                try:
+                    quick[path] = quick_signature(path)
+                except OSError:
+                    quick[path] = None
+
+        now = datetime.now()
+        conn = self._connect()
+        try:
+            with conn:
+                conn.executemany('''
+                    INSERT OR REPLACE INTO file_digests (path, size, mtime_ns, quick, digest, hashed_at)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                ''', [
+                    (path, size, mtime_ns, quick[path], digest, now)
+                    for path, (size, mtime_ns, digest) in items.items()
+                ])
+        finally:
+            conn.close()
+
+    def known_signatures(self, signatures: Dict[str, tuple]) -> Dict[str, bool]:
+        """
+        快速签名预筛：是否有相同大小和快速签名的内容计算过完整哈希
+
+        返回False的文件内容从未出现过，不必计算完整哈希即可确定不是重复内容
+
+        Args:
+            signatures: {路径: (大小, 快速签名)}
+
+        Returns:
+            {路径: 是否可能是已知内容}
+        """
+        if not self.db_path:
+            return {path: True for path in signatures}
+
+        conn = self._connect()
+        try:
+            return {
+                path: conn.execute('''
+                    SELECT 1 FROM file_digests WHERE size = ? AND quick = ? LIMIT 1
+                ''', (size, quick)).fetchone() is not None
+                for path, (size, quick) in signatures.items()
+            }
+        finally:
+            conn.close()
+
+    def forget(self, file_paths: Iterable[str]):
+        """删除已不存在的文件的缓存"""
+        file_paths = list(file_paths)
+        with self._lock:
+            for path in file_paths:
+                self._memory.pop(path, None)
+
+        if self.db_path and file_paths:
+            conn = self._connect()
+            try:
+                with conn:
+                    conn.executemany('DELETE FROM file_digests WHERE path = ?',
+                                     [(path,) for path in file_paths])
+            finally:
+                conn.close()
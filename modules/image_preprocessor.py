@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+图片预处理模块
+在上传视觉API之前压缩图片：裁掉纯色边框、缩小尺寸、转灰度并重新编码，
+减少请求体积、上传耗时和视觉token消耗
+"""
+
+import io
+import os
+import logging
+import threading
+from typing import Dict, Optional, Tuple
+
+try:
+    from PIL import Image, ImageChops
+except ImportError:
+    Image = None
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# 按扩展名推断的原始图片MIME类型
+MIME_TYPES = {
+    '.png': 'image/png',
+    '.jpg': 'image/jpeg',
+    '.jpeg': 'image/jpeg',
+    '.gif': 'image/gif',
+    '.bmp': 'image/bmp',
+    '.webp': 'image/webp'
+}
+
+
+class ImagePreprocessor:
+    """图片预处理器（基于Pillow）"""
+
+    def __init__(self, max_long_edge: Optional[int] = 1600, grayscale: bool = True,
+                 output_format: str = 'JPEG', quality: int = 85,
+                 autocrop: bool = True, crop_tolerance: int = 12,
+                 enabled: bool = True):
+        """
+        初始化图片预处理器
+
+        Args:
+            max_long_edge: 长边最大像素数，为None时不缩放
+            grayscale: 是否转为灰度图（猫哥图文以文字为主，颜色信息价值不大）
+            output_format: 输出格式（JPEG/WEBP）
+            quality: 编码质量（1-100）
+            autocrop: 是否自动裁掉纯色边框
+            crop_tolerance: 判定为边框的像素差容忍度
+            enabled: 是否启用预处理，关闭时直接上传原图
+        """
+        self.max_long_edge = max_long_edge
+        self.grayscale = grayscale
+        self.output_format = output_format.upper()
+        self.quality = quality
+        self.autocrop = autocrop
+        self.crop_tolerance = crop_tolerance
+
+        # 累计统计（prepare在多个OCR线程中并发调用，更新时加锁）
+        self._stats_lock = threading.Lock()
+        self.stats = {
+            'images': 0,
+            'original_bytes': 0,
+            'processed_bytes': 0
+        }
+
+        self.enabled = enabled and Image is not None
+        if enabled and Image is None:
+            logger.warning("Pillow未安装，图片预处理已禁用，将直接上传原图")
+
+    def signature(self) -> str:
+        """预处理参数签名（参数变化时OCR缓存自动失效）"""
+        if not self.enabled:
+            return 'raw'
+        return (f"{self.max_long_edge}-{int(self.grayscale)}-{self.output_format}-"
+                f"{self.quality}-{int(self.autocrop)}-{self.crop_tolerance}")
+
+    def prepare(self, image_path: str) -> Tuple[bytes, str, Dict]:
+        """
+        预处理图片
+
+        Args:
+            image_path: 图片路径
+
+        Returns:
+            (图片字节, MIME类型, 本次预处理统计)
+        """
+        with open(image_path, 'rb') as f:
+            raw = f.read()
+
+        raw_mime = MIME_TYPES.get(os.path.splitext(image_path)[1].lower(), 'image/png')
+        data, mime = raw, raw_mime
+        size = None
+
+        if self.enabled:
+            try:
+                data, mime, size = self._process(raw)
+
+                # 压缩后反而更大时直接使用原图
+                if len(data) >= len(raw):
+                    data, mime = raw, raw_mime
+            except Exception as e:
+                logger.warning(f"图片预处理失败，使用原图: {e}")
+                data, mime = raw, raw_mime
+
+        saved = len(raw) - len(data)
+        result = {
+            'original_bytes': len(raw),
+            'processed_bytes': len(data),
+            'saved_bytes': saved,
+            'saved_ratio': saved / len(raw) if raw else 0,
+            'size': size
+        }
+
+        with self._stats_lock:
+            self.stats['images'] += 1
+            self.stats['original_bytes'] += len(raw)
+            self.stats['processed_bytes'] += len(data)
+
+        logger.info(f"图片预处理: {len(raw) / 1024:.0f}KB -> {len(data) / 1024:.0f}KB，"
+                    f"节省{result['saved_ratio']:.0%}")
+
+        return data, mime, result
+
+    def _process(self, raw: bytes) -> Tuple[bytes, str, Tuple[int, int]]:
+        """裁边、缩放、转灰度并重新编码"""
+        img = Image.open(io.BytesIO(raw))
+        img.load()
+
+        # 透明背景铺白底，避免JPEG编码后变黑
+        if img.mode in ('RGBA', 'LA', 'P'):
+            img = img.convert('RGBA')
+            background = Image.new('RGBA', img.size, (255, 255, 255, 255))
+            img = Image.alpha_composite(background, img)
+
+        img = img.convert('L' if self.grayscale else 'RGB')
+
+        if self.autocrop:
+            img = self._crop_border(img)
+
+        if self.max_long_edge and max(img.size) > self.max_long_edge:
+            scale = self.max_long_edge / max(img.size)
+            new_size = (max(1, round(img.width * scale)), max(1, round(img.height * scale)))
+            img = img.resize(new_size, Image.LANCZOS)
+
+        buffer = io.BytesIO()
+        img.save(buffer, format=self.output_format, quality=self.quality, optimize=True)
+
+        return buffer.getvalue(), f"image/{self.output_format.lower()}", img.size
+
+    def _crop_border(self, img):
+        """裁掉与左上角像素颜色一致的纯色边框"""
+        gray = img if img.mode == 'L' else img.convert('L')
+        background = Image.new('L', gray.size, gray.getpixel((0, 0)))
+        diff = ImageChops.difference(gray, background)
+        mask = diff.point(lambda p: 255 if p > self.crop_tolerance else 0)
+        bbox = mask.getbbox()
+
+        if not bbox:
+            return img
+
+        # 保留少量边距，避免文字贴边影响识别
+        padding = 8
+        left, top, right, bottom = bbox
+        bbox = (
+            max(0, left - padding),
+            max(0, top - padding),
+            min(img.width, right + padding),
+            min(img.height, bottom + padding)
+        )
+
+        return img.crop(bbox) if bbox != (0, 0, img.width, img.height) else img
+
+    def get_stats(self) -> Dict:
+        """获取累计预处理统计"""
+        with self._stats_lock:
+            images = self.stats['images']
+            original = self.stats['original_bytes']
+            processed = self.stats['processed_bytes']
+        return {
+            'images': images,
+            'original_bytes': original,
+            'processed_bytes': processed,
+            'saved_bytes': original - processed,
+            'saved_ratio': (original - processed) / original if original > 0 else 0
+        }
+
+
+if __name__ == '__main__':
+    # 测试代码
+    import sys
+    import json
+
+    preprocessor = ImagePreprocessor()
+
+    for path in sys.argv[1:]:
+        _, mime, result = preprocessor.prepare(path)
+        print(f"{path} ({mime}):")
+        print(json.dumps(result, ensure_ascii=False, indent=2))
+
+    print("\n累计统计:")
+    print(json.dumps(preprocessor.get_stats(), ensure_ascii=False, indent=2))
@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+关键词匹配模块
+基于Aho-Corasick自动机的多模式匹配，一次扫描文本即可得到所有关键词的位置和次数，
+词典规模增长到数百个词（含同义词和"不建议建仓"之类的否定说法）也不会线性变慢
+"""
+
+import json
+import logging
+from collections import deque
+from typing import Dict, Iterable, List, Set
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# 笑脸暗示词典（SemanticAnalyzer.extract_smile_hints）
+SMILE_LEXICON = {
+    'buy': ['买入', '建仓', '加仓', '机会', '低位', '超跌', '安全'],
+    'sell': ['卖出', '减仓', '清仓', '风险', '高位', '超买', '警戒'],
+    'negated': [
+        '不建议买入', '暂不买入', '不建议建仓', '暂不建仓', '不宜建仓', '不建议加仓', '不要加仓',
+        '不建议卖出', '暂不卖出', '不建议减仓', '无需减仓', '不宜减仓', '不建议清仓', '不要清仓'
+    ]
+}
+
+# 操作建议词典（SignalAnalyzer按操作建议分类）
+ACTION_LEXICON = {
+    'buy': ['建仓', '加仓'],
+    'sell': ['减仓', '清仓'],
+    'hold': ['观望', '持有'],
+    'negated': [
+        '不建议建仓', '暂不建仓', '不宜建仓', '不建议加仓', '不要加仓', '暂停加仓',
+        '不建议减仓', '无需减仓', '不宜减仓', '不建议清仓', '不要清仓'
+    ]
+}
+
+
+class KeywordMatcher:
+    """多模式关键词匹配器（Aho-Corasick自动机）"""
+
+    def __init__(self, lexicon: Dict[str, Iterable[str]]):
+        """
+        初始化关键词匹配器
+
+        Args:
+            lexicon: 词典，{类别: [关键词, ...]}
+        """
+        self.lexicon = {category: list(words) for category, words in lexicon.items()}
+        self._build()
+
+    @classmethod
+    def from_file(cls, path: str, base: Dict[str, Iterable[str]] = None) -> 'KeywordMatcher':
+        """
+        从JSON词典文件创建匹配器
+
+        Args:
+            path: 词典文件路径，格式 {类别: [关键词, ...]}
+            base: 基础词典，文件中的词追加到基础词典上
+
+        Returns:
+            关键词匹配器
+        """
+        matcher = cls(base or {})
+        with open(path, 'r', encoding='utf-8') as f:
+            for category, words in json.load(f).items():
+                matcher.add_keywords(category, words)
+        return matcher
+
+    def add_keywords(self, category: str, keywords: Iterable[str]):
+        """
+        追加关键词并重建自动机
+
+        Args:
+            category: 类别
+            keywords: 关键词列表
+        """
+        words = self.lexicon.setdefault(category, [])
+        for keyword in keywords:
+            if keyword not in words:
+                words.append(keyword)
+        self._build()
+
+    def _build(self):
+        """构建Aho-Corasick自动机"""
+        self._goto = [{}]
+        self._fail = [0]
+        self._output = [[]]
+        self._categories = {}
+
+        for category, words in self.lexicon.items():
+            for word in words:
+                if not word:
+                    continue
+                self._categories.setdefault(word, [])
+                if category not in self._categories[word]:
+                    self._categories[word].append(category)
+
+                state = 0
+                for char in word:
+                    if char not in self._goto[state]:
+                        self._goto.append({})
+                        self._fail.append(0)
+                        self._output.append([])
+                        self._goto[state][char] = len(self._goto) - 1
+                    state = self._goto[state][char]
+                if word not in self._output[state]:
+                    self._output[state].append(word)
+
+        # 广度优先计算失败指针
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, child in self._goto[state].items():
+                queue.append(child)
+                fail = self._fail[state]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                target = self._goto[fail].get(char, 0)
+                self._fail[child] = target if target != child else 0
+                self._output[child] = self._output[child] + self._output[self._fail[child]]
+
+    def scan(self, text: str) -> List[Dict]:
+        """
+        扫描文本，返回互不重叠的关键词命中（同一位置取最长的词，
+        因此"不建议建仓"会覆盖其中的"建仓"）
+
+        Args:
+            text: 文本
+
+        Returns:
+            [{'keyword', 'categories', 'position'}, ...]，按位置排序
+        """
+        matches = []
+        state = 0
+
+        for index, char in enumerate(text):
+            while state and char not in self._goto[state]:
+                state = self._fail[state]
+            state = self._goto[state].get(char, 0)
+            for word in self._output[state]:
+                matches.append((index - len(word) + 1, len(word), word))
+
+        # 最左最长、互不重叠
+        matches.sort(key=lambda m: (m[0], -m[1]))
+        hits = []
+        end = 0
+        for start, length, word in matches:
+            if start < end:
+                continue
+            hits.append({
+                'keyword': word,
+                'categories': self._categories[word],
+                'position': start
+            })
+            end = start + length
+
+        return hits
+
+    def count(self, text: str) -> Dict[str, Dict[str, int]]:
+        """
+        统计各类别关键词的命中次数
+
+        Args:
+            text: 文本
+
+        Returns:
+            {类别: {关键词: 次数}}
+        """
+        return self.tally(self.scan(text))
+
+    def tally(self, hits: List[Dict]) -> Dict[str, Dict[str, int]]:
+        """
+        按类别汇总已有的命中结果（避免重复扫描）
+
+        Args:
+            hits: scan()的返回结果
+
+        Returns:
+            {类别: {关键词: 次数}}
+        """
+        counts = {category: {} for category in self.lexicon}
+        for hit in hits:
+            for category in hit['categories']:
+                counts[category][hit['keyword']] = counts[category].get(hit['keyword'], 0) + 1
+        return counts
+
+    def categories(self, text: str) -> Set[str]:
+        """
+        返回文本命中的类别集合
+
+        Args:
+            text: 文本
+
+        Returns:
+            类别集合
+        """
+        return {category for hit in self.scan(text) for category in hit['categories']}
+
+
+if __name__ == '__main__':
+    # 测试代码
+    matcher = KeywordMatcher(SMILE_LEXICON)
+
+    test_text = "当前处于低位，超跌明显，激进投资者可以建仓；但不建议加仓，注意风险。"
+
+    print("命中关键词:")
+    print(json.dumps(matcher.scan(test_text), ensure_ascii=False, indent=2))
+    print("\n类别统计:")
+    print(json.dumps(matcher.count(test_text), ensure_ascii=False, indent=2))
@@ -5,80 +5,167 @@
 记录预测结果，与真实笑脸比对，优化预测模型
 """
 
+import os
 import json
+import time
 import logging
-import sqlite3
-from datetime import datetime
+import threading
+from datetime import datetime, timedelta
 from typing import Dict, List, Optional
-import pickle
+
+from db_manager import connect
+from keyword_matcher import KeywordMatcher, ACTION_LEXICON
+from model_registry import ModelRegistry
+from model_inference import ModelPredictor
+from feature_store import FeatureStore
+from online_learner import OnlineNaiveBayes
+from prediction_store import PredictionRepository
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# 机器学习特征（extract_features的输出顺序）；修改特征提取逻辑时必须提升版本号，
+# 特征存储会在下次训练前自动补算旧版本的特征
+FEATURE_SCHEMA_VERSION = 1
+FEATURE_NAMES = [
+    'cycle_buy', 'cycle_hold', 'cycle_sell',
+    'trend_up', 'trend_down', 'trend_range',
+    'risk_low', 'risk_medium', 'risk_high',
+    'confidence_strong', 'confidence_medium', 'confidence_weak',
+    'sentiment_optimistic', 'sentiment_pessimistic',
+    'has_buy_suggestion', 'has_sell_suggestion',
+    'gold_volatility'
+]
+
+# 反馈后的延迟优化在pending_tasks中的任务名称
+OPTIMIZE_TASK = 'optimize'
+
+
+def extract_features(data: Dict, action_matcher: KeywordMatcher) -> List[float]:
+    """
+    从结构化数据中提取特征向量（按FEATURE_NAMES顺序）
+
+    Args:
+        data: 语义分析的结构化数据
+        action_matcher: 操作建议分类器（KeywordMatcher(ACTION_LEXICON)）
+
+    Returns:
+        特征向量
+    """
+    features = []
+
+    # 市场周期特征 (one-hot编码)
+    cycle = data.get('market_cycle', '未明确')
+    features.append(1 if cycle == '买入期' else 0)
+    features.append(1 if cycle == '持有期' else 0)
+    features.append(1 if cycle == '减仓期' else 0)
+
+    # 趋势判断特征 (one-hot编码)
+    trend = data.get('trend_judgment', '未明确')
+    features.append(1 if trend == '看涨' else 0)
+    features.append(1 if trend == '看跌' else 0)
+    features.append(1 if trend == '震荡' else 0)
+
+    # 风险等级特征 (one-hot编码)
+    risk = data.get('risk_assessment', {}).get('risk_level', '未明确')
+    features.append(1 if risk == '低' else 0)
+    features.append(1 if risk == '中' else 0)
+    features.append(1 if risk == '高' else 0)
+
+    # 信号强度特征 (one-hot编码)
+    confidence = data.get('confidence', '弱')
+    features.append(1 if confidence == '强' else 0)
+    features.append(1 if confidence == '中' else 0)
+    features.append(1 if confidence == '弱' else 0)
+
+    # 情绪特征 (one-hot编码)
+    sentiment = data.get('sentiment', '中性')
+    features.append(1 if sentiment == '乐观' else 0)
+    features.append(1 if sentiment == '悲观' else 0)
+
+    # 操作建议特征
+    suggestions = data.get('operation_suggestions', [])
+    action_categories = [action_matcher.categories(s.get('action') or '')
+                         for s in suggestions]
+    has_buy = any('buy' in c for c in action_categories)
+    has_sell = any('sell' in c for c in action_categories)
+    features.append(1 if has_buy else 0)
+    features.append(1 if has_sell else 0)
+
+    # 波动率特征
+    indicators = data.get('key_indicators', {})
+    volatility = indicators.get('gold_volatility')
+    if volatility:
+        try:
+            vol_value = float(volatility)
+            features.append(vol_value / 100)  # 归一化
+        except ValueError:
+            features.append(0)
+    else:
+        features.append(0)
+
+    return features
+
+
 
 class LearningOptimizer:
     """学习优化器"""
     
-    def __init__(self, db_path='/home/ubuntu/maoge_signal_reader/data/maoge_content.db'):
+    def __init__(self, db_path='/home/ubuntu/maoge_signal_reader/data/maoge_content.db',
+                 optimize_delay: float = 300, optimize_max_delay: float = 1800,
+                 model_dir: str = None, model_type: str = 'forest',
+                 run_pending: bool = False, pending_poll_interval: float = 60):
         """
         初始化学习优化器
         
         Args:
             db_path: 数据库路径
+            model_dir: 模型文件目录，默认为数据库所在目录下的models
+            model_type: 推理使用的模型，forest（训练进程产出的随机森林）或online（在线学习）
+            optimize_delay: 反馈后延迟多少秒执行后台优化（期间的新反馈会重新计时）
+            optimize_max_delay: 持续有反馈时，距第一次未处理反馈最多等待多少秒
+            run_pending: 是否负责执行其他进程留下的后台优化（包括重启前未执行的），
+                只应在一个常驻服务进程中启用；短时运行的命令行进程退出后由该进程接手
+            pending_poll_interval: run_pending时检查待执行后台优化的间隔（秒）
         """
         self.db_path = db_path
-        self.conn = sqlite3.connect(db_path)
-        self._create_tables()
+        self.repo = PredictionRepository(db_path)
         self.model = None
+        self.registry = ModelRegistry(db_path, model_dir)
+        self._predictor = None
+        self._schema_mismatch = None
+        self.features = FeatureStore(db_path)
+        self.features.register('ml', FEATURE_SCHEMA_VERSION, self._extract_features)
+        
+        # 在线学习模型随每条反馈更新（无论推理使用哪种模型）
+        self.model_type = model_type
+        self.online = OnlineNaiveBayes(db_path, FEATURE_NAMES, continuous=['gold_volatility'])
+        self.action_matcher = KeywordMatcher(ACTION_LEXICON)
+        
+        # 后台优化（防抖）
+        self.optimize_delay = optimize_delay
+        self.optimize_max_delay = optimize_max_delay
+        self._optimize_timer = None
+        self._optimize_pending_since = None
+        self._schedule_lock = threading.Lock()
+        self._optimize_lock = threading.Lock()
+        
+        # 多个进程共用pending_tasks中的同一条记录，执行前按领取者标识原子领取
+        self._owner = f"{os.getpid()}-{id(self):x}"
+        self.pending_poll_interval = pending_poll_interval
+        self._stop_pending = threading.Event()
+        self._pending_thread = None
+        if run_pending:
+            self._pending_thread = threading.Thread(target=self._watch_pending_optimize,
+                                                    name='pending-optimize', daemon=True)
+            self._pending_thread.start()
+        
         logger.info("学习优化器初始化成功")
     
-    def _create_tables(self):
-        """创建数据表"""
-        # 预测历史表
-        self.conn.execute('''
-            CREATE TABLE IF NOT EXISTS prediction_history (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                content_id INTEGER,
-                prediction TEXT,
-                confidence REAL,
-                smile_count REAL,
-                buy_score REAL,
-                sell_score REAL,
-                predicted_at TIMESTAMP,
-                actual_result TEXT,
-                actual_smile_count REAL,
-                verified_at TIMESTAMP,
-                is_correct INTEGER,
-                FOREIGN KEY (content_id) REFERENCES maoge_content(id)
-            )
-        ''')
-        
-        # 模型性能表
-        self.conn.execute('''
-            CREATE TABLE IF NOT EXISTS model_performance (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                model_version TEXT,
-                total_predictions INTEGER,
-                correct_predictions INTEGER,
-                accuracy REAL,
-                avg_confidence REAL,
-                evaluated_at TIMESTAMP
-            )
-        ''')
-        
-        # 错误案例表
-        self.conn.execute('''
-            CREATE TABLE IF NOT EXISTS error_cases (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                prediction_id INTEGER,
-                error_type TEXT,
-                analysis TEXT,
-                created_at TIMESTAMP,
-                FOREIGN KEY (prediction_id) REFERENCES prediction_history(id)
-            )
-        ''')
-        
-        self.conn.commit()
+    @property
+    def conn(self):
+        """当前线程的数据库连接（表结构由PredictionRepository管理）"""
+        return self.repo.connection()
     
     def record_prediction(self, content_id: int, prediction: Dict) -> int:
         """
@@ -91,34 +178,85 @@ class LearningOptimizer:
         Returns:
             预测记录ID
         """
+        return self.save_predictions([{
+            'content_id': content_id,
+            'prediction': prediction['prediction'],
+            'confidence': prediction['confidence'],
+            'smile_count': prediction.get('smile_count', 0),
+            'buy_score': prediction.get('buy_score', 0),
+            'sell_score': prediction.get('sell_score', 0),
+            'source': prediction.get('source', 'rules'),
+            'model_version': prediction.get('model_version'),
+            'features': prediction.get('features')
+        }])[0]
+    
+    def save_prediction(self, date: str, image_path: str, text_content: str,
+                        analysis_result: str, predicted_smile: str, confidence: float,
+                        predicted_count: float = 0, source: str = 'rules',
+                        model_version: str = None, features: List[float] = None,
+                        buy_score: float = 0, sell_score: float = 0) -> int:
+        """
+        保存一次图文分析的内容和预测结果
+        
+        Args:
+            date: 内容日期（YYYY-MM-DD）
+            image_path: 图片路径
+            text_content: 文字内容
+            analysis_result: 结构化分析结果（JSON）
+            predicted_smile: 预测笑脸类型
+            confidence: 置信度
+            predicted_count: 预计笑脸数量
+            source: 预测来源（rules/model/blend）
+            model_version: 模型版本
+            features: 特征向量（写入特征存储）
+            
+        Returns:
+            预测记录ID，失败时返回-1
+        """
+        return self.save_predictions([{
+            'date': date,
+            'image_path': image_path,
+            'text_content': text_content,
+            'structured_data': analysis_result,
+            'prediction': predicted_smile,
+            'confidence': confidence,
+            'smile_count': predicted_count,
+            'buy_score': buy_score,
+            'sell_score': sell_score,
+            'source': source,
+            'model_version': model_version,
+            'features': features
+        }])[0]
+    
+    def save_predictions(self, records: List[Dict]) -> List[int]:
+        """
+        批量保存预测记录（内容、预测和特征向量在同一事务中写入）
+        
+        Args:
+            records: 预测记录，字段见PredictionRepository.insert_predictions，
+                     带features时同时写入特征存储
+            
+        Returns:
+            预测记录ID列表，失败时每条返回-1
+        """
         try:
-            cursor = self.conn.execute('''
-                INSERT INTO prediction_history (
-                    content_id, prediction, confidence, smile_count,
-                    buy_score, sell_score, predicted_at
-                ) VALUES (?, ?, ?, ?, ?, ?, ?)
-            ''', (
-                content_id,
-                prediction['prediction'],
-                prediction['confidence'],
-                prediction.get('smile_count', 0),
-                prediction.get('buy_score', 0),
-                prediction.get('sell_score', 0),
-                datetime.now()
-            ))
-            
-            self.conn.commit()
-            prediction_id = cursor.lastrowid
-            
-            logger.info(f"记录预测结果: ID={prediction_id}, "
-                       f"预测={prediction['prediction']}, "
-                       f"置信度={prediction['confidence']:.2f}")
-            
-            return prediction_id
+            with self.conn:
+                ids = self.repo.insert_predictions(records, self.conn)
+                features = [(prediction_id, record['features'])
+                            for prediction_id, record in zip(ids, records) if record.get('features')]
+                if features:
+                    self.features.put_many('ml', features, conn=self.conn)
+            
+            for prediction_id, record in zip(ids, records):
+                logger.info(f"记录预测结果: ID={prediction_id}, "
+                           f"预测={record['prediction']}, "
+                           f"置信度={record['confidence']:.2f}")
+            
+            return ids
             
         except Exception as e:
             logger.error(f"记录预测结果失败: {e}")
-            return -1
+            return [-1] * len(records)
     
     def record_actual_result(self, content_id: int, actual_smile: str, 
                            smile_count: float = 0) -> bool:
@@ -135,84 +273,280 @@ class LearningOptimizer:
         """
         try:
             # 获取预测结果
-            cursor = self.conn.execute('''
-                SELECT id, prediction FROM prediction_history
-                WHERE content_id = ? AND actual_result IS NULL
-                ORDER BY predicted_at DESC LIMIT 1
-            ''', (content_id,))
-            
-            row = cursor.fetchone()
-            if not row:
+            prediction_id = self.repo.find_unverified(content_id)
+            if prediction_id is None:
                 logger.warning(f"未找到内容ID={content_id}的预测记录")
                 return False
             
-            prediction_id, predicted = row
-            
-            # 判断是否正确
-            is_correct = 1 if predicted == actual_smile else 0
-            
-            # 更新记录
-            self.conn.execute('''
-                UPDATE prediction_history
-                SET actual_result = ?, actual_smile_count = ?, 
-                    verified_at = ?, is_correct = ?
-                WHERE id = ?
-            ''', (actual_smile, smile_count, datetime.now(), is_correct, prediction_id))
-            
-            self.conn.commit()
-            
-            logger.info(f"记录真实结果: 预测={predicted}, 实际={actual_smile}, "
-                       f"{'✓正确' if is_correct else '✗错误'}")
-            
-            # 如果预测错误，分析原因
-            if not is_correct:
-                self._analyze_error(prediction_id, predicted, actual_smile)
-            
-            # 触发模型优化
-            self.optimize_model()
-            
-            return True
+            return self.save_feedback(prediction_id, actual_smile, smile_count)
             
         except Exception as e:
             logger.error(f"记录真实结果失败: {e}")
             return False
     
-    def _analyze_error(self, prediction_id: int, predicted: str, actual: str):
-        """分析预测错误的原因"""
-        try:
-            # 获取预测详情
-            cursor = self.conn.execute('''
-                SELECT ph.*, mc.structured_data
-                FROM prediction_history ph
-                JOIN maoge_content mc ON ph.content_id = mc.id
-                WHERE ph.id = ?
-            ''', (prediction_id,))
-            
-            row = cursor.fetchone()
-            if not row:
-                return
+    def save_feedback(self, prediction_id: int, actual_smile: str,
+                      actual_count: float = None) -> bool:
+        """
+        按预测ID记录真实笑脸结果（单条，见save_feedbacks）
+        
+        Args:
+            prediction_id: 预测记录ID
+            actual_smile: 真实笑脸类型 (buy_smile/sell_smile/no_smile)
+            actual_count: 笑脸数量
             
-            # 解析数据
-            data = json.loads(row[13])  # structured_data字段
+        Returns:
+            是否成功
+        """
+        result = self.save_feedbacks([(prediction_id, actual_smile, actual_count)])[0]
+        if result['error']:
+            logger.warning(f"记录真实结果失败: ID={prediction_id}, {result['error']}")
+        return result['success']
+    
+    def save_feedbacks(self, feedbacks: List) -> List[Dict]:
+        """
+        批量记录真实笑脸结果
+        
+        先校验全部条目，再在一个事务中写入结果、统计汇总、错误案例和在线学习模型；
+        全量评估和模型训练只安排一次防抖的后台任务，因此耗时与历史记录规模无关
+        
+        Args:
+            feedbacks: [(预测ID, 真实笑脸类型, 笑脸数量), ...]，也可以是
+                       {'prediction_id', 'actual_smile', 'actual_count'}字典
             
-            # 分析错误类型
-            error_type = self._classify_error(predicted, actual, data)
+        Returns:
+            每条的处理结果 [{'prediction_id', 'actual_smile', 'actual_count', 'predicted',
+                            'is_correct', 'success', 'error'}, ...]（与feedbacks顺序一致）
+        """
+        results = []
+        for item in feedbacks:
+            if isinstance(item, dict):
+                item = (item.get('prediction_id'), item.get('actual_smile'), item.get('actual_count'))
+            prediction_id, actual_smile, actual_count = (tuple(item) + (None, None, None))[:3]
+            results.append({
+                'prediction_id': prediction_id,
+                'actual_smile': actual_smile,
+                'actual_count': actual_count,
+                'predicted': None,
+                'is_correct': None,
+                'success': False,
+                'error': None
+            })
+        
+        # 1. 校验格式
+        for result in results:
+            try:
+                result['prediction_id'] = int(result['prediction_id'])
+            except (TypeError, ValueError):
+                result['error'] = f"预测ID无效: {result['prediction_id']!r}"
+                continue
+            if result['actual_smile'] not in ('buy_smile', 'sell_smile', 'no_smile'):
+                result['error'] = f"笑脸类型无效: {result['actual_smile']!r}"
+                continue
+            if result['actual_count'] not in (None, ''):
+                try:
+                    result['actual_count'] = float(result['actual_count'])
+                except (TypeError, ValueError):
+                    result['error'] = f"笑脸数量无效: {result['actual_count']!r}"
+                    continue
+            else:
+                result['actual_count'] = None
+        
+        # 同一预测ID重复反馈时以最后一条为准
+        latest = {}
+        for result in results:
+            if not result['error']:
+                latest[result['prediction_id']] = result
+        for result in results:
+            if not result['error'] and latest[result['prediction_id']] is not result:
+                result['error'] = '同一批次中重复，以最后一条为准'
+        
+        try:
+            # 2. 校验预测记录是否存在
+            rows = self.repo.get_predictions(latest.keys())
+            valid = []
+            for prediction_id, result in latest.items():
+                row = rows.get(prediction_id)
+                if row is None:
+                    result['error'] = '未找到预测记录'
+                    continue
+                result['predicted'] = row['prediction']
+                result['is_correct'] = 1 if row['prediction'] == result['actual_smile'] else 0
+                valid.append((result, row))
+            
+            if not valid:
+                return results
+            
+            # 3. 一个事务写入全部反馈
+            with self.conn:
+                # 更新记录和统计汇总（重复反馈只修正正确数）
+                self.repo.update_feedback([{
+                    'id': result['prediction_id'],
+                    'actual_result': result['actual_smile'],
+                    'actual_smile_count': result['actual_count'],
+                    'is_correct': result['is_correct']
+                } for result, _ in valid], self.conn)
+                
+                # 预测错误的批量分析原因
+                wrong = [result for result, _ in valid if not result['is_correct']]
+                structured = self.repo.get_structured_data(
+                    [result['prediction_id'] for result in wrong], self.conn)
+                self.repo.insert_error_cases([
+                    self._analyze_error(result['prediction_id'], result['predicted'],
+                                        result['actual_smile'], structured[result['prediction_id']])
+                    for result in wrong if result['prediction_id'] in structured
+                ], self.conn)
+                
+                # 更新在线学习模型（修改反馈时先撤销原结果）
+                for result, row in valid:
+                    if row['actual_result'] != result['actual_smile']:
+                        self._update_online_model(result['prediction_id'], result['actual_smile'],
+                                                  row['actual_result'])
             
-            # 生成分析报告
-            analysis = self._generate_error_analysis(predicted, actual, data)
+            for result, _ in valid:
+                result['success'] = True
+                logger.info(f"记录真实结果: ID={result['prediction_id']}, 预测={result['predicted']}, "
+                           f"实际={result['actual_smile']}, {'✓正确' if result['is_correct'] else '✗错误'}")
             
-            # 保存错误案例
-            self.conn.execute('''
-                INSERT INTO error_cases (prediction_id, error_type, analysis, created_at)
-                VALUES (?, ?, ?, ?)
-            ''', (prediction_id, error_type, analysis, datetime.now()))
+            # 全量评估和模型训练在后台执行（整批只安排一次）
+            self.schedule_optimize()
             
-            self.conn.commit()
+        except Exception as e:
+            logger.error(f"批量记录真实结果失败: {e}")
+            for result in results:
+                if not result['error']:
+                    result['success'] = False
+                    result['error'] = f'保存失败: {e}'
+        
+        return results
+    
+    def _update_online_model(self, prediction_id: int, actual: str, previous_actual: str = None):
+        """增量更新在线学习模型（由调用方提交事务；失败时等待后台全量重算）"""
+        try:
+            features = self.features.get(prediction_id, 'ml', conn=self.conn)
+            if features is None:
+                return
+            if previous_actual:
+                self.online.update(features, previous_actual, -1, conn=self.conn)
+            self.online.update(features, actual, 1, conn=self.conn)
+        except Exception as e:
+            logger.error(f"更新在线学习模型失败: {e}")
+    
+    def get_accuracy_stats(self) -> Dict:
+        """
+        读取已验证预测的准确率（由daily_metrics汇总）
+        
+        Returns:
+            {'total', 'correct', 'accuracy', 'avg_confidence', 'by_prediction': {类型: {...}}}
+            其中total为已验证数，avg_confidence为已验证预测的平均置信度
+        """
+        stats = self.repo.statistics()
+        return {
+            'total': stats['verified'],
+            'correct': stats['correct'],
+            'accuracy': stats['accuracy'],
+            'avg_confidence': stats['verified_avg_confidence'],
+            'by_prediction': {
+                prediction: {
+                    'total': item['verified'],
+                    'correct': item['correct'],
+                    'accuracy': item['accuracy']
+                }
+                for prediction, item in stats['by_prediction'].items() if item['verified']
+            }
+        }
+    
+    def schedule_optimize(self):
+        """
+        安排一次后台优化（防抖）
+        
+        optimize_delay秒内的新反馈会重新计时；持续有反馈时，
+        最迟在第一次未处理反馈后optimize_max_delay秒执行；
+        计划同时写入pending_tasks，本进程在执行前退出时由启用run_pending的服务进程接手
+        """
+        with self._schedule_lock:
+            now = time.time()
+            if self._optimize_timer is not None:
+                if now - self._optimize_pending_since >= self.optimize_max_delay:
+                    return
+                self._optimize_timer.cancel()
+            else:
+                self._optimize_pending_since = now
             
-            logger.info(f"错误案例已记录: 类型={error_type}")
+            delay = max(min(self.optimize_delay,
+                            self._optimize_pending_since + self.optimize_max_delay - now), 0)
+            try:
+                self.repo.mark_pending_task(OPTIMIZE_TASK, self._optimize_pending_since, now + delay)
+            except Exception as e:
+                logger.error(f"记录待执行的后台优化失败: {e}")
+            self._optimize_timer = threading.Timer(delay, self._run_scheduled_optimize)
+            self._optimize_timer.daemon = True
+            self._optimize_timer.start()
+    
+    def _watch_pending_optimize(self):
+        """定期执行已到期的后台优化（启动时立即检查一次，接手重启前和其他进程留下的记录）"""
+        while True:
+            if self._optimize_lock.acquire(blocking=False):
+                try:
+                    self._run_claimed_optimize()
+                finally:
+                    self._optimize_lock.release()
+            if self._stop_pending.wait(self.pending_poll_interval):
+                return
+    
+    def _run_scheduled_optimize(self):
+        """后台执行优化（同一时间只运行一个）"""
+        with self._schedule_lock:
+            self._optimize_timer = None
+            self._optimize_pending_since = None
+        
+        if not self._optimize_lock.acquire(blocking=False):
+            # 上一次优化尚未结束，稍后再试
+            self.schedule_optimize()
+            return
+        
+        try:
+            self._run_claimed_optimize()
+        finally:
+            self._optimize_lock.release()
+    
+    def _run_claimed_optimize(self):
+        """
+        领取到期的后台优化并执行（调用方持有_optimize_lock）
+        
+        多个进程同时到期时只有领取成功的一个执行；执行期间又有新反馈时记录保留，稍后再执行一次
+        """
+        started_at = time.time()
+        conn = connect(self.db_path)
+        try:
+            with conn:
+                claimed = self.repo.claim_pending_task(OPTIMIZE_TASK, self._owner, conn=conn)
+            if not claimed:
+                return
             
+            try:
+                self.optimize_model()
+            finally:
+                with conn:
+                    self.repo.finish_pending_task(OPTIMIZE_TASK, self._owner, started_at, conn)
         except Exception as e:
-            logger.error(f"分析错误失败: {e}")
+            logger.error(f"执行后台优化失败: {e}")
+        finally:
+            conn.close()
+    
+    def _analyze_error(self, prediction_id: int, predicted: str, actual: str, data: Dict) -> Dict:
+        """
+        分析预测错误的原因
+        
+        Returns:
+            错误案例 {'prediction_id', 'error_type', 'analysis'}
+        """
+        error_type = self._classify_error(predicted, actual, data)
+        logger.info(f"错误案例已记录: 类型={error_type}")
+        return {
+            'prediction_id': prediction_id,
+            'error_type': error_type,
+            'analysis': self._generate_error_analysis(predicted, actual, data)
+        }
     
     def _classify_error(self, predicted: str, actual: str, data: Dict) -> str:
         """分类错误类型"""
@@ -248,63 +582,58 @@ class LearningOptimizer:
         return '\n'.join(analysis)
     
     def optimize_model(self):
-        """优化预测模型"""
+        """
+        优化预测模型：全量评估、校正统计汇总、分析错误模式、训练机器学习模型
+        
+        由schedule_optimize在后台线程调用，使用独立的数据库连接
+        """
+        conn = connect(self.db_path)
         try:
-            # 获取所有已验证的预测记录
-            cursor = self.conn.execute('''
-                SELECT COUNT(*) FROM prediction_history
-                WHERE actual_result IS NOT NULL
-            ''')
+            # 全量重算统计汇总，校正增量计数可能的偏差
+            with conn:
+                self.repo.rebuild_daily_metrics(conn)
             
-            total_count = cursor.fetchone()[0]
+            stats = self.repo.statistics(conn=conn)
+            total = stats['verified']
+            correct = stats['correct']
             
-            if total_count < 10:
-                logger.info(f"样本数量不足({total_count}/10)，暂不优化模型")
+            if total < 10:
+                logger.info(f"样本数量不足({total}/10)，暂不优化模型")
                 return
             
-            # 计算准确率
-            cursor = self.conn.execute('''
-                SELECT 
-                    COUNT(*) as total,
-                    SUM(is_correct) as correct,
-                    AVG(confidence) as avg_confidence
-                FROM prediction_history
-                WHERE actual_result IS NOT NULL
-            ''')
-            
-            row = cursor.fetchone()
-            total, correct, avg_confidence = row
-            accuracy = correct / total if total > 0 else 0
+            accuracy = stats['accuracy']
+            avg_confidence = stats['verified_avg_confidence']
             
             logger.info(f"当前模型性能: 准确率={accuracy:.2%} ({correct}/{total}), "
                        f"平均置信度={avg_confidence:.2f}")
             
             # 保存性能记录
-            self.conn.execute('''
-                INSERT INTO model_performance (
-                    model_version, total_predictions, correct_predictions,
-                    accuracy, avg_confidence, evaluated_at
-                ) VALUES (?, ?, ?, ?, ?, ?)
-            ''', ('v1.0', total, correct, accuracy, avg_confidence, datetime.now()))
+            with conn:
+                self.repo.insert_performance('v1.0', total, correct, avg_confidence, conn)
             
-            self.conn.commit()
+            # 在线学习模型全量重算（一致性校验）
+            _, X, labels = self.features.load_matrix('ml')
+            self.online.rebuild(X, labels, conn)
             
             # 分析错误模式
-            self._analyze_error_patterns()
+            self._analyze_error_patterns(conn)
             
-            # 如果样本足够，训练机器学习模型
+            # 如果样本足够，提交训练任务（由training_worker.py在独立进程中训练）
             if total >= 50:
-                logger.info("样本数量充足，开始训练机器学习模型...")
-                self._train_ml_model()
+                logger.info("样本数量充足，提交机器学习模型训练任务...")
+                self.registry.enqueue_job(reason=f'已验证样本{total}条')
             
         except Exception as e:
             logger.error(f"优化模型失败: {e}")
+        finally:
+            conn.close()
     
-    def _analyze_error_patterns(self):
+    def _analyze_error_patterns(self, conn=None):
         """分析错误模式"""
+        conn = conn or self.conn
         try:
             # 统计各类错误的数量
-            cursor = self.conn.execute('''
+            cursor = conn.execute('''
                 SELECT error_type, COUNT(*) as count
                 FROM error_cases
                 GROUP BY error_type
@@ -319,7 +648,7 @@ class LearningOptimizer:
                     logger.info(f"  {error_type}: {count}次")
             
             # 分析最近的错误案例
-            cursor = self.conn.execute('''
+            cursor = conn.execute('''
                 SELECT error_type, analysis
                 FROM error_cases
                 ORDER BY created_at DESC
@@ -337,211 +666,185 @@ class LearningOptimizer:
         except Exception as e:
             logger.error(f"分析错误模式失败: {e}")
     
-    def _train_ml_model(self):
-        """训练机器学习模型"""
-        try:
-            from sklearn.ensemble import RandomForestClassifier
-            from sklearn.model_selection import train_test_split
-            from sklearn.metrics import classification_report
-            
-            # 获取训练数据
-            cursor = self.conn.execute('''
-                SELECT ph.*, mc.structured_data
-                FROM prediction_history ph
-                JOIN maoge_content mc ON ph.content_id = mc.id
-                WHERE ph.actual_result IS NOT NULL
-            ''')
-            
-            records = cursor.fetchall()
-            
-            if len(records) < 50:
-                logger.warning("训练数据不足")
-                return
-            
-            # 准备特征和标签
-            X = []
-            y = []
-            
-            for record in records:
-                data = json.loads(record[13])  # structured_data
-                features = self._extract_features(data)
-                label = record[8]  # actual_result
-                
-                X.append(features)
-                y.append(label)
-            
-            # 划分训练集和测试集
-            X_train, X_test, y_train, y_test = train_test_split(
-                X, y, test_size=0.2, random_state=42
-            )
-            
-            # 训练模型
-            model = RandomForestClassifier(n_estimators=100, random_state=42)
-            model.fit(X_train, y_train)
-            
-            # 评估模型
-            train_score = model.score(X_train, y_train)
-            test_score = model.score(X_test, y_test)
-            
-            logger.info(f"机器学习模型训练完成:")
-            logger.info(f"  训练集准确率: {train_score:.2%}")
-            logger.info(f"  测试集准确率: {test_score:.2%}")
-            
-            # 输出分类报告
-            y_pred = model.predict(X_test)
-            report = classification_report(y_test, y_pred)
-            logger.info(f"\n分类报告:\n{report}")
-            
-            # 保存模型
-            self.model = model
-            self._save_model()
-            
-        except ImportError:
-            logger.warning("scikit-learn未安装，无法训练机器学习模型")
-        except Exception as e:
-            logger.error(f"训练机器学习模型失败: {e}")
-    
     def _extract_features(self, data: Dict) -> List[float]:
         """从结构化数据中提取特征向量"""
-        features = []
-        
-        # 市场周期特征 (one-hot编码)
-        cycle = data.get('market_cycle', '未明确')
-        features.append(1 if cycle == '买入期' else 0)
-        features.append(1 if cycle == '持有期' else 0)
-        features.append(1 if cycle == '减仓期' else 0)
-        
-        # 趋势判断特征 (one-hot编码)
-        trend = data.get('trend_judgment', '未明确')
-        features.append(1 if trend == '看涨' else 0)
-        features.append(1 if trend == '看跌' else 0)
-        features.append(1 if trend == '震荡' else 0)
-        
-        # 风险等级特征 (one-hot编码)
-        risk = data.get('risk_assessment', {}).get('risk_level', '未明确')
-        features.append(1 if risk == '低' else 0)
-        features.append(1 if risk == '中' else 0)
-        features.append(1 if risk == '高' else 0)
-        
-        # 信号强度特征 (one-hot编码)
-        confidence = data.get('confidence', '弱')
-        features.append(1 if confidence == '强' else 0)
-        features.append(1 if confidence == '中' else 0)
-        features.append(1 if confidence == '弱' else 0)
-        
-        # 情绪特征 (one-hot编码)
-        sentiment = data.get('sentiment', '中性')
-        features.append(1 if sentiment == '乐观' else 0)
-        features.append(1 if sentiment == '悲观' else 0)
-        
-        # 操作建议特征
-        suggestions = data.get('operation_suggestions', [])
-        has_buy = any('建仓' in s.get('action', '') or '加仓' in s.get('action', '') 
-                     for s in suggestions)
-        has_sell = any('减仓' in s.get('action', '') or '清仓' in s.get('action', '') 
-                      for s in suggestions)
-        features.append(1 if has_buy else 0)
-        features.append(1 if has_sell else 0)
-        
-        # 波动率特征
-        indicators = data.get('key_indicators', {})
-        volatility = indicators.get('gold_volatility')
-        if volatility:
-            try:
-                vol_value = float(volatility)
-                features.append(vol_value / 100)  # 归一化
-            except ValueError:
-                features.append(0)
-        else:
-            features.append(0)
-        
-        return features
+        return extract_features(data, self.action_matcher)
     
-    def _save_model(self):
-        """保存模型"""
+    def load_model(self) -> bool:
+        """加载当前激活的模型版本"""
+        version, self.model = self.registry.current_model(force=True)
         if self.model is None:
-            return
+            logger.info("未找到已激活的模型")
+            return False
+        logger.info(f"模型加载成功: {version}")
+        return True
+    
+    def get_model(self):
+        """
+        获取当前模型（训练进程激活新版本后自动热加载）
         
-        try:
-            model_path = '/home/ubuntu/maoge_signal_reader/data/prediction_model.pkl'
-            with open(model_path, 'wb') as f:
-                pickle.dump(self.model, f)
-            logger.info(f"模型已保存到: {model_path}")
-        except Exception as e:
-            logger.error(f"保存模型失败: {e}")
+        模型训练时的特征版本与当前FEATURE_SCHEMA_VERSION不同时，特征向量的布局已经变化，
+        模型给出的概率没有意义，视为没有可用模型（回退到规则预测），等待训练进程产出新版本
+        
+        Returns:
+            (模型版本号, 模型)，没有激活版本或特征版本不一致时返回(None, None)
+        """
+        version, model = self.registry.current_model()
+        if model is not None:
+            schema_version = self.registry.current_metrics().get('feature_schema_version')
+            if schema_version != FEATURE_SCHEMA_VERSION:
+                if self._schema_mismatch != version:
+                    self._schema_mismatch = version
+                    logger.warning(f"模型{version}的特征版本{schema_version}与当前版本"
+                                   f"{FEATURE_SCHEMA_VERSION}不一致，暂不使用模型，回退到规则预测")
+                version, model = None, None
+        self.model = model
+        return version, model
     
-    def load_model(self) -> bool:
-        """加载模型"""
-        try:
-            model_path = '/home/ubuntu/maoge_signal_reader/data/prediction_model.pkl'
-            with open(model_path, 'rb') as f:
-                self.model = pickle.load(f)
-            logger.info("模型加载成功")
-            return True
-        except FileNotFoundError:
-            logger.info("未找到已保存的模型")
-            return False
-        except Exception as e:
-            logger.error(f"加载模型失败: {e}")
-            return False
+    def get_predictor(self):
+        """
+        获取当前模型的预测器（predict_proba(features) -> {类别: 概率}，version为模型版本）
+        
+        Returns:
+            在线学习模型，或随机森林的快速预测器（模型版本变化时重建），没有可用模型时返回None
+        """
+        if self.model_type == 'online':
+            return self.online if self.online.is_ready() else None
+        
+        version, model = self.get_model()
+        if model is None:
+            return None
+        if self._predictor is None or self._predictor.version != version:
+            self._predictor = ModelPredictor(model, version)
+        return self._predictor
     
-    def get_statistics(self) -> Dict:
-        """获取统计信息"""
+    def apply_model(self, data: Dict, rule_prediction: Dict, mode: str = 'blend',
+                    model_weight: float = 0.5) -> Dict:
+        """
+        用机器学习模型替换或融合规则预测
+        
+        Args:
+            data: 结构化数据
+            rule_prediction: SignalAnalyzer.predict_smile的结果
+            mode: rules（只用规则）、model（只用模型）、blend（按权重融合概率）
+            model_weight: blend模式下模型概率的权重
+            
+        Returns:
+            预测结果，附带source、model_version、features（记录预测时写入特征存储）
+            以及rule_prediction、model_prediction（用于规则和模型的对比）
+        """
+        prediction = dict(rule_prediction)
+        prediction['source'] = 'rules'
+        prediction['model_version'] = None
+        prediction['rule_prediction'] = rule_prediction['prediction']
+        prediction['model_prediction'] = None
+        
         try:
-            stats = {}
+            prediction['features'] = self._extract_features(data)
             
-            # 总预测数
-            cursor = self.conn.execute('''
-                SELECT COUNT(*) FROM prediction_history
-            ''')
-            stats['total_predictions'] = cursor.fetchone()[0]
+            predictor = self.get_predictor() if mode in ('model', 'blend') else None
+            if predictor is None:
+                return prediction
             
-            # 已验证数
-            cursor = self.conn.execute('''
-                SELECT COUNT(*) FROM prediction_history
-                WHERE actual_result IS NOT NULL
-            ''')
-            stats['verified_predictions'] = cursor.fetchone()[0]
-            
-            # 准确率
-            cursor = self.conn.execute('''
-                SELECT 
-                    COUNT(*) as total,
-                    SUM(is_correct) as correct
-                FROM prediction_history
-                WHERE actual_result IS NOT NULL
-            ''')
-            row = cursor.fetchone()
-            if row[0] > 0:
-                stats['accuracy'] = row[1] / row[0]
+            model_proba = predictor.predict_proba(prediction['features'])
+            prediction['model_version'] = predictor.version
+            prediction['model_prediction'] = max(model_proba, key=model_proba.get)
+            
+            if mode == 'model':
+                proba = model_proba
             else:
-                stats['accuracy'] = 0
+                # 规则预测转为概率分布：预测类别取置信度，其余类别平分剩余概率
+                labels = ['buy_smile', 'sell_smile', 'no_smile']
+                rule_confidence = rule_prediction['confidence']
+                rule_proba = {
+                    label: rule_confidence if label == rule_prediction['prediction']
+                    else (1 - rule_confidence) / (len(labels) - 1)
+                    for label in labels
+                }
+                proba = {
+                    label: model_weight * model_proba.get(label, 0)
+                    + (1 - model_weight) * rule_proba[label]
+                    for label in labels
+                }
+            
+            label = max(proba, key=proba.get)
+            prediction['source'] = mode
+            prediction['prediction'] = label
+            prediction['confidence'] = proba[label]
+            if label != rule_prediction['prediction']:
+                prediction['smile_count'] = 0 if label == 'no_smile' else 1.0
+                prediction['reasoning'] = prediction.get('reasoning', []) + [
+                    f"模型{predictor.version}预测{label}（概率{proba[label]:.0%}），"
+                    f"规则预测{rule_prediction['prediction']}"
+                ]
+            
+        except Exception as e:
+            logger.error(f"模型预测失败，使用规则预测: {e}")
+        
+        return prediction
+    
+    def get_statistics(self, start_date: str = None, end_date: str = None,
+                       days: int = None) -> Dict:
+        """
+        获取统计信息（一次分组聚合daily_metrics，耗时与预测记录规模无关）
+        
+        Args:
+            start_date: 起始日期（YYYY-MM-DD，含），默认不限
+            end_date: 结束日期（YYYY-MM-DD，含），默认不限
+            days: 最近若干天（指定时忽略start_date）
+            
+        Returns:
+            {'total_predictions', 'verified_predictions', 'accuracy', '{类型}_accuracy',
+             'avg_confidence', 'by_prediction', 'by_model_version', 'start_date', 'end_date'}
+        """
+        try:
+            if days is not None:
+                start_date = (datetime.now() - timedelta(days=days)).strftime('%Y-%m-%d')
+            
+            stats = self.repo.statistics(start_date, end_date)
+            result = {
+                'start_date': start_date,
+                'end_date': end_date,
+                'total_predictions': stats['total'],
+                'verified_predictions': stats['verified'],
+                'correct_predictions': stats['correct'],
+                'accuracy': stats['accuracy'],
+                'avg_confidence': stats['avg_confidence']
+            }
             
             # 各类预测的准确率
             for pred_type in ['buy_smile', 'sell_smile', 'no_smile']:
-                cursor = self.conn.execute('''
-                    SELECT 
-                        COUNT(*) as total,
-                        SUM(is_correct) as correct
-                    FROM prediction_history
-                    WHERE prediction = ? AND actual_result IS NOT NULL
-                ''', (pred_type,))
-                row = cursor.fetchone()
-                if row[0] > 0:
-                    stats[f'{pred_type}_accuracy'] = row[1] / row[0]
-                else:
-                    stats[f'{pred_type}_accuracy'] = 0
-            
-            return stats
+                by_type = stats['by_prediction'].get(pred_type)
+                result[f'{pred_type}_accuracy'] = by_type['accuracy'] if by_type else 0
+            
+            result['by_prediction'] = stats['by_prediction']
+            result['by_model_version'] = stats['by_model_version']
+            return result
             
         except Exception as e:
             logger.error(f"获取统计信息失败: {e}")
             return {}
     
+    def get_performance_stats(self, days: int = 7) -> Dict:
+        """
+        获取最近若干天的预测性能（按预测类型和模型版本细分）
+        
+        Args:
+            days: 统计天数
+            
+        Returns:
+            同get_statistics
+        """
+        return self.get_statistics(days=days)
+    
     def close(self):
-        """关闭数据库连接"""
-        if self.conn:
-            self.conn.close()
+        """关闭数据库连接（取消尚未执行的后台优化，由启用run_pending的服务进程接手）"""
+        self._stop_pending.set()
+        with self._schedule_lock:
+            if self._optimize_timer is not None:
+                self._optimize_timer.cancel()
+                self._optimize_timer = None
+        self.repo.close()
 
 
 if __name__ == '__main__':
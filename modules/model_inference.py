@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+模型推理模块
+对单条特征向量做快速预测：树模型（随机森林等）预先展开为纯Python数组逐棵遍历，
+避免scikit-learn单样本调用的固定开销；相同特征向量的结果直接复用
+"""
+
+import logging
+from collections import OrderedDict
+from typing import Dict, List
+
+import numpy as np
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class ModelPredictor:
+    """单样本快速预测器"""
+
+    def __init__(self, model, version: str = None, cache_size: int = 1024):
+        """
+        初始化预测器
+
+        Args:
+            model: 已训练的scikit-learn分类模型
+            version: 模型版本号
+            cache_size: 缓存的特征向量数量
+        """
+        self.model = model
+        self.version = version
+        self.classes = [str(c) for c in model.classes_]
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self._trees = self._compile_trees(model)
+
+    def _compile_trees(self, model):
+        """把决策树集成展开为(左子节点, 右子节点, 特征, 阈值, 叶子概率)列表，其他模型返回None"""
+        estimators = getattr(model, 'estimators_', None)
+        if estimators is None or not all(hasattr(e, 'tree_') for e in estimators):
+            return None
+
+        trees = []
+        for estimator in estimators:
+            tree = estimator.tree_
+            values = tree.value[:, 0, :]
+            totals = values.sum(axis=1, keepdims=True)
+            totals[totals == 0] = 1
+            trees.append((
+                tree.children_left.tolist(),
+                tree.children_right.tolist(),
+                tree.feature.tolist(),
+                tree.threshold.tolist(),
+                (values / totals).tolist()
+            ))
+        return trees
+
+    def predict_proba(self, features: List[float]) -> Dict[str, float]:
+        """
+        预测各类别概率
+
+        Args:
+            features: 特征向量（LearningOptimizer._extract_features）
+
+        Returns:
+            {类别: 概率}
+        """
+        key = tuple(features)
+        cached = self._cache.get(key)
+        if cached is not None:
+            self._cache.move_to_end(key)
+            return cached
+
+        if self._trees is not None:
+            # 与scikit-learn一致，先转为float32再比较阈值
+            x = np.asarray(features, dtype=np.float32).tolist()
+            totals = [0.0] * len(self.classes)
+            for left, right, feature, threshold, value in self._trees:
+                node = 0
+                while left[node] != -1:
+                    node = left[node] if x[feature[node]] <= threshold[node] else right[node]
+                for i, p in enumerate(value[node]):
+                    totals[i] += p
+            proba = [total / len(self._trees) for total in totals]
+        else:
+            proba = self.model.predict_proba([features])[0].tolist()
+
+        result = dict(zip(self.classes, proba))
+        self._cache[key] = result
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return result
@@ -0,0 +1,390 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+模型注册表模块
+管理训练任务队列和带版本号的模型文件：训练进程写入新版本并在效果不低于当前版本时激活，
+服务进程按版本号自动热加载当前模型，新版本效果变差时可回滚到任意历史版本
+"""
+
+import os
+import json
+import time
+import pickle
+import sqlite3
+import logging
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from db_manager import connect
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class ModelRegistry:
+    """模型版本和训练任务注册表"""
+
+    def __init__(self, db_path: str, model_dir: str = None, refresh_interval: float = 10):
+        """
+        初始化模型注册表
+
+        Args:
+            db_path: 数据库路径（与预测记录同库）
+            model_dir: 模型文件目录，默认为数据库所在目录下的models
+            refresh_interval: 服务进程检查激活版本变化的间隔（秒）
+        """
+        self.db_path = db_path
+        self.model_dir = model_dir or os.path.join(os.path.dirname(os.path.abspath(db_path)), 'models')
+        self.refresh_interval = refresh_interval
+        os.makedirs(self.model_dir, exist_ok=True)
+
+        self._create_tables()
+
+        # 热加载状态
+        self._model = None
+        self._model_version = None
+        self._model_metrics = {}
+        self._checked_at = 0
+
+    def _connect(self) -> sqlite3.Connection:
+        """每次操作使用独立连接，训练进程和服务进程可同时访问"""
+        return connect(self.db_path)
+
+    def _create_tables(self):
+        """创建数据表"""
+        conn = self._connect()
+        try:
+            # 训练任务队列
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS training_jobs (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    status TEXT NOT NULL DEFAULT 'pending',
+                    reason TEXT,
+                    requested_at TIMESTAMP,
+                    started_at TIMESTAMP,
+                    finished_at TIMESTAMP,
+                    model_version TEXT,
+                    error TEXT
+                )
+            ''')
+
+            # 模型版本
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS model_versions (
+                    version TEXT PRIMARY KEY,
+                    path TEXT NOT NULL,
+                    algorithm TEXT,
+                    samples INTEGER,
+                    train_accuracy REAL,
+                    test_accuracy REAL,
+                    metrics TEXT,
+                    status TEXT NOT NULL DEFAULT 'candidate',
+                    created_at TIMESTAMP,
+                    activated_at TIMESTAMP
+                )
+            ''')
+
+            conn.execute('''
+                CREATE INDEX IF NOT EXISTS idx_training_jobs_status
+                ON training_jobs(status, id)
+            ''')
+            conn.commit()
+        finally:
+            conn.close()
+
+    # ==================== 训练任务队列 ====================
+
+    def enqueue_job(self, reason: str = None) -> int:
+        """
+        提交训练任务（已有排队中的任务时不重复提交）
+
+        Args:
+            reason: 提交原因
+
+        Returns:
+            任务ID
+        """
+        conn = self._connect()
+        try:
+            with conn:
+                row = conn.execute('''
+                    SELECT id FROM training_jobs WHERE status = 'pending'
+                    ORDER BY id LIMIT 1
+                ''').fetchone()
+                if row:
+                    return row[0]
+
+                cursor = conn.execute('''
+                    INSERT INTO training_jobs (status, reason, requested_at)
+                    VALUES ('pending', ?, ?)
+                ''', (reason, datetime.now()))
+                logger.info(f"已提交训练任务: ID={cursor.lastrowid}, 原因={reason}")
+                return cursor.lastrowid
+        finally:
+            conn.close()
+
+    def claim_job(self) -> Optional[int]:
+        """
+        领取最早的排队任务
+
+        Returns:
+            任务ID，没有排队任务时返回None
+        """
+        conn = self._connect()
+        try:
+            with conn:
+                row = conn.execute('''
+                    SELECT id FROM training_jobs WHERE status = 'pending'
+                    ORDER BY id LIMIT 1
+                ''').fetchone()
+                if not row:
+                    return None
+
+                cursor = conn.execute('''
+                    UPDATE training_jobs SET status = 'running', started_at = ?
+                    WHERE id = ? AND status = 'pending'
+                ''', (datetime.now(), row[0]))
+                return row[0] if cursor.rowcount else None
+        finally:
+            conn.close()
+
+    def finish_job(self, job_id: int, model_version: str = None, error: str = None):
+        """
+        结束训练任务
+
+        Args:
+            job_id: 任务ID
+            model_version: 训练出的模型版本
+            error: 失败原因
+        """
+        conn = self._connect()
+        try:
+            with conn:
+                conn.execute('''
+                    UPDATE training_jobs
+                    SET status = ?, finished_at = ?, model_version = ?, error = ?
+                    WHERE id = ?
+                ''', ('failed' if error else 'done', datetime.now(), model_version, error, job_id))
+        finally:
+            conn.close()
+
+    def reset_stale_jobs(self):
+        """把上次异常退出时遗留的运行中任务重新排队"""
+        conn = self._connect()
+        try:
+            with conn:
+                cursor = conn.execute('''
+                    UPDATE training_jobs SET status = 'pending', started_at = NULL
+                    WHERE status = 'running'
+                ''')
+                if cursor.rowcount:
+                    logger.info(f"重新排队{cursor.rowcount}个未完成的训练任务")
+        finally:
+            conn.close()
+
+    # ==================== 模型版本 ====================
+
+    def save_version(self, model, metrics: Dict, algorithm: str = None) -> str:
+        """
+        保存新模型版本（先写临时文件再重命名，读取方不会看到写了一半的文件）
+
+        Args:
+            model: 训练好的模型
+            metrics: 评估指标，需包含samples、train_accuracy、test_accuracy
+            algorithm: 算法名称
+
+        Returns:
+            模型版本号
+        """
+        version = datetime.now().strftime('%Y%m%d-%H%M%S-%f')
+        path = os.path.join(self.model_dir, f'model_{version}.pkl')
+
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(model, f)
+        os.replace(tmp_path, path)
+
+        conn = self._connect()
+        try:
+            with conn:
+                conn.execute('''
+                    INSERT INTO model_versions (
+                        version, path, algorithm, samples, train_accuracy,
+                        test_accuracy, metrics, status, created_at
+                    ) VALUES (?, ?, ?, ?, ?, ?, ?, 'candidate', ?)
+                ''', (
+                    version,
+                    path,
+                    algorithm or type(model).__name__,
+                    metrics.get('samples'),
+                    metrics.get('train_accuracy'),
+                    metrics.get('test_accuracy'),
+                    json.dumps(metrics, ensure_ascii=False),
+                    datetime.now()
+                ))
+        finally:
+            conn.close()
+
+        logger.info(f"模型版本已保存: {version} -> {path}")
+        return version
+
+    def activate(self, version: str) -> bool:
+        """
+        激活指定版本（单个事务内切换，服务进程在下次检查时热加载）
+
+        Args:
+            version: 模型版本号
+
+        Returns:
+            是否成功
+        """
+        conn = self._connect()
+        try:
+            with conn:
+                row = conn.execute('SELECT path FROM model_versions WHERE version = ?',
+                                   (version,)).fetchone()
+                if not row or not os.path.exists(row[0]):
+                    logger.error(f"模型版本不存在: {version}")
+                    return False
+
+                conn.execute('''
+                    UPDATE model_versions SET status = 'retired' WHERE status = 'active'
+                ''')
+                conn.execute('''
+                    UPDATE model_versions SET status = 'active', activated_at = ?
+                    WHERE version = ?
+                ''', (datetime.now(), version))
+        finally:
+            conn.close()
+
+        logger.info(f"已激活模型版本: {version}")
+        return True
+
+    def reject(self, version: str):
+        """标记未通过评估的版本（保留文件，可手动激活）"""
+        conn = self._connect()
+        try:
+            with conn:
+                conn.execute("UPDATE model_versions SET status = 'rejected' WHERE version = ?",
+                             (version,))
+        finally:
+            conn.close()
+
+    def promote_if_better(self, version: str, tolerance: float = 0.0) -> bool:
+        """
+        测试集准确率不低于当前版本（减去容差）时激活新版本，否则标记为rejected
+
+        Args:
+            version: 新模型版本号
+            tolerance: 允许的准确率下降幅度
+
+        Returns:
+            是否激活
+        """
+        active = self.get_active_version()
+        candidate = self.get_version(version)
+
+        if active and candidate['test_accuracy'] < active['test_accuracy'] - tolerance:
+            self.reject(version)
+            logger.warning(f"新模型{version}测试集准确率{candidate['test_accuracy']:.2%}"
+                           f"低于当前版本{active['version']}的{active['test_accuracy']:.2%}，不激活")
+            return False
+
+        return self.activate(version)
+
+    def rollback(self, version: str = None) -> Optional[str]:
+        """
+        回滚模型版本
+
+        Args:
+            version: 目标版本，默认回滚到当前版本之前最近一次激活过的版本
+
+        Returns:
+            回滚后的版本号，失败时返回None
+        """
+        if version is None:
+            active = self.get_active_version()
+            conn = self._connect()
+            try:
+                row = conn.execute('''
+                    SELECT version FROM model_versions
+                    WHERE status = 'retired' AND activated_at IS NOT NULL
+                      AND (? IS NULL OR activated_at < ?)
+                    ORDER BY activated_at DESC LIMIT 1
+                ''', (active and active['activated_at'], active and active['activated_at'])).fetchone()
+            finally:
+                conn.close()
+
+            if not row:
+                logger.warning("没有可回滚的历史版本")
+                return None
+            version = row[0]
+
+        return version if self.activate(version) else None
+
+    def get_version(self, version: str) -> Optional[Dict]:
+        """获取版本信息"""
+        versions = self._query_versions('WHERE version = ?', (version,))
+        return versions[0] if versions else None
+
+    def get_active_version(self) -> Optional[Dict]:
+        """获取当前激活的版本信息"""
+        versions = self._query_versions("WHERE status = 'active'")
+        return versions[0] if versions else None
+
+    def list_versions(self, limit: int = 20) -> List[Dict]:
+        """列出最近的模型版本"""
+        return self._query_versions('ORDER BY created_at DESC LIMIT ?', (limit,))
+
+    def _query_versions(self, clause: str, params: tuple = ()) -> List[Dict]:
+        """查询模型版本"""
+        conn = self._connect()
+        try:
+            conn.row_factory = sqlite3.Row
+            rows = conn.execute(f'SELECT * FROM model_versions {clause}', params).fetchall()
+        finally:
+            conn.close()
+
+        versions = []
+        for row in rows:
+            item = dict(row)
+            item['metrics'] = json.loads(item['metrics']) if item['metrics'] else {}
+            versions.append(item)
+        return versions
+
+    # ==================== 热加载 ====================
+
+    def current_model(self, force: bool = False):
+        """
+        获取当前激活的模型，激活版本变化时自动重新加载（无需重启服务进程）
+
+        Args:
+            force: 忽略检查间隔，立即检查
+
+        Returns:
+            (模型版本号, 模型)，没有激活版本时返回(None, None)
+        """
+        now = time.time()
+        if not force and now - self._checked_at < self.refresh_interval:
+            return self._model_version, self._model
+        self._checked_at = now
+
+        try:
+            active = self.get_active_version()
+            if active is None:
+                self._model_version, self._model, self._model_metrics = None, None, {}
+            elif active['version'] != self._model_version:
+                with open(active['path'], 'rb') as f:
+                    model = pickle.load(f)
+                self._model_version, self._model = active['version'], model
+                self._model_metrics = active['metrics']
+                logger.info(f"已加载模型版本: {active['version']}")
+        except Exception as e:
+            # 加载失败时继续使用已加载的版本
+            logger.error(f"加载模型失败: {e}")
+
+        return self._model_version, self._model
+
+    def current_metrics(self) -> Dict:
+        """当前已加载模型版本的评估指标（含训练时的feature_schema_version），没有时返回空字典"""
+        return self._model_metrics
@@ -4,24 +4,62 @@ OCR文字提取模块
 """
 
 import os
+import json
 import base64
+import hashlib
 import logging
-from typing import Tuple, List, Dict
+from typing import Tuple, List, Dict, Optional
 from openai import OpenAI
 
+from result_cache import ResultCache
+from image_preprocessor import ImagePreprocessor
+from file_hash import FileHasher
+
 # 配置日志
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# 文字提取提示词
+TEXT_PROMPT = "请提取这张图片中的所有文字内容，保持原有的格式和顺序。只输出文字内容，不要添加任何解释或说明。"
+
+# 文字和布局提取提示词
+LAYOUT_PROMPT = """请分析这张图片的内容和布局，提取以下信息：
+1. 标题（如果有）
+2. 正文内容
+3. 关键数据（数字、百分比等）
+4. 特殊标记（如笑脸、箭头等）
+
+请以JSON格式输出，格式如下：
+{
+    "title": "标题",
+    "content": "正文内容",
+    "key_data": ["数据1", "数据2"],
+    "special_marks": ["标记1", "标记2"]
+}"""
+
+
+def _prompt_version(prompt: str) -> str:
+    """提示词版本号（提示词内容的哈希，修改提示词后缓存自动失效）"""
+    return hashlib.md5(prompt.encode('utf-8')).hexdigest()[:8]
+
+
 class OCRExtractor:
     """OCR文字提取器（基于智增增API）"""
     
-    def __init__(self, use_gpu: bool = False):
+    def __init__(self, use_gpu: bool = False, cache_path: Optional[str] = None,
+                 cache_max_entries: int = 5000, cache_max_age_days: int = 30,
+                 preprocessor: Optional[ImagePreprocessor] = None,
+                 hasher: Optional[FileHasher] = None):
         """
         初始化OCR提取器
         
         Args:
             use_gpu: 保留参数以兼容旧代码，实际不使用
+            cache_path: OCR结果缓存数据库路径，为None时不启用缓存
+            cache_max_entries: 缓存最大条目数
+            cache_max_age_days: 缓存最长保留天数
+            preprocessor: 图片预处理器，为None时使用默认参数
+            hasher: 文件哈希器（与去重索引共用时同一图片只计算一次哈希），为None时新建
         """
         try:
             # 初始化智增增API客户端
@@ -30,11 +68,81 @@ class OCRExtractor:
                 base_url="https://api.zhizengzeng.com/v1"
             )
             self.model = "gpt-4.1-mini"  # 使用支持视觉的模型
+            
+            # 上传前压缩图片
+            self.preprocessor = preprocessor or ImagePreprocessor()
+            self.hasher = hasher or FileHasher()
+            
+            # 初始化结果缓存（相同图片不重复调用API）
+            self.cache = None
+            if cache_path:
+                self.cache = ResultCache(
+                    cache_path,
+                    namespace='ocr',
+                    max_entries=cache_max_entries,
+                    max_age_days=cache_max_age_days
+                )
+            
             logger.info("OCR提取器初始化成功（使用智增增API）")
         except Exception as e:
             logger.error(f"OCR提取器初始化失败: {e}")
             raise
     
+    def _hash_file(self, image_path: str) -> str:
+        """图片内容哈希（分块流式计算，文件未变化时使用缓存）"""
+        return self.hasher.digest(image_path)
+    
+    def _cache_key(self, image_path: str, prompt: str) -> Optional[str]:
+        """生成缓存键：图片内容哈希 + 模型名 + 提示词版本 + 预处理参数"""
+        if self.cache is None:
+            return None
+        return ResultCache.make_key(
+            self._hash_file(image_path), self.model, _prompt_version(prompt),
+            self.preprocessor.signature()
+        )
+    
+    def encode_image(self, image_path: str) -> str:
+        """预处理图片并编码为data URL"""
+        data, mime, _ = self.preprocessor.prepare(image_path)
+        return f"data:{mime};base64,{base64.b64encode(data).decode()}"
+    
+    def _build_text_blocks(self, extracted_text: str) -> List[Dict]:
+        """构造文字块列表（简化版，因为API不返回位置信息）"""
+        return [
+            {
+                "text": line,
+                "confidence": 0.95,  # API提取的置信度通常很高
+                "position": None  # API不提供位置信息
+            }
+            for line in extracted_text.split('\n') if line.strip()
+        ]
+    
+    def _build_messages(self, prompt: str, image_url: str) -> List[Dict]:
+        """构造视觉API请求消息"""
+        return [
+            {
+                "role": "user",
+                "content": [
+                    {
+                        "type": "text",
+                        "text": prompt
+                    },
+                    {
+                        "type": "image_url",
+                        "image_url": {
+                            "url": image_url
+                        }
+                    }
+                ]
+            }
+        ]
+    
+    def get_cache_stats(self) -> Dict:
+        """获取OCR缓存统计信息"""
+        if self.cache is None:
+            return {}
+        return self.cache.get_stats()
+    
     def extract_text(self, image_path: str) -> Tuple[str, List[Dict]]:
         """
         从图片中提取文字
@@ -48,30 +156,22 @@ class OCRExtractor:
         try:
             logger.info(f"开始提取图片文字: {image_path}")
             
-            # 读取图片并转为base64
-            with open(image_path, "rb") as f:
-                image_data = base64.b64encode(f.read()).decode()
+            # 查询缓存
+            cache_key = self._cache_key(image_path, TEXT_PROMPT)
+            if cache_key:
+                cached_text = self.cache.get(cache_key)
+                if cached_text is not None:
+                    text_blocks = self._build_text_blocks(cached_text)
+                    logger.info(f"命中OCR缓存，共{len(text_blocks)}个文字块")
+                    return cached_text, text_blocks
+            
+            # 预处理图片并转为base64
+            image_url = self.encode_image(image_path)
             
             # 调用API提取文字
             response = self.client.chat.completions.create(
                 model=self.model,
-                messages=[
-                    {
-                        "role": "user",
-                        "content": [
-                            {
-                                "type": "text",
-                                "text": "请提取这张图片中的所有文字内容，保持原有的格式和顺序。只输出文字内容，不要添加任何解释或说明。"
-                            },
-                            {
-                                "type": "image_url",
-                                "image_url": {
-                                    "url": f"data:image/png;base64,{image_data}"
-                                }
-                            }
-                        ]
-                    }
-                ],
+                messages=self._build_messages(TEXT_PROMPT, image_url),
                 max_tokens=3000,
                 temperature=0.1  # 降低温度以获得更准确的提取
             )
@@ -79,15 +179,12 @@ class OCRExtractor:
             # 获取提取的文字
             extracted_text = response.choices[0].message.content.strip()
             
-            # 构造文字块列表（简化版，因为API不返回位置信息）
-            text_blocks = [
-                {
-                    "text": line,
-                    "confidence": 0.95,  # API提取的置信度通常很高
-                    "position": None  # API不提供位置信息
-                }
-                for line in extracted_text.split('\n') if line.strip()
-            ]
+            # 构造文字块列表
+            text_blocks = self._build_text_blocks(extracted_text)
+            
+            # 写入缓存
+            if cache_key:
+                self.cache.set(cache_key, extracted_text)
             
             logger.info(f"文字提取完成，共{len(text_blocks)}个文字块")
             
@@ -110,48 +207,26 @@ class OCRExtractor:
         try:
             logger.info(f"开始提取图片文字和布局: {image_path}")
             
-            # 读取图片并转为base64
-            with open(image_path, "rb") as f:
-                image_data = base64.b64encode(f.read()).decode()
+            # 查询缓存
+            cache_key = self._cache_key(image_path, LAYOUT_PROMPT)
+            if cache_key:
+                cached_layout = self.cache.get(cache_key)
+                if cached_layout is not None:
+                    logger.info("命中OCR缓存（布局）")
+                    return cached_layout
+            
+            # 预处理图片并转为base64
+            image_url = self.encode_image(image_path)
             
             # 调用API提取文字和布局
             response = self.client.chat.completions.create(
                 model=self.model,
-                messages=[
-                    {
-                        "role": "user",
-                        "content": [
-                            {
-                                "type": "text",
-                                "text": """请分析这张图片的内容和布局，提取以下信息：
-1. 标题（如果有）
-2. 正文内容
-3. 关键数据（数字、百分比等）
-4. 特殊标记（如笑脸、箭头等）
-
-请以JSON格式输出，格式如下：
-{
-    "title": "标题",
-    "content": "正文内容",
-    "key_data": ["数据1", "数据2"],
-    "special_marks": ["标记1", "标记2"]
-}"""
-                            },
-                            {
-                                "type": "image_url",
-                                "image_url": {
-                                    "url": f"data:image/png;base64,{image_data}"
-                                }
-                            }
-                        ]
-                    }
-                ],
+                messages=self._build_messages(LAYOUT_PROMPT, image_url),
                 max_tokens=3000,
                 temperature=0.1
             )
             
             # 获取结构化信息
-            import json
             result_text = response.choices[0].message.content.strip()
             
             # 尝试解析JSON
@@ -167,6 +242,7 @@ class OCRExtractor:
                     result_text = result_text[json_start:json_end].strip()
                 
                 layout_info = json.loads(result_text)
+                parsed = True
             except:
                 # 如果解析失败，返回原始文本
                 layout_info = {
@@ -175,6 +251,11 @@ class OCRExtractor:
                     "key_data": [],
                     "special_marks": []
                 }
+                parsed = False
+            
+            # 写入缓存（解析失败的降级结果不缓存，下次重新调用API）
+            if cache_key and parsed:
+                self.cache.set(cache_key, layout_info)
             
             logger.info(f"文字和布局提取完成")
             
@@ -187,7 +268,6 @@ class OCRExtractor:
 
 if __name__ == "__main__":
     # 测试代码
-    import json
     extractor = OCRExtractor()
     
     # 测试基础提取
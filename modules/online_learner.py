@@ -0,0 +1,242 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+在线学习模块
+朴素贝叶斯模型只保存每个类别的样本数和特征累计值，每条反馈以O(特征数)的代价增量更新
+并立即写入数据库；服务进程每隔几秒重新读取，猫哥发布笑脸后几秒内即可生效。
+后台优化时由全部历史重新计算一次，校正增量更新可能产生的偏差
+"""
+
+import sqlite3
+import logging
+import time
+from datetime import datetime
+from typing import Dict, List
+
+import numpy as np
+
+from db_manager import connect
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+CLASSES = ['buy_smile', 'sell_smile', 'no_smile']
+
+
+class OnlineNaiveBayes:
+    """增量朴素贝叶斯分类器（0/1特征按伯努利分布，连续特征按高斯分布）"""
+
+    def __init__(self, db_path: str, feature_names: List[str], continuous: List[str] = None,
+                 refresh_interval: float = 2):
+        """
+        初始化在线学习器
+
+        Args:
+            db_path: 数据库路径（与预测记录同库）
+            feature_names: 特征名称（与特征向量顺序一致）
+            continuous: 连续特征名称，取值为0视为缺失
+            refresh_interval: 重新读取模型状态的间隔（秒）
+        """
+        self.db_path = db_path
+        self.feature_names = feature_names
+        self.continuous = np.array([name in (continuous or []) for name in feature_names])
+        self.refresh_interval = refresh_interval
+
+        self._create_tables()
+
+        self.version = None
+        self._state = None
+        self._loaded_at = 0
+
+    def _connect(self) -> sqlite3.Connection:
+        """每次操作使用独立连接，多个进程可同时访问"""
+        return connect(self.db_path)
+
+    def _create_tables(self):
+        """创建数据表"""
+        conn = self._connect()
+        try:
+            # 每个类别一行：样本数、各特征累计值、平方累计值、非零次数
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS online_model (
+                    label TEXT PRIMARY KEY,
+                    samples REAL NOT NULL,
+                    sums BLOB NOT NULL,
+                    sumsq BLOB NOT NULL,
+                    present BLOB NOT NULL,
+                    updated_at TIMESTAMP
+                )
+            ''')
+            conn.commit()
+        finally:
+            conn.close()
+
+    def update(self, features: List[float], label: str, weight: float = 1,
+               conn: sqlite3.Connection = None):
+        """
+        增量更新一条样本（O(特征数)）
+
+        Args:
+            features: 特征向量
+            label: 真实结果
+            weight: 样本权重，-1表示撤销之前的一次更新（修改反馈时使用）
+            conn: 数据库连接（传入时在调用方事务中写入，由调用方提交）
+        """
+        if label not in CLASSES:
+            return
+
+        x = np.asarray(features, dtype=np.float64)
+        own_conn = conn is None
+        conn = conn or self._connect()
+        try:
+            row = conn.execute('''
+                SELECT samples, sums, sumsq, present FROM online_model WHERE label = ?
+            ''', (label,)).fetchone()
+
+            # 特征维数变化时从零开始，等待下次全量重算
+            if row and len(row[1]) == x.nbytes:
+                samples = row[0]
+                sums, sumsq, present = (np.frombuffer(blob, dtype=np.float64) for blob in row[1:])
+            else:
+                samples = 0
+                sums = sumsq = present = np.zeros(len(x))
+
+            self._write(conn, label, samples + weight, sums + weight * x,
+                        sumsq + weight * x * x, present + weight * (x != 0))
+            if own_conn:
+                conn.commit()
+        finally:
+            if own_conn:
+                conn.close()
+
+    def rebuild(self, X: np.ndarray, labels: List[str], conn: sqlite3.Connection = None) -> float:
+        """
+        由全部历史重新计算模型状态（一致性校验）
+
+        Args:
+            X: 特征矩阵(N, dims)
+            labels: 真实结果列表
+            conn: 数据库连接
+
+        Returns:
+            增量状态与重新计算结果的最大偏差
+        """
+        X = np.asarray(X, dtype=np.float64).reshape(len(labels), len(self.feature_names))
+        labels = np.asarray(labels)
+        previous = self._read_state()
+
+        own_conn = conn is None
+        conn = conn or self._connect()
+        drift = 0.0
+        try:
+            with conn:
+                conn.execute('DELETE FROM online_model')
+                for label in CLASSES:
+                    rows = X[labels == label]
+                    state = (len(rows), rows.sum(axis=0), (rows * rows).sum(axis=0),
+                             (rows != 0).sum(axis=0).astype(np.float64))
+                    self._write(conn, label, *state)
+
+                    if label in previous and previous[label][1].shape == state[1].shape:
+                        drift = max(drift, abs(previous[label][0] - state[0]),
+                                    *np.abs(previous[label][1] - state[1]))
+        finally:
+            if own_conn:
+                conn.close()
+
+        if drift > 1e-6:
+            logger.warning(f"在线模型增量状态与全量重算不一致（最大偏差{drift:.4g}），已校正")
+        logger.info(f"在线模型已由{len(labels)}条历史样本重新计算")
+        self._loaded_at = 0
+        return drift
+
+    def _write(self, conn, label: str, samples: float, sums, sumsq, present):
+        """写入一个类别的状态"""
+        conn.execute('''
+            INSERT OR REPLACE INTO online_model (label, samples, sums, sumsq, present, updated_at)
+            VALUES (?, ?, ?, ?, ?, ?)
+        ''', (label, float(samples), np.asarray(sums, dtype=np.float64).tobytes(),
+              np.asarray(sumsq, dtype=np.float64).tobytes(),
+              np.asarray(present, dtype=np.float64).tobytes(), datetime.now()))
+
+    def _read_state(self) -> Dict:
+        """读取全部类别的状态"""
+        conn = self._connect()
+        try:
+            rows = conn.execute('SELECT label, samples, sums, sumsq, present FROM online_model').fetchall()
+        finally:
+            conn.close()
+
+        return {
+            label: (samples,) + tuple(np.frombuffer(blob, dtype=np.float64) for blob in blobs)
+            for label, samples, *blobs in rows
+        }
+
+    def _refresh(self):
+        """按间隔重新读取模型状态，并预先计算预测所需的参数"""
+        now = time.time()
+        if now - self._loaded_at < self.refresh_interval:
+            return
+        self._loaded_at = now
+
+        state = self._read_state()
+        total = sum(item[0] for item in state.values())
+        if total <= 0:
+            self._state = None
+            self.version = None
+            return
+
+        dims = len(self.feature_names)
+        params = []
+        for label in CLASSES:
+            samples, sums, sumsq, present = state.get(
+                label, (0, np.zeros(dims), np.zeros(dims), np.zeros(dims)))
+
+            # 拉普拉斯平滑
+            log_prior = np.log((samples + 1) / (total + len(CLASSES)))
+            p = (sums + 1) / (samples + 2)
+
+            # 高斯参数（方差加平滑项，避免样本少时为0）
+            counts = np.maximum(present, 1)
+            mean = sums / counts
+            var = np.maximum(sumsq / counts - mean * mean, 0) + 1e-3
+            params.append((log_prior, np.log(p), np.log(np.clip(1 - p, 1e-12, None)),
+                           mean, var, present >= 2))
+
+        self._state = params
+        self.version = f'online-{int(total)}'
+
+    def predict_proba(self, features: List[float]) -> Dict[str, float]:
+        """
+        预测各类别概率
+
+        Args:
+            features: 特征向量
+
+        Returns:
+            {类别: 概率}
+        """
+        self._refresh()
+        if self._state is None:
+            return {label: 1 / len(CLASSES) for label in CLASSES}
+
+        x = np.asarray(features, dtype=np.float64)
+        binary = ~self.continuous
+        active = binary & (x != 0)
+        gaussian = self.continuous & (x != 0)
+
+        scores = []
+        for log_prior, log_p, log_q, mean, var, fitted in self._state:
+            score = log_prior + log_p[active].sum() + log_q[binary & ~active].sum()
+            use = gaussian & fitted
+            score -= (0.5 * np.log(2 * np.pi * var[use]) + (x[use] - mean[use]) ** 2 / (2 * var[use])).sum()
+            scores.append(score)
+
+        scores = np.exp(np.array(scores) - max(scores))
+        scores /= scores.sum()
+        return dict(zip(CLASSES, scores.tolist()))
+
+    def is_ready(self) -> bool:
+        """是否已有学习样本"""
+        self._refresh()
+        return self._state is not None
@@ -0,0 +1,760 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+预测数据存储模块
+统一管理预测相关的数据表（maoge_content、prediction_history、error_cases、daily_metrics等）：
+按PRAGMA user_version逐级迁移表结构，批量写入使用executemany并在同一事务中提交；
+predictions视图保留报告和反馈接口使用的列名（predicted_smile、actual_smile等）；
+daily_metrics按(日期, 预测类型, 模型版本)累计计数，随预测和反馈增量更新，统计只需汇总少量行；
+pending_tasks记录尚未执行的后台任务（如反馈后的延迟优化），执行前先原子领取，
+多个进程同时到期时只有一个执行，服务重启后可以继续执行
+"""
+
+import re
+import json
+import time
+import sqlite3
+import logging
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional
+
+from db_manager import ConnectionManager, ensure_indexes
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# 当前表结构版本（每个版本对应一个_migrate_v{N}方法）
+SCHEMA_VERSION = 6
+
+# prediction_history写入的列（insert_predictions的记录字段同名，缺省为None）
+HISTORY_COLUMNS = [
+    'id', 'content_id', 'date', 'prediction', 'confidence', 'smile_count',
+    'buy_score', 'sell_score', 'predicted_at', 'source', 'model_version',
+    'actual_result', 'actual_smile_count', 'verified_at', 'is_correct'
+]
+
+CONTENT_COLUMNS = ['id', 'date', 'image_path', 'text_content', 'structured_data', 'created_at']
+
+# daily_metrics的累计字段（_add_metrics的增量顺序）
+METRIC_COLUMNS = ['total', 'verified', 'correct', 'confidence_sum', 'verified_confidence_sum']
+
+# 日期的常见写法（2026-02-17、2026年2月17日、2026/2/17、2026.02.17）
+DATE_PATTERN = re.compile(r'(\d{4})\s*[-年/.]\s*(\d{1,2})\s*[-月/.]\s*(\d{1,2})')
+
+
+def normalize_date(value, fallback=None) -> str:
+    """
+    日期统一为YYYY-MM-DD（按日期范围查询和daily_metrics都依赖字符串比较）
+
+    Args:
+        value: 日期（字符串、date或datetime）
+        fallback: 无法识别时使用的日期（如预测时间），仍无法识别时取今天
+
+    Returns:
+        YYYY-MM-DD格式的日期
+    """
+    for candidate in (value, fallback):
+        if hasattr(candidate, 'strftime'):
+            return candidate.strftime('%Y-%m-%d')
+        match = DATE_PATTERN.search(str(candidate or ''))
+        if match:
+            try:
+                return datetime(*map(int, match.groups())).strftime('%Y-%m-%d')
+            except ValueError:
+                continue
+    return datetime.now().strftime('%Y-%m-%d')
+
+
+class PredictionRepository:
+    """预测数据访问层"""
+
+    def __init__(self, db_path: str):
+        """
+        初始化数据访问层（自动迁移表结构）
+
+        Args:
+            db_path: 数据库路径
+        """
+        self.db_path = db_path
+        self.db = ConnectionManager()
+        self.migrate()
+
+    def connection(self) -> sqlite3.Connection:
+        """当前线程的数据库连接（由数据访问层负责关闭）"""
+        return self.db.get(self.db_path)
+
+    def close(self):
+        """关闭所有连接"""
+        self.db.close_all()
+
+    # ==================== 表结构迁移 ====================
+
+    def migrate(self):
+        """把表结构升级到SCHEMA_VERSION（每一步在独立事务中执行）"""
+        conn = self.connection()
+        version = conn.execute('PRAGMA user_version').fetchone()[0]
+        for target in range(version + 1, SCHEMA_VERSION + 1):
+            with conn:
+                # 多个进程同时启动时只有一个执行迁移
+                self._begin(conn)
+                if conn.execute('PRAGMA user_version').fetchone()[0] >= target:
+                    continue
+                getattr(self, f'_migrate_v{target}')(conn)
+                conn.execute(f'PRAGMA user_version = {target}')
+            logger.info(f"预测数据表结构已升级到版本{target}")
+        ensure_indexes(conn)
+
+    def _migrate_v1(self, conn):
+        """基础表结构（兼容由旧版LearningOptimizer创建的数据库）"""
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS maoge_content (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                date TEXT,
+                image_path TEXT,
+                text_content TEXT,
+                structured_data TEXT,
+                created_at TIMESTAMP
+            )
+        ''')
+
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS prediction_history (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                content_id INTEGER,
+                prediction TEXT,
+                confidence REAL,
+                smile_count REAL,
+                buy_score REAL,
+                sell_score REAL,
+                predicted_at TIMESTAMP,
+                actual_result TEXT,
+                actual_smile_count REAL,
+                verified_at TIMESTAMP,
+                is_correct INTEGER,
+                FOREIGN KEY (content_id) REFERENCES maoge_content(id)
+            )
+        ''')
+
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS model_performance (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                model_version TEXT,
+                total_predictions INTEGER,
+                correct_predictions INTEGER,
+                accuracy REAL,
+                avg_confidence REAL,
+                evaluated_at TIMESTAMP
+            )
+        ''')
+
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS error_cases (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                prediction_id INTEGER,
+                error_type TEXT,
+                analysis TEXT,
+                created_at TIMESTAMP,
+                FOREIGN KEY (prediction_id) REFERENCES prediction_history(id)
+            )
+        ''')
+
+        # 准确率计数表（按预测类型累计，随反馈增量更新）
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS accuracy_stats (
+                prediction TEXT PRIMARY KEY,
+                total INTEGER NOT NULL DEFAULT 0,
+                correct INTEGER NOT NULL DEFAULT 0,
+                confidence_sum REAL NOT NULL DEFAULT 0,
+                updated_at TIMESTAMP
+            )
+        ''')
+
+        # 旧库补充字段
+        self._add_columns(conn, 'maoge_content', [
+            ('date', 'TEXT'), ('image_path', 'TEXT'), ('text_content', 'TEXT'),
+            ('structured_data', 'TEXT'), ('created_at', 'TIMESTAMP')
+        ])
+        self._add_columns(conn, 'prediction_history', [
+            ('date', 'TEXT'), ('source', 'TEXT'), ('model_version', 'TEXT')
+        ])
+
+        # 预测日期（报告按日期统计）：优先取内容日期，否则取预测时间
+        conn.execute('''
+            UPDATE prediction_history
+            SET date = COALESCE(
+                (SELECT mc.date FROM maoge_content mc WHERE mc.id = prediction_history.content_id),
+                date(predicted_at)
+            )
+            WHERE date IS NULL
+        ''')
+
+        # 反馈按内容ID查找最近一条未验证的预测
+        conn.execute('''
+            CREATE INDEX IF NOT EXISTS idx_prediction_history_content
+            ON prediction_history(content_id, predicted_at)
+        ''')
+
+    def _migrate_v2(self, conn):
+        """旧版predictions表并入prediction_history，predictions改为视图"""
+        legacy = conn.execute('''
+            SELECT type FROM sqlite_master WHERE name = 'predictions'
+        ''').fetchone()
+
+        if legacy and legacy[0] == 'table':
+            cursor = conn.execute('SELECT * FROM predictions ORDER BY id')
+
+            # 预测ID已推送给用户，不与现有记录冲突时保留原ID
+            existing = conn.execute('SELECT COALESCE(MAX(id), 0) FROM prediction_history').fetchone()[0]
+            records = []
+            for item in self._dicts(cursor):
+                actual = item.get('actual_smile')
+                records.append({
+                    'id': item.get('id') if existing == 0 else None,
+                    'date': item.get('date'),
+                    'image_path': item.get('image_path'),
+                    'text_content': item.get('text_content'),
+                    'structured_data': item.get('analysis_result'),
+                    'created_at': item.get('created_at'),
+                    'prediction': item.get('predicted_smile'),
+                    'confidence': item.get('confidence'),
+                    'smile_count': item.get('predicted_count'),
+                    'predicted_at': item.get('created_at'),
+                    'actual_result': actual,
+                    'actual_smile_count': item.get('actual_count'),
+                    'verified_at': item.get('feedback_at'),
+                    'is_correct': None if actual is None else int(actual == item.get('predicted_smile'))
+                })
+
+            # 此时还没有daily_metrics表，由v3迁移全量生成
+            self.insert_predictions(records, conn, update_metrics=False)
+            conn.execute('ALTER TABLE predictions RENAME TO predictions_legacy')
+            logger.info(f"旧版predictions表{len(records)}条记录已并入prediction_history")
+
+        conn.execute('DROP VIEW IF EXISTS predictions')
+        conn.execute('''
+            CREATE VIEW predictions AS
+            SELECT ph.id, ph.content_id, ph.date,
+                   mc.image_path, mc.text_content, mc.structured_data AS analysis_result,
+                   ph.prediction AS predicted_smile, ph.confidence,
+                   ph.smile_count AS predicted_count,
+                   ph.actual_result AS actual_smile, ph.actual_smile_count AS actual_count,
+                   ph.is_correct, ph.source, ph.model_version,
+                   ph.predicted_at, ph.verified_at
+            FROM prediction_history ph
+            LEFT JOIN maoge_content mc ON mc.id = ph.content_id
+        ''')
+
+    def _migrate_v3(self, conn):
+        """daily_metrics统计汇总表（取代只按预测类型累计的accuracy_stats）"""
+        # 规则预测没有模型版本，用空字符串（NULL在主键中不判等）
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS daily_metrics (
+                date TEXT NOT NULL,
+                prediction TEXT NOT NULL,
+                model_version TEXT NOT NULL DEFAULT '',
+                total INTEGER NOT NULL DEFAULT 0,
+                verified INTEGER NOT NULL DEFAULT 0,
+                correct INTEGER NOT NULL DEFAULT 0,
+                confidence_sum REAL NOT NULL DEFAULT 0,
+                verified_confidence_sum REAL NOT NULL DEFAULT 0,
+                updated_at TIMESTAMP,
+                PRIMARY KEY (date, prediction, model_version)
+            )
+        ''')
+        self.rebuild_daily_metrics(conn)
+        conn.execute('DROP TABLE IF EXISTS accuracy_stats')
+
+    def _migrate_v4(self, conn):
+        """已有预测的日期统一为YYYY-MM-DD（旧数据中有"2026年2月17日"之类的写法），并重算daily_metrics"""
+        rows = conn.execute('''
+            SELECT id, date, predicted_at FROM prediction_history
+            WHERE date IS NULL OR date NOT GLOB '[0-9][0-9][0-9][0-9]-[0-9][0-9]-[0-9][0-9]'
+        ''').fetchall()
+        conn.executemany('UPDATE prediction_history SET date = ? WHERE id = ?', [
+            (normalize_date(date, predicted_at), prediction_id) for prediction_id, date, predicted_at in rows
+        ])
+        if rows:
+            self.rebuild_daily_metrics(conn)
+            logger.info(f"{len(rows)}条预测记录的日期已统一为YYYY-MM-DD")
+
+    def _migrate_v5(self, conn):
+        """pending_tasks待执行的后台任务（进程内的定时器在重启后会丢失）"""
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS pending_tasks (
+                name TEXT PRIMARY KEY,
+                pending_since REAL NOT NULL,
+                due_at REAL NOT NULL,
+                updated_at REAL NOT NULL
+            )
+        ''')
+
+    def _migrate_v6(self, conn):
+        """pending_tasks增加领取者和领取时间（多个进程共用一条记录，执行前先领取）"""
+        self._add_columns(conn, 'pending_tasks', [('owner', 'TEXT'), ('claimed_at', 'REAL')])
+
+    @staticmethod
+    def _add_columns(conn, table: str, columns):
+        """补充表中缺少的字段"""
+        existing = {row[1] for row in conn.execute(f'PRAGMA table_info({table})')}
+        for column, column_type in columns:
+            if column not in existing:
+                conn.execute(f'ALTER TABLE {table} ADD COLUMN {column} {column_type}')
+
+    @staticmethod
+    def _begin(conn):
+        """开始写事务（立即获取写锁，分配的ID不会与其他进程冲突）"""
+        if not conn.in_transaction:
+            conn.execute('BEGIN IMMEDIATE')
+
+    @staticmethod
+    def _dicts(cursor) -> List[Dict]:
+        """查询结果转为字典列表（不依赖连接的row_factory）"""
+        names = [column[0] for column in cursor.description]
+        return [dict(zip(names, row)) for row in cursor.fetchall()]
+
+    # ==================== 写入 ====================
+
+    def insert_predictions(self, records: List[Dict], conn: sqlite3.Connection = None,
+                           update_metrics: bool = True) -> List[int]:
+        """
+        批量写入预测记录
+
+        记录带content_id时关联已有内容，否则由date/image_path/text_content/structured_data
+        新建一条maoge_content；ID在写锁内预先分配，内容和预测各用一次executemany写入
+
+        Args:
+            records: 预测记录，字段见HISTORY_COLUMNS和CONTENT_COLUMNS
+            conn: 数据库连接（传入时在调用方事务中写入，由调用方提交）
+            update_metrics: 是否同时累计daily_metrics
+
+        Returns:
+            预测记录ID列表（与records顺序一致）
+        """
+        if not records:
+            return []
+
+        own_conn = conn is None
+        conn = conn or self.connection()
+        try:
+            self._begin(conn)
+            now = datetime.now()
+
+            next_content = conn.execute('SELECT COALESCE(MAX(id), 0) FROM maoge_content').fetchone()[0] + 1
+            next_prediction = max(
+                conn.execute('SELECT COALESCE(MAX(id), 0) FROM prediction_history').fetchone()[0],
+                max((r.get('id') or 0 for r in records), default=0)
+            ) + 1
+
+            contents = []
+            predictions = []
+            deltas = {}
+            for record in records:
+                record = dict(record)
+                record['predicted_at'] = record.get('predicted_at') or now
+                record['date'] = normalize_date(record.get('date'), record['predicted_at'])
+
+                if record.get('content_id') is None:
+                    record['content_id'] = next_content
+                    content = dict(record, id=next_content, created_at=record.get('created_at') or now)
+                    contents.append(tuple(content.get(column) for column in CONTENT_COLUMNS))
+                    next_content += 1
+                if record.get('id') is None:
+                    record['id'] = next_prediction
+                    next_prediction += 1
+                predictions.append(tuple(record.get(column) for column in HISTORY_COLUMNS))
+
+                confidence = record.get('confidence') or 0
+                verified = record.get('actual_result') is not None
+                self._accumulate(deltas, record, 1, int(verified), record.get('is_correct') or 0,
+                                 confidence, confidence if verified else 0)
+
+            if contents:
+                conn.executemany(f'''
+                    INSERT INTO maoge_content ({', '.join(CONTENT_COLUMNS)})
+                    VALUES ({', '.join('?' * len(CONTENT_COLUMNS))})
+                ''', contents)
+
+            conn.executemany(f'''
+                INSERT INTO prediction_history ({', '.join(HISTORY_COLUMNS)})
+                VALUES ({', '.join('?' * len(HISTORY_COLUMNS))})
+            ''', predictions)
+
+            if update_metrics:
+                self._add_metrics(conn, deltas)
+
+            if own_conn:
+                conn.commit()
+            return [row[0] for row in predictions]
+        except Exception:
+            if own_conn:
+                conn.rollback()
+            raise
+
+    def update_feedback(self, items: List[Dict], conn: sqlite3.Connection = None):
+        """
+        批量写入真实结果（同时修正daily_metrics，重复反馈只修正正确数）
+
+        Args:
+            items: [{'id', 'actual_result', 'actual_smile_count', 'is_correct'}, ...]
+            conn: 数据库连接（传入时在调用方事务中写入，由调用方提交）
+        """
+        # 同一批中重复的反馈以最后一条为准
+        items = list({item['id']: item for item in items}.values())
+
+        own_conn = conn is None
+        conn = conn or self.connection()
+        try:
+            self._begin(conn)
+            previous = self.get_predictions([item['id'] for item in items], conn)
+
+            deltas = {}
+            for item in items:
+                row = previous.get(item['id'])
+                if row is None:
+                    continue
+                if row['actual_result'] is None:
+                    confidence = row['confidence'] or 0
+                    self._accumulate(deltas, row, 0, 1, item['is_correct'], 0, confidence)
+                else:
+                    self._accumulate(deltas, row, 0, 0, item['is_correct'] - (row['is_correct'] or 0), 0, 0)
+
+            now = datetime.now()
+            conn.executemany('''
+                UPDATE prediction_history
+                SET actual_result = ?, actual_smile_count = ?, verified_at = ?, is_correct = ?
+                WHERE id = ?
+            ''', [(item['actual_result'], item.get('actual_smile_count') or 0, now,
+                   item['is_correct'], item['id']) for item in items])
+            self._add_metrics(conn, deltas)
+
+            if own_conn:
+                conn.commit()
+        except Exception:
+            if own_conn:
+                conn.rollback()
+            raise
+
+    @staticmethod
+    def _accumulate(deltas: Dict, row: Dict, *values):
+        """按(日期, 预测类型, 模型版本)累加daily_metrics增量（顺序同METRIC_COLUMNS）"""
+        key = (row['date'], row['prediction'], row.get('model_version') or '')
+        current = deltas.setdefault(key, [0] * len(METRIC_COLUMNS))
+        for i, value in enumerate(values):
+            current[i] += value
+
+    def _add_metrics(self, conn, deltas: Dict):
+        """写入daily_metrics增量（由调用方提交事务）"""
+        if not deltas:
+            return
+        conn.executemany(f'''
+            INSERT INTO daily_metrics (date, prediction, model_version, {', '.join(METRIC_COLUMNS)}, updated_at)
+            VALUES (?, ?, ?, {', '.join('?' * len(METRIC_COLUMNS))}, ?)
+            ON CONFLICT(date, prediction, model_version) DO UPDATE SET
+                {', '.join(f'{column} = {column} + excluded.{column}' for column in METRIC_COLUMNS)},
+                updated_at = excluded.updated_at
+        ''', [key + tuple(values) + (datetime.now(),) for key, values in deltas.items()])
+
+    def insert_error_cases(self, cases: List[Dict], conn: sqlite3.Connection = None):
+        """
+        批量写入错误案例
+
+        Args:
+            cases: [{'prediction_id', 'error_type', 'analysis'}, ...]
+            conn: 数据库连接（传入时在调用方事务中写入，由调用方提交）
+        """
+        if not cases:
+            return
+        own_conn = conn is None
+        conn = conn or self.connection()
+        now = datetime.now()
+        conn.executemany('''
+            INSERT INTO error_cases (prediction_id, error_type, analysis, created_at)
+            VALUES (?, ?, ?, ?)
+        ''', [(case['prediction_id'], case['error_type'], case['analysis'], now) for case in cases])
+        if own_conn:
+            conn.commit()
+
+    def mark_pending_task(self, name: str, pending_since: float, due_at: float,
+                          conn: sqlite3.Connection = None):
+        """
+        记录待执行的后台任务（已存在时更新计划时间）
+
+        Args:
+            name: 任务名称
+            pending_since: 第一次请求执行的时间戳
+            due_at: 计划执行的时间戳
+            conn: 数据库连接
+        """
+        own_conn = conn is None
+        conn = conn or self.connection()
+        conn.execute('''
+            INSERT INTO pending_tasks (name, pending_since, due_at, updated_at)
+            VALUES (?, ?, ?, ?)
+            ON CONFLICT(name) DO UPDATE SET
+                pending_since = excluded.pending_since,
+                due_at = excluded.due_at,
+                updated_at = excluded.updated_at
+        ''', (name, pending_since, due_at, time.time()))
+        if own_conn:
+            conn.commit()
+
+    def claim_pending_task(self, name: str, owner: str, stale_after: float = 3600,
+                           conn: sqlite3.Connection = None) -> bool:
+        """
+        领取已到期的后台任务（一条UPDATE完成判断和领取，多个进程中只有一个成功）
+
+        Args:
+            name: 任务名称
+            owner: 领取者标识（如进程号）
+            stale_after: 领取后超过多少秒仍未完成视为领取者已异常退出，可重新领取
+            conn: 数据库连接
+
+        Returns:
+            是否领取成功；没有记录、尚未到期或已被其他进程领取时返回False
+        """
+        own_conn = conn is None
+        conn = conn or self.connection()
+        now = time.time()
+        cursor = conn.execute('''
+            UPDATE pending_tasks SET owner = ?, claimed_at = ?
+            WHERE name = ? AND due_at <= ? AND (owner IS NULL OR claimed_at < ?)
+        ''', (owner, now, name, now, now - stale_after))
+        if own_conn:
+            conn.commit()
+        return cursor.rowcount == 1
+
+    def finish_pending_task(self, name: str, owner: str, started_at: float,
+                            conn: sqlite3.Connection = None):
+        """
+        任务执行完成后删除记录；执行期间再次请求的保留并释放领取，稍后再执行一次
+
+        Args:
+            name: 任务名称
+            owner: 领取者标识
+            started_at: 本次执行开始（领取前）的时间戳
+            conn: 数据库连接
+        """
+        own_conn = conn is None
+        conn = conn or self.connection()
+        conn.execute('''
+            DELETE FROM pending_tasks WHERE name = ? AND owner = ? AND updated_at <= ?
+        ''', (name, owner, started_at))
+        conn.execute('''
+            UPDATE pending_tasks SET owner = NULL, claimed_at = NULL WHERE name = ? AND owner = ?
+        ''', (name, owner))
+        if own_conn:
+            conn.commit()
+
+    def rebuild_daily_metrics(self, conn: sqlite3.Connection = None):
+        """由prediction_history全量重算daily_metrics（校正增量计数可能的偏差）"""
+        own_conn = conn is None
+        conn = conn or self.connection()
+        conn.execute('DELETE FROM daily_metrics')
+        conn.execute('''
+            INSERT INTO daily_metrics (
+                date, prediction, model_version, total, verified, correct,
+                confidence_sum, verified_confidence_sum, updated_at
+            )
+            SELECT date, prediction, COALESCE(model_version, ''), COUNT(*), COUNT(actual_result),
+                   COALESCE(SUM(is_correct), 0), COALESCE(SUM(confidence), 0),
+                   COALESCE(SUM(CASE WHEN actual_result IS NOT NULL THEN confidence END), 0), ?
+            FROM prediction_history
+            WHERE date IS NOT NULL AND prediction IS NOT NULL
+            GROUP BY date, prediction, COALESCE(model_version, '')
+        ''', (datetime.now(),))
+        if own_conn:
+            conn.commit()
+
+    def insert_performance(self, model_version: str, total: int, correct: int,
+                           avg_confidence: float, conn: sqlite3.Connection = None):
+        """写入一条模型性能记录"""
+        own_conn = conn is None
+        conn = conn or self.connection()
+        conn.execute('''
+            INSERT INTO model_performance (
+                model_version, total_predictions, correct_predictions,
+                accuracy, avg_confidence, evaluated_at
+            ) VALUES (?, ?, ?, ?, ?, ?)
+        ''', (model_version, total, correct, correct / total if total else 0,
+              avg_confidence, datetime.now()))
+        if own_conn:
+            conn.commit()
+
+    # ==================== 查询 ====================
+
+    def get_predictions(self, prediction_ids: Iterable[int],
+                        conn: sqlite3.Connection = None) -> Dict[int, Dict]:
+        """
+        按ID批量读取预测记录
+
+        Returns:
+            {预测ID: {'id', 'content_id', 'prediction', 'confidence', 'is_correct', 'actual_result', ...}}
+        """
+        prediction_ids = list(prediction_ids)
+        if not prediction_ids:
+            return {}
+        conn = conn or self.connection()
+        cursor = conn.execute(f'''
+            SELECT id, content_id, date, prediction, confidence, smile_count,
+                   is_correct, actual_result, source, model_version
+            FROM prediction_history
+            WHERE id IN ({', '.join('?' * len(prediction_ids))})
+        ''', prediction_ids)
+        return {row['id']: row for row in self._dicts(cursor)}
+
+    def find_unverified(self, content_id: int, conn: sqlite3.Connection = None) -> Optional[int]:
+        """内容ID对应的最近一条未验证预测的ID"""
+        conn = conn or self.connection()
+        row = conn.execute('''
+            SELECT id FROM prediction_history
+            WHERE content_id = ? AND actual_result IS NULL
+            ORDER BY predicted_at DESC LIMIT 1
+        ''', (content_id,)).fetchone()
+        return row[0] if row else None
+
+    def get_structured_data(self, prediction_ids: Iterable[int],
+                            conn: sqlite3.Connection = None) -> Dict[int, Dict]:
+        """
+        按预测ID批量读取结构化数据
+
+        Returns:
+            {预测ID: 结构化数据}（没有内容记录或无法解析的预测不包含在内）
+        """
+        prediction_ids = list(prediction_ids)
+        if not prediction_ids:
+            return {}
+        conn = conn or self.connection()
+        rows = conn.execute(f'''
+            SELECT ph.id, mc.structured_data
+            FROM prediction_history ph
+            JOIN maoge_content mc ON ph.content_id = mc.id
+            WHERE ph.id IN ({', '.join('?' * len(prediction_ids))})
+        ''', prediction_ids).fetchall()
+
+        result = {}
+        for prediction_id, structured_data in rows:
+            try:
+                result[prediction_id] = json.loads(structured_data)
+            except (TypeError, ValueError):
+                continue
+        return result
+
+    def pending_task(self, name: str, conn: sqlite3.Connection = None) -> Optional[Dict]:
+        """
+        查询待执行的后台任务
+
+        Args:
+            name: 任务名称
+            conn: 数据库连接
+
+        Returns:
+            {'name', 'pending_since', 'due_at', 'updated_at', 'owner', 'claimed_at'}，没有时返回None
+        """
+        conn = conn or self.connection()
+        rows = self._dicts(conn.execute('SELECT * FROM pending_tasks WHERE name = ?', (name,)))
+        return rows[0] if rows else None
+
+    def count_predictions(self, conn: sqlite3.Connection = None) -> int:
+        """预测记录总数"""
+        conn = conn or self.connection()
+        return conn.execute('SELECT COUNT(*) FROM prediction_history').fetchone()[0]
+
+    def pending_feedback(self, since_date: str) -> List[Dict]:
+        """
+        待反馈的预测记录
+
+        Args:
+            since_date: 起始日期（YYYY-MM-DD）
+
+        Returns:
+            [{'id', 'date', 'predicted_smile', 'confidence', 'predicted_count'}, ...]（按日期倒序）
+        """
+        cursor = self.connection().execute('''
+            SELECT id, date, predicted_smile, confidence, predicted_count
+            FROM predictions
+            WHERE actual_smile IS NULL
+            AND date >= ?
+            ORDER BY date DESC
+        ''', (since_date,))
+        return self._dicts(cursor)
+
+    def daily_series(self, start_date: str, end_date: str) -> List[Dict]:
+        """
+        每日汇总（趋势报告使用，每天一行）
+
+        Returns:
+            [{'date', 'total', 'verified', 'correct', 'accuracy', 'avg_confidence', ...}, ...]（按日期排序）
+        """
+        rows = self.connection().execute(f'''
+            SELECT date, {', '.join(f'SUM({column})' for column in METRIC_COLUMNS)}
+            FROM daily_metrics
+            WHERE date >= ? AND date <= ?
+            GROUP BY date
+            ORDER BY date
+        ''', (start_date, end_date)).fetchall()
+        return [dict(self._summarize(values), date=date) for date, *values in rows]
+
+    def statistics(self, start_date: str = None, end_date: str = None,
+                   conn: sqlite3.Connection = None) -> Dict:
+        """
+        预测统计（一次分组聚合daily_metrics，耗时只与天数有关）
+
+        Args:
+            start_date: 起始日期（YYYY-MM-DD，含），默认不限
+            end_date: 结束日期（YYYY-MM-DD，含），默认不限
+            conn: 数据库连接
+
+        Returns:
+            {'start_date', 'end_date', 'total', 'verified', 'correct', 'accuracy', 'avg_confidence',
+             'verified_avg_confidence', 'by_prediction': {类型: {...}}, 'by_model_version': {版本: {...}}}
+            规则预测的模型版本记为rules
+        """
+        conditions = []
+        params = []
+        if start_date:
+            conditions.append('date >= ?')
+            params.append(start_date)
+        if end_date:
+            conditions.append('date <= ?')
+            params.append(end_date)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+
+        conn = conn or self.connection()
+        rows = conn.execute(f'''
+            SELECT prediction, model_version, {', '.join(f'SUM({column})' for column in METRIC_COLUMNS)}
+            FROM daily_metrics
+            {where}
+            GROUP BY prediction, model_version
+        ''', params).fetchall()
+
+        overall = [0] * len(METRIC_COLUMNS)
+        by_prediction = {}
+        by_model_version = {}
+        for prediction, model_version, *values in rows:
+            for totals in (overall,
+                           by_prediction.setdefault(prediction, [0] * len(METRIC_COLUMNS)),
+                           by_model_version.setdefault(model_version or 'rules', [0] * len(METRIC_COLUMNS))):
+                for i, value in enumerate(values):
+                    totals[i] += value
+
+        stats = self._summarize(overall)
+        stats.update({
+            'start_date': start_date,
+            'end_date': end_date,
+            'by_prediction': {key: self._summarize(values) for key, values in by_prediction.items()},
+            'by_model_version': {key: self._summarize(values) for key, values in by_model_version.items()}
+        })
+        return stats
+
+    @staticmethod
+    def _summarize(values) -> Dict:
+        """累计值转为统计指标"""
+        total, verified, correct, confidence_sum, verified_confidence_sum = values
+        return {
+            'total': total,
+            'verified': verified,
+            'correct': correct,
+            'accuracy': correct / verified if verified else 0,
+            'avg_confidence': confidence_sum / total if total else 0,
+            'verified_avg_confidence': verified_confidence_sum / verified if verified else 0
+        }
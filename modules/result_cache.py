@@ -0,0 +1,241 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+结果缓存模块
+基于SQLite的持久化缓存，按内容哈希缓存OCR等付费API的调用结果，服务重启后依然有效
+"""
+
+import json
+import hashlib
+import logging
+import threading
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional
+
+from db_manager import connect
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class ResultCache:
+    """持久化结果缓存（按条目数和存活时间淘汰）"""
+
+    # 每写入多少条检查一次淘汰
+    EVICT_INTERVAL = 100
+
+    def __init__(self, db_path: str, namespace: str = 'default',
+                 max_entries: int = 5000, max_age_days: int = 30):
+        """
+        初始化结果缓存
+
+        Args:
+            db_path: 缓存数据库路径
+            namespace: 命名空间（不同用途的缓存互不干扰）
+            max_entries: 最大缓存条目数，超出后按最近访问时间淘汰
+            max_age_days: 缓存最长保留天数
+        """
+        self.db_path = db_path
+        self.namespace = namespace
+        self.max_entries = max_entries
+        self.max_age_days = max_age_days
+        self._lock = threading.Lock()
+        self._writes = 0
+
+        self.conn = connect(db_path, check_same_thread=False)
+        self._create_tables()
+        self.evict()
+        logger.info(f"结果缓存初始化成功: {db_path} [{namespace}]")
+
+    def _create_tables(self):
+        """创建数据表"""
+        with self._lock:
+            self.conn.execute('''
+                CREATE TABLE IF NOT EXISTS cache_entries (
+                    cache_key TEXT PRIMARY KEY,
+                    namespace TEXT,
+                    value TEXT,
+                    size INTEGER,
+                    created_at TIMESTAMP,
+                    accessed_at TIMESTAMP
+                )
+            ''')
+            self.conn.execute('''
+                CREATE INDEX IF NOT EXISTS idx_cache_entries_accessed
+                ON cache_entries(namespace, accessed_at)
+            ''')
+            self.conn.execute('''
+                CREATE TABLE IF NOT EXISTS cache_stats (
+                    namespace TEXT PRIMARY KEY,
+                    hits INTEGER DEFAULT 0,
+                    misses INTEGER DEFAULT 0
+                )
+            ''')
+            self.conn.execute('''
+                INSERT OR IGNORE INTO cache_stats (namespace, hits, misses)
+                VALUES (?, 0, 0)
+            ''', (self.namespace,))
+            self.conn.commit()
+
+    @staticmethod
+    def make_key(*parts: str) -> str:
+        """
+        由多个组成部分生成缓存键
+
+        Args:
+            parts: 内容哈希、模型名、提示词版本等
+
+        Returns:
+            缓存键
+        """
+        return hashlib.sha256('|'.join(str(p) for p in parts).encode('utf-8')).hexdigest()
+
+    def get(self, key: str) -> Optional[Any]:
+        """
+        读取缓存
+
+        Args:
+            key: 缓存键
+
+        Returns:
+            缓存的值，未命中或已过期时返回None
+        """
+        try:
+            now = datetime.now()
+            expire_before = now - timedelta(days=self.max_age_days)
+
+            with self._lock:
+                row = self.conn.execute('''
+                    SELECT value FROM cache_entries
+                    WHERE cache_key = ? AND namespace = ? AND created_at >= ?
+                ''', (key, self.namespace, expire_before)).fetchone()
+
+                if row:
+                    self.conn.execute('''
+                        UPDATE cache_entries SET accessed_at = ? WHERE cache_key = ?
+                    ''', (now, key))
+                    self.conn.execute('''
+                        UPDATE cache_stats SET hits = hits + 1 WHERE namespace = ?
+                    ''', (self.namespace,))
+                else:
+                    self.conn.execute('''
+                        UPDATE cache_stats SET misses = misses + 1 WHERE namespace = ?
+                    ''', (self.namespace,))
+                self.conn.commit()
+
+            return json.loads(row[0]) if row else None
+
+        except Exception as e:
+            logger.error(f"读取缓存失败: {e}")
+            return None
+
+    def set(self, key: str, value: Any):
+        """
+        写入缓存
+
+        Args:
+            key: 缓存键
+            value: 可JSON序列化的值
+        """
+        try:
+            data = json.dumps(value, ensure_ascii=False)
+            now = datetime.now()
+
+            with self._lock:
+                self.conn.execute('''
+                    INSERT OR REPLACE INTO cache_entries (
+                        cache_key, namespace, value, size, created_at, accessed_at
+                    ) VALUES (?, ?, ?, ?, ?, ?)
+                ''', (key, self.namespace, data, len(data), now, now))
+                self.conn.commit()
+                self._writes += 1
+                need_evict = self._writes % self.EVICT_INTERVAL == 0
+
+            if need_evict:
+                self.evict()
+
+        except Exception as e:
+            logger.error(f"写入缓存失败: {e}")
+
+    def evict(self) -> int:
+        """
+        淘汰过期条目和超出容量的最久未访问条目
+
+        Returns:
+            淘汰的条目数
+        """
+        try:
+            expire_before = datetime.now() - timedelta(days=self.max_age_days)
+
+            with self._lock:
+                removed = self.conn.execute('''
+                    DELETE FROM cache_entries
+                    WHERE namespace = ? AND created_at < ?
+                ''', (self.namespace, expire_before)).rowcount
+
+                removed += self.conn.execute('''
+                    DELETE FROM cache_entries
+                    WHERE namespace = ? AND cache_key NOT IN (
+                        SELECT cache_key FROM cache_entries
+                        WHERE namespace = ?
+                        ORDER BY accessed_at DESC
+                        LIMIT ?
+                    )
+                ''', (self.namespace, self.namespace, self.max_entries)).rowcount
+                self.conn.commit()
+
+            if removed:
+                logger.info(f"缓存淘汰{removed}条 [{self.namespace}]")
+
+            return removed
+
+        except Exception as e:
+            logger.error(f"缓存淘汰失败: {e}")
+            return 0
+
+    def get_stats(self) -> Dict:
+        """获取缓存统计信息"""
+        try:
+            with self._lock:
+                hits, misses = self.conn.execute('''
+                    SELECT hits, misses FROM cache_stats WHERE namespace = ?
+                ''', (self.namespace,)).fetchone()
+                entries, total_size = self.conn.execute('''
+                    SELECT COUNT(*), COALESCE(SUM(size), 0) FROM cache_entries
+                    WHERE namespace = ?
+                ''', (self.namespace,)).fetchone()
+
+            lookups = hits + misses
+            return {
+                'namespace': self.namespace,
+                'entries': entries,
+                'total_size': total_size,
+                'hits': hits,
+                'misses': misses,
+                'hit_rate': hits / lookups if lookups > 0 else 0
+            }
+
+        except Exception as e:
+            logger.error(f"获取缓存统计失败: {e}")
+            return {}
+
+    def close(self):
+        """关闭数据库连接"""
+        if self.conn:
+            self.conn.close()
+
+
+if __name__ == '__main__':
+    # 测试代码
+    cache = ResultCache('/tmp/maoge_cache_test.db', namespace='test')
+
+    key = ResultCache.make_key('abc123', 'gpt-4.1-mini', 'v1')
+    print(f"首次读取: {cache.get(key)}")
+
+    cache.set(key, {'text': '黄金波动率：22.5'})
+    print(f"再次读取: {cache.get(key)}")
+
+    print("\n缓存统计:")
+    print(json.dumps(cache.get_stats(), ensure_ascii=False, indent=2))
+
+    cache.close()
@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+规则提取器模块
+用正则规则解析猫哥的模板化图文（如"黄金波动率：22.5"、"市场周期：买入期"），
+输出与语义分析器相同的结构，并给出覆盖率；覆盖率足够高时无需调用大模型
+"""
+
+import re
+import json
+import logging
+from typing import Dict, List, Optional, Tuple
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# 参与覆盖率计算的模板字段
+TEMPLATE_FIELDS = [
+    'date',
+    'market_cycle',
+    'gold_volatility',
+    'trend_judgment',
+    'risk_level',
+    'operation_suggestions'
+]
+
+DATE_PATTERN = re.compile(r'(\d{4})\s*[-年/.]\s*(\d{1,2})\s*[-月/.]\s*(\d{1,2})')
+CYCLE_LABELED_PATTERN = re.compile(r'市场周期\s*[：:]\s*(买入期|持有期|减仓期)')
+CYCLE_PATTERN = re.compile(r'买入期|持有期|减仓期')
+VOLATILITY_PATTERN = re.compile(r'黄金波动率\s*[：:为是]?\s*(\d+(?:\.\d+)?)')
+COPPER_RATIO_PATTERN = re.compile(r'黄金铜比值?\s*[：:为是]?\s*(\d+(?:\.\d+)?)')
+PRICE_CHANGE_PATTERN = re.compile(r'[+-]?\d+(?:\.\d+)?(?:\s*[-~至]\s*\d+(?:\.\d+)?)?%')
+TREND_LABELED_PATTERN = re.compile(r'趋势(?:判断)?\s*[：:]\s*(看涨|看跌|震荡)')
+TREND_PATTERN = re.compile(r'看涨|看跌|震荡')
+RISK_LABELED_PATTERN = re.compile(r'风险(?:等级)?\s*[：:]\s*(高|中|低)')
+RISK_PATTERN = re.compile(r'风险(?:较|偏|很|极)?(高|低)')
+SUGGESTION_PATTERN = re.compile(
+    r'(激进|稳健|保守)(?:型|策略)?(?:投资者)?[^。\n；;，,]*?(建仓|加仓|减仓|清仓|观望|持有)'
+)
+# 投资者类型和操作之间出现的否定说法（"激进投资者不建议建仓"、"暂不加仓"）
+NEGATION_PATTERN = re.compile(r'不建议|不宜|不要|不必|暂不|暂停|无需|无须|避免|切勿|不(?=建仓|加仓|减仓|清仓|观望|持有)')
+POSITION_PATTERN = re.compile(r'(\d+(?:\.\d+)?\s*成|\d+(?:\.\d+)?%)仓位?')
+TARGET_PATTERN = re.compile(r'([一-龥A-Za-z0-9]+)\s*[(（](\d{6})[)）]')
+TIME_WINDOW_PATTERN = re.compile(r'未来\s*\d+(?:\s*[-~至]\s*\d+)?\s*(?:个)?(?:交易日|天|日|周|个月|月)')
+SPACE_PATTERN = re.compile(r'(\d+(?:\.\d+)?(?:\s*[-~至]\s*\d+(?:\.\d+)?)?%)\s*的?(?:上涨|下跌|回调|反弹)空间')
+STRONG_WORDS = re.compile(r'强烈|坚决|果断|明确|确定性高')
+MEDIUM_WORDS = re.compile(r'适当|可以考虑|可考虑|逐步|分批')
+
+
+class RuleBasedExtractor:
+    """基于规则的模板化图文提取器"""
+
+    def extract(self, text: str) -> Tuple[Dict, float]:
+        """
+        按规则提取结构化信息
+
+        Args:
+            text: 文字内容
+
+        Returns:
+            (与SemanticAnalyzer._build_prompt相同结构的结果, 覆盖率0-1)
+        """
+        market_cycle = self._match_labeled(text, CYCLE_LABELED_PATTERN, CYCLE_PATTERN)
+        trend = self._match_labeled(text, TREND_LABELED_PATTERN, TREND_PATTERN)
+        risk_level = self._match_labeled(text, RISK_LABELED_PATTERN, RISK_PATTERN)
+        suggestions, negated = self._extract_suggestions(text)
+
+        result = {
+            'date': self._extract_date(text),
+            'market_cycle': market_cycle or '未明确',
+            'key_indicators': {
+                'gold_volatility': self._first_group(VOLATILITY_PATTERN, text),
+                'gold_copper_ratio': self._first_group(COPPER_RATIO_PATTERN, text),
+                'price_changes': PRICE_CHANGE_PATTERN.findall(text)
+            },
+            'trend_judgment': trend or '未明确',
+            'risk_assessment': {
+                'risk_level': risk_level or '未明确',
+                'expected_space': self._first_group(SPACE_PATTERN, text),
+                'probability': None
+            },
+            'operation_suggestions': suggestions,
+            'mentioned_targets': [f"{name}({code})" for name, code in TARGET_PATTERN.findall(text)],
+            'time_window': self._first_match(TIME_WINDOW_PATTERN, text),
+            'key_points': self._extract_key_points(text),
+            'sentiment': self._infer_sentiment(market_cycle, trend),
+            'confidence': self._infer_confidence(text)
+        }
+
+        found = {
+            'date': result['date'] is not None,
+            'market_cycle': market_cycle is not None,
+            'gold_volatility': result['key_indicators']['gold_volatility'] is not None,
+            'trend_judgment': trend is not None,
+            'risk_level': risk_level is not None,
+            'operation_suggestions': bool(suggestions)
+        }
+        coverage = sum(found[field] for field in TEMPLATE_FIELDS) / len(TEMPLATE_FIELDS)
+
+        # 规则无法可靠表达否定的操作建议，覆盖率记为0，交给大模型分析
+        if negated:
+            coverage = 0.0
+
+        return result, coverage
+
+    def _match_labeled(self, text: str, labeled, plain) -> Optional[str]:
+        """优先匹配带标签的写法（如"市场周期：买入期"），否则要求全文只出现一种取值"""
+        match = labeled.search(text)
+        if match:
+            return match.group(1)
+
+        values = {m.group(m.lastindex or 0) for m in plain.finditer(text)}
+        return values.pop() if len(values) == 1 else None
+
+    def _first_group(self, pattern, text: str) -> Optional[str]:
+        """返回第一个匹配的分组"""
+        match = pattern.search(text)
+        return match.group(1) if match else None
+
+    def _first_match(self, pattern, text: str) -> Optional[str]:
+        """返回第一个完整匹配"""
+        match = pattern.search(text)
+        return match.group(0) if match else None
+
+    def _extract_date(self, text: str) -> Optional[str]:
+        """提取发布日期（YYYY-MM-DD）"""
+        match = DATE_PATTERN.search(text)
+        if not match:
+            return None
+        year, month, day = match.groups()
+        return f"{year}-{int(month):02d}-{int(day):02d}"
+
+    def _extract_suggestions(self, text: str) -> Tuple[List[Dict], bool]:
+        """
+        提取各策略的操作建议
+
+        Args:
+            text: 文字内容
+
+        Returns:
+            (操作建议列表, 是否出现否定的操作建议)，否定的建议不计入列表
+        """
+        suggestions = []
+        seen = set()
+        negated = False
+
+        for match in SUGGESTION_PATTERN.finditer(text):
+            strategy, action = match.groups()
+            if NEGATION_PATTERN.search(text, match.end(1), match.start(2) + len(action)):
+                negated = True
+                continue
+            if (strategy, action) in seen:
+                continue
+            seen.add((strategy, action))
+
+            position = POSITION_PATTERN.search(match.group(0))
+            suggestions.append({
+                'strategy': strategy,
+                'action': action,
+                'position': position.group(1) if position else None,
+                'timing': None
+            })
+
+        return suggestions, negated
+
+    def _extract_key_points(self, text: str) -> List[str]:
+        """取不超过30字的短句作为核心要点"""
+        points = []
+        for sentence in re.split(r'[。\n！!；;]', text):
+            sentence = sentence.strip()
+            if 4 <= len(sentence) <= 30:
+                points.append(sentence)
+            if len(points) >= 5:
+                break
+        return points
+
+    def _infer_sentiment(self, market_cycle: Optional[str], trend: Optional[str]) -> str:
+        """由周期和趋势推断整体情绪"""
+        if market_cycle == '买入期' or trend == '看涨':
+            return '乐观'
+        if market_cycle == '减仓期' or trend == '看跌':
+            return '悲观'
+        if market_cycle == '持有期' or trend == '震荡':
+            return '谨慎'
+        return '中性'
+
+    def _infer_confidence(self, text: str) -> str:
+        """由用词推断信号强度"""
+        if STRONG_WORDS.search(text):
+            return '强'
+        if MEDIUM_WORDS.search(text):
+            return '中'
+        return '弱'
+
+
+if __name__ == '__main__':
+    # 测试代码
+    test_text = """
+    今日市场分析（2026-02-17）
+
+    黄金波动率：22.5（低于安全线25）
+    市场周期：买入期
+
+    当前市场处于底部区域，风险较低。
+    建议激进投资者可以适当建仓，稳健投资者观望。
+    关注标的：黄金ETF(518880)、沪深300(510300)
+
+    预计未来1-2周有5-8%的上涨空间。
+    """
+
+    result, coverage = RuleBasedExtractor().extract(test_text)
+    print(f"覆盖率: {coverage:.0%}")
+    print(json.dumps(result, ensure_ascii=False, indent=2))
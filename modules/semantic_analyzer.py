@@ -7,10 +7,16 @@
 
 import os
 import json
+import time
+import hashlib
 import logging
-from typing import Dict, Optional
+from typing import Dict, List, Optional, Tuple
 from openai import OpenAI
 
+from rule_extractor import RuleBasedExtractor
+from result_cache import ResultCache
+from keyword_matcher import KeywordMatcher, SMILE_LEXICON
+
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
@@ -18,12 +24,20 @@ logger = logging.getLogger(__name__)
 class SemanticAnalyzer:
     """语义分析器"""
     
-    def __init__(self, model="gpt-4.1-mini"):
+    def __init__(self, model="gpt-4.1-mini", use_rules=True, rule_threshold=0.8,
+                 cache_path=None, cache_max_entries=5000, cache_max_age_days=30,
+                 smile_keywords=None):
         """
         初始化语义分析器
         
         Args:
             model: 使用的AI模型
+            use_rules: 是否启用规则快速通道（模板化图文跳过大模型）
+            rule_threshold: 规则提取覆盖率阈值，达到阈值时直接使用规则结果
+            cache_path: 分析结果缓存数据库路径，为None时不启用缓存
+            cache_max_entries: 缓存最大条目数
+            cache_max_age_days: 缓存最长保留天数
+            smile_keywords: 额外的笑脸暗示关键词，{类别: [关键词, ...]}，追加到默认词典
         """
         try:
             # 使用智增增API
@@ -32,6 +46,30 @@ class SemanticAnalyzer:
                 base_url="https://api.zhizengzeng.com/v1"
             )
             self.model = model
+            
+            # 规则快速通道
+            self.rule_extractor = RuleBasedExtractor() if use_rules else None
+            self.rule_threshold = rule_threshold
+            
+            # 分析结果缓存（相同文字不重复调用大模型）
+            self.cache = None
+            if cache_path:
+                self.cache = ResultCache(
+                    cache_path,
+                    namespace='semantic',
+                    max_entries=cache_max_entries,
+                    max_age_days=cache_max_age_days
+                )
+            self.metrics = {
+                'fast_path': {'count': 0, 'total_time': 0.0},
+                'llm': {'count': 0, 'total_time': 0.0}
+            }
+            
+            # 笑脸暗示关键词匹配器
+            self.keyword_matcher = KeywordMatcher(SMILE_LEXICON)
+            for category, words in (smile_keywords or {}).items():
+                self.keyword_matcher.add_keywords(category, words)
+            
             logger.info(f"语义分析器初始化成功，使用模型: {model}")
         except Exception as e:
             logger.error(f"语义分析器初始化失败: {e}")
@@ -51,20 +89,29 @@ class SemanticAnalyzer:
         try:
             logger.info("开始分析内容...")
             
-            prompt = self._build_prompt(text)
+            # 模板化图文直接使用规则结果
+            result = self.try_rules(text)
+            if result is not None:
+                return result
+            
+            # 相同文字直接使用缓存结果
+            result = self.get_cached(text)
+            if result is not None:
+                logger.info("命中分析结果缓存")
+                return result
             
+            start = time.time()
             response = self.client.chat.completions.create(
                 model=self.model,
-                messages=[
-                    {"role": "system", "content": self._get_system_prompt()},
-                    {"role": "user", "content": prompt}
-                ],
+                messages=self._build_messages(text),
                 response_format={"type": "json_object"},
                 temperature=0.3,
                 max_tokens=2000
             )
             
             result = json.loads(response.choices[0].message.content)
+            self.record_metric('llm', time.time() - start)
+            self.set_cached(text, result)
             
             logger.info("内容分析完成")
             return result
@@ -73,6 +120,184 @@ class SemanticAnalyzer:
             logger.error(f"内容分析失败: {e}")
             return self._get_empty_result()
     
+    def _normalize_text(self, text: str) -> str:
+        """规范化文字（合并空白字符），空白不同的相同内容共用缓存"""
+        return ' '.join(text.split())
+    
+    def _prompt_version(self) -> str:
+        """提示词版本号（系统提示词和分析模板的哈希，修改提示词后缓存自动失效）"""
+        template = self._get_system_prompt() + self._build_prompt('{text}')
+        return hashlib.md5(template.encode('utf-8')).hexdigest()[:8]
+    
+    def _cache_key(self, text: str) -> str:
+        """生成缓存键：规范化文字哈希 + 模型名 + 提示词版本"""
+        text_hash = hashlib.sha256(self._normalize_text(text).encode('utf-8')).hexdigest()
+        return ResultCache.make_key(text_hash, self.model, self._prompt_version())
+    
+    def get_cached(self, text: str) -> Optional[Dict]:
+        """
+        读取分析结果缓存
+        
+        Args:
+            text: 文字内容
+            
+        Returns:
+            缓存的分析结果，未启用缓存或未命中时返回None
+        """
+        if self.cache is None:
+            return None
+        return self.cache.get(self._cache_key(text))
+    
+    def set_cached(self, text: str, result: Dict):
+        """写入分析结果缓存"""
+        if self.cache is not None:
+            self.cache.set(self._cache_key(text), result)
+    
+    def get_cache_stats(self) -> Dict:
+        """获取分析结果缓存统计信息"""
+        if self.cache is None:
+            return {}
+        return self.cache.get_stats()
+    
+    def try_rules(self, text: str) -> Optional[Dict]:
+        """
+        规则快速通道
+        
+        Args:
+            text: 文字内容
+            
+        Returns:
+            覆盖率达到阈值时返回规则提取结果，否则返回None
+        """
+        if self.rule_extractor is None:
+            return None
+        
+        start = time.time()
+        result, coverage = self.rule_extractor.extract(text)
+        
+        if coverage < self.rule_threshold:
+            logger.info(f"规则覆盖率{coverage:.0%}低于阈值{self.rule_threshold:.0%}，调用大模型")
+            return None
+        
+        self.record_metric('fast_path', time.time() - start)
+        logger.info(f"规则覆盖率{coverage:.0%}，使用快速通道")
+        return result
+    
+    def record_metric(self, path: str, elapsed: float):
+        """记录分析路径的调用次数和耗时"""
+        self.metrics[path]['count'] += 1
+        self.metrics[path]['total_time'] += elapsed
+    
+    def get_metrics(self) -> Dict:
+        """
+        获取快速通道统计
+        
+        Returns:
+            快速通道占比及两条路径的平均耗时
+        """
+        fast = self.metrics['fast_path']
+        llm = self.metrics['llm']
+        total = fast['count'] + llm['count']
+        
+        return {
+            'total': total,
+            'fast_path_count': fast['count'],
+            'llm_count': llm['count'],
+            'fast_path_ratio': fast['count'] / total if total > 0 else 0,
+            'fast_path_avg_latency': fast['total_time'] / fast['count'] if fast['count'] > 0 else 0,
+            'llm_avg_latency': llm['total_time'] / llm['count'] if llm['count'] > 0 else 0
+        }
+    
+    def analyze_image(self, image_url: str) -> Optional[Tuple[str, Dict]]:
+        """
+        融合模式：一次调用同时完成文字提取和语义分析
+        
+        Args:
+            image_url: 图片data URL（由OCRExtractor.encode_image生成）
+            
+        Returns:
+            (原文, 结构化分析结果)，输出未通过校验时返回None
+        """
+        try:
+            logger.info("开始融合分析（文字提取+语义分析）...")
+            
+            response = self.client.chat.completions.create(
+                model=self.model,
+                messages=[
+                    {"role": "system", "content": self._get_system_prompt()},
+                    {
+                        "role": "user",
+                        "content": [
+                            {"type": "text", "text": self._build_fused_prompt()},
+                            {"type": "image_url", "image_url": {"url": image_url}}
+                        ]
+                    }
+                ],
+                response_format={"type": "json_object"},
+                temperature=0.3,
+                max_tokens=4000
+            )
+            
+            result = json.loads(response.choices[0].message.content)
+            raw_text = result.get('raw_text')
+            analysis = result.get('analysis')
+            
+            if not isinstance(raw_text, str) or len(raw_text.strip()) < 10:
+                logger.warning("融合分析未返回有效原文")
+                return None
+            
+            if not self.validate_result(analysis):
+                logger.warning("融合分析结果未通过校验")
+                return None
+            
+            logger.info("融合分析完成")
+            return raw_text.strip(), analysis
+            
+        except Exception as e:
+            logger.error(f"融合分析失败: {e}")
+            return None
+    
+    def validate_result(self, result) -> bool:
+        """
+        校验分析结果是否符合_build_prompt约定的结构
+        
+        Args:
+            result: 分析结果
+            
+        Returns:
+            是否有效
+        """
+        if not isinstance(result, dict):
+            return False
+        
+        # 必须包含全部字段
+        if any(key not in result for key in self._get_empty_result()):
+            return False
+        
+        if not isinstance(result.get('key_indicators'), dict):
+            return False
+        if not isinstance(result.get('risk_assessment'), dict):
+            return False
+        if not isinstance(result.get('operation_suggestions'), list):
+            return False
+        if not all(isinstance(s, dict) for s in result['operation_suggestions']):
+            return False
+        
+        # 枚举字段取值
+        if result.get('market_cycle') not in ('买入期', '持有期', '减仓期', '未明确'):
+            return False
+        if result.get('trend_judgment') not in ('看涨', '看跌', '震荡', '未明确'):
+            return False
+        
+        return True
+    
+    def _build_messages(self, text: str) -> List[Dict]:
+        """构造语义分析请求消息"""
+        return [
+            {"role": "system", "content": self._get_system_prompt()},
+            {"role": "user", "content": self._build_prompt(text)}
+        ]
+    
     def _get_system_prompt(self) -> str:
         """获取系统提示词"""
         return """你是一个专业的投资信号分析师，专门解读"猫哥"发布的投资图文内容。
@@ -130,6 +355,19 @@ class SemanticAnalyzer:
 4. 核心要点要简洁明了，每个要点不超过30字
 5. 保持客观，不要添加原文没有的内容"""
     
+    def _build_fused_prompt(self) -> str:
+        """构建融合模式提示词（复用_build_prompt的输出结构）"""
+        analysis_prompt = self._build_prompt("（见图片，请先逐字提取图片中的文字）")
+        return f"""{analysis_prompt}
+
+输出要求：
+请先完整提取图片中的所有文字（保持原有格式和顺序），再基于提取的文字完成上述分析。
+最终以如下JSON格式输出：
+{{
+    "raw_text": "图片中的完整文字内容",
+    "analysis": {{上述分析结果JSON}}
+}}"""
+    
     def _get_empty_result(self) -> Dict:
         """获取空结果"""
         return {
@@ -168,27 +406,29 @@ class SemanticAnalyzer:
             'has_smile': False,
             'smile_type': None,  # 'buy' or 'sell'
             'smile_count': 0,
-            'keywords': []
+            'keywords': [],
+            'keyword_hits': []
         }
         
-        # 买入笑脸关键词
-        buy_keywords = ['买入', '建仓', '加仓', '机会', '低位', '超跌', '安全']
-        # 卖出笑脸关键词
-        sell_keywords = ['卖出', '减仓', '清仓', '风险', '高位', '超买', '警戒']
+        # 一次扫描得到所有关键词（否定说法如"不建议建仓"不计入买入）
+        hits = self.keyword_matcher.scan(text)
+        counts = self.keyword_matcher.tally(hits)
         
-        buy_count = sum(1 for kw in buy_keywords if kw in text)
-        sell_count = sum(1 for kw in sell_keywords if kw in text)
+        buy_count = len(counts.get('buy', {}))
+        sell_count = len(counts.get('sell', {}))
         
         if buy_count > sell_count and buy_count >= 2:
             hints['has_smile'] = True
             hints['smile_type'] = 'buy'
             hints['smile_count'] = min(buy_count // 2, 2)
-            hints['keywords'] = [kw for kw in buy_keywords if kw in text]
+            hints['keywords'] = list(counts['buy'])
         elif sell_count > buy_count and sell_count >= 2:
             hints['has_smile'] = True
             hints['smile_type'] = 'sell'
             hints['smile_count'] = min(sell_count // 2, 2)
-            hints['keywords'] = [kw for kw in sell_keywords if kw in text]
+            hints['keywords'] = list(counts['sell'])
+        
+        hints['keyword_hits'] = hits
         
         return hints
 
@@ -220,3 +460,6 @@ if __name__ == '__main__':
     smile_hints = analyzer.extract_smile_hints(test_text)
     print("笑脸暗示:")
     print(json.dumps(smile_hints, ensure_ascii=False, indent=2))
+    
+    print("快速通道统计:")
+    print(json.dumps(analyzer.get_metrics(), ensure_ascii=False, indent=2))
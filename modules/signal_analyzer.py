@@ -7,7 +7,9 @@
 
 import json
 import logging
-from typing import Dict, List
+from typing import Dict, List, Set, Tuple
+
+from keyword_matcher import KeywordMatcher, ACTION_LEXICON
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -24,6 +26,7 @@ class SignalAnalyzer:
             config_path: 配置文件路径
         """
         self.config = self._load_config(config_path)
+        self.action_matcher = KeywordMatcher(self.config['action_keywords'])
         logger.info("信号分析器初始化成功")
     
     def _load_config(self, config_path):
@@ -40,7 +43,9 @@ class SignalAnalyzer:
                 'buy_smile_threshold': 4,
                 'sell_smile_threshold': 4,
                 'strong_signal_threshold': 6
-            }
+            },
+            # 操作建议分类词典，{类别: [关键词, ...]}
+            'action_keywords': ACTION_LEXICON
         }
         
         if config_path:
@@ -53,6 +58,31 @@ class SignalAnalyzer:
         
         return default_config
     
+    def _classify_action(self, action: str) -> Set[str]:
+        """
+        操作建议分类
+        
+        Args:
+            action: 操作建议文字
+            
+        Returns:
+            命中的类别集合（buy/sell/hold），否定说法不计入
+        """
+        return self.action_matcher.categories(action or '')
+    
+    def _classify_suggestions(self, data: Dict) -> List[Tuple[Dict, Set[str]]]:
+        """
+        对全部操作建议分类（analyze中只分类一次，供各信号提取和预测共用）
+        
+        Args:
+            data: 结构化数据
+            
+        Returns:
+            [(操作建议, 命中的类别集合), ...]
+        """
+        return [(suggestion, self._classify_action(suggestion.get('action', '')))
+                for suggestion in data.get('operation_suggestions') or []]
+    
     def analyze(self, structured_data: Dict) -> Dict:
         """
         分析信号
@@ -66,23 +96,25 @@ class SignalAnalyzer:
         try:
             logger.info("开始分析信号...")
             
+            suggestions = self._classify_suggestions(structured_data)
+            
             signals = {
                 'buy_signals': [],
                 'sell_signals': [],
                 'hold_signals': [],
-                'smile_prediction': self.predict_smile(structured_data),
+                'smile_prediction': self.predict_smile(structured_data, suggestions),
                 'signal_strength': 0,
                 'recommendation': None
             }
             
             # 提取买入信号
-            signals['buy_signals'] = self._extract_buy_signals(structured_data)
+            signals['buy_signals'] = self._extract_buy_signals(structured_data, suggestions)
             
             # 提取卖出信号
-            signals['sell_signals'] = self._extract_sell_signals(structured_data)
+            signals['sell_signals'] = self._extract_sell_signals(structured_data, suggestions)
             
             # 提取持有信号
-            signals['hold_signals'] = self._extract_hold_signals(structured_data)
+            signals['hold_signals'] = self._extract_hold_signals(structured_data, suggestions)
             
             # 计算信号强度
             signals['signal_strength'] = self._calculate_signal_strength(signals)
@@ -99,7 +131,8 @@ class SignalAnalyzer:
             logger.error(f"信号分析失败: {e}")
             return self._get_empty_signals()
     
-    def _extract_buy_signals(self, data: Dict) -> List[Dict]:
+    def _extract_buy_signals(self, data: Dict,
+                             suggestions: List[Tuple[Dict, Set[str]]] = None) -> List[Dict]:
         """提取买入信号"""
         signals = []
         
@@ -154,9 +187,11 @@ class SignalAnalyzer:
                 pass
         
         # 操作建议信号
-        for suggestion in data.get('operation_suggestions', []):
+        if suggestions is None:
+            suggestions = self._classify_suggestions(data)
+        for suggestion, categories in suggestions:
             action = suggestion.get('action', '')
-            if '建仓' in action or '加仓' in action:
+            if 'buy' in categories:
                 signals.append({
                     'type': 'operation',
                     'strength': 'medium',
@@ -176,7 +211,8 @@ class SignalAnalyzer:
         
         return signals
     
-    def _extract_sell_signals(self, data: Dict) -> List[Dict]:
+    def _extract_sell_signals(self, data: Dict,
+                              suggestions: List[Tuple[Dict, Set[str]]] = None) -> List[Dict]:
         """提取卖出信号"""
         signals = []
         
@@ -231,9 +267,11 @@ class SignalAnalyzer:
                 pass
         
         # 操作建议信号
-        for suggestion in data.get('operation_suggestions', []):
+        if suggestions is None:
+            suggestions = self._classify_suggestions(data)
+        for suggestion, categories in suggestions:
             action = suggestion.get('action', '')
-            if '减仓' in action or '清仓' in action:
+            if 'sell' in categories:
                 signals.append({
                     'type': 'operation',
                     'strength': 'medium',
@@ -253,7 +291,8 @@ class SignalAnalyzer:
         
         return signals
     
-    def _extract_hold_signals(self, data: Dict) -> List[Dict]:
+    def _extract_hold_signals(self, data: Dict,
+                              suggestions: List[Tuple[Dict, Set[str]]] = None) -> List[Dict]:
         """提取持有信号"""
         signals = []
         
@@ -276,9 +315,11 @@ class SignalAnalyzer:
             })
         
         # 操作建议信号
-        for suggestion in data.get('operation_suggestions', []):
+        if suggestions is None:
+            suggestions = self._classify_suggestions(data)
+        for suggestion, categories in suggestions:
             action = suggestion.get('action', '')
-            if '观望' in action or '持有' in action:
+            if 'hold' in categories:
                 signals.append({
                     'type': 'operation',
                     'strength': 'medium',
@@ -289,12 +330,13 @@ class SignalAnalyzer:
         
         return signals
     
-    def predict_smile(self, data: Dict) -> Dict:
+    def predict_smile(self, data: Dict, suggestions: List[Tuple[Dict, Set[str]]] = None) -> Dict:
         """
         预测猫哥是否会给出笑脸
         
         Args:
             data: 结构化数据
+            suggestions: 已分类的操作建议（_classify_suggestions的结果），为None时重新分类
             
         Returns:
             预测结果
@@ -324,11 +366,12 @@ class SignalAnalyzer:
             sell_score += weights['risk_level']
         
         # 操作建议权重
-        for suggestion in data.get('operation_suggestions', []):
-            action = suggestion.get('action', '')
-            if '建仓' in action or '加仓' in action:
+        if suggestions is None:
+            suggestions = self._classify_suggestions(data)
+        for _, categories in suggestions:
+            if 'buy' in categories:
                 buy_score += weights['operation_suggestion']
-            elif '减仓' in action or '清仓' in action:
+            elif 'sell' in categories:
                 sell_score += weights['operation_suggestion']
         
         # 信号强度权重
@@ -0,0 +1,269 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+批量信号评分模块
+把结构化数据一次性编码为NumPy列数组，对整批数据向量化计算买入/卖出得分、
+预测结果、置信度和笑脸数量，结果与SignalAnalyzer.predict_smile逐条计算完全一致；
+权重和阈值可以传入数组，一次评估多组配置（用于历史回测和参数调优）
+"""
+
+import json
+import hashlib
+import logging
+from typing import Dict, List
+
+import numpy as np
+
+from signal_analyzer import SignalAnalyzer
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# 预测结果编码
+PREDICTION_LABELS = ['no_smile', 'buy_smile', 'sell_smile']
+NO_SMILE, BUY_SMILE, SELL_SMILE = range(len(PREDICTION_LABELS))
+
+# 特征列
+FEATURE_COLUMNS = [
+    'cycle_buy', 'cycle_sell',
+    'trend_buy', 'trend_sell',
+    'risk_low', 'risk_high',
+    'op_buy', 'op_sell',
+    'strong'
+]
+
+
+class BatchSignalScorer:
+    """向量化批量笑脸评分器"""
+
+    def __init__(self, analyzer: SignalAnalyzer = None):
+        """
+        初始化批量评分器
+
+        Args:
+            analyzer: 信号分析器（复用其配置和操作建议分类），默认新建
+        """
+        self.analyzer = analyzer or SignalAnalyzer()
+
+    def encode(self, records: List[Dict]) -> Dict[str, np.ndarray]:
+        """
+        把结构化数据编码为列数组（每批数据只需编码一次）
+
+        Args:
+            records: 语义分析的结构化数据列表
+
+        Returns:
+            {列名: 长度为N的数组}
+        """
+        matrix = np.array([self.encode_row(data) for data in records], dtype=np.int32)
+        return self.columns_from_matrix(matrix.reshape(len(records), len(FEATURE_COLUMNS)))
+
+    def encode_row(self, data: Dict) -> List[int]:
+        """
+        编码单条结构化数据
+
+        Args:
+            data: 语义分析的结构化数据
+
+        Returns:
+            按FEATURE_COLUMNS顺序排列的特征
+        """
+        market_cycle = data.get('market_cycle')
+        trend = data.get('trend_judgment')
+        risk = (data.get('risk_assessment') or {}).get('risk_level')
+
+        # 与predict_smile一致：同时命中买入和卖出时只计买入
+        op_buy = op_sell = 0
+        for suggestion in data.get('operation_suggestions') or []:
+            categories = self.analyzer._classify_action(suggestion.get('action', ''))
+            if 'buy' in categories:
+                op_buy += 1
+            elif 'sell' in categories:
+                op_sell += 1
+
+        return [
+            int(market_cycle == '买入期'), int(market_cycle == '减仓期'),
+            int(trend == '看涨'), int(trend == '看跌'),
+            int(risk == '低'), int(risk == '高'),
+            op_buy, op_sell,
+            int(data.get('confidence') == '强')
+        ]
+
+    def schema_version(self) -> str:
+        """特征编码版本（特征列或操作建议词典变化时改变），用于特征存储"""
+        schema = json.dumps([FEATURE_COLUMNS, self.analyzer.config['action_keywords']],
+                            ensure_ascii=False, sort_keys=True)
+        return hashlib.md5(schema.encode('utf-8')).hexdigest()[:8]
+
+    @staticmethod
+    def columns_from_matrix(matrix: np.ndarray) -> Dict[str, np.ndarray]:
+        """(N, len(FEATURE_COLUMNS))特征矩阵转为encode()格式的列数组"""
+        return {name: matrix[:, i] for i, name in enumerate(FEATURE_COLUMNS)}
+
+    def score(self, columns: Dict[str, np.ndarray], weights: Dict = None,
+              thresholds: Dict = None) -> Dict[str, np.ndarray]:
+        """
+        向量化计算整批数据的预测结果
+
+        Args:
+            columns: encode()的返回结果
+            weights: 权重，默认使用分析器配置；取值为长度K的数组时同时评估K组配置
+            thresholds: 阈值，规则同weights
+
+        Returns:
+            {'buy_score', 'sell_score', 'prediction', 'confidence', 'smile_count'}，
+            形状为(N,)，传入多组配置时为(K, N)；prediction为PREDICTION_LABELS的下标
+        """
+        w, t = self._params(weights, thresholds)
+        buy_score, sell_score = self._scores(columns, w)
+        is_buy, is_sell = self._classify(buy_score, sell_score, t)
+        winner = np.where(is_buy, buy_score, sell_score)
+
+        prediction = np.where(is_buy, BUY_SMILE, np.where(is_sell, SELL_SMILE, NO_SMILE))
+        confidence = np.where(
+            is_buy | is_sell,
+            np.minimum(winner / t['strong_signal_threshold'], 1.0),
+            0.5
+        )
+        smile_count = np.where(is_buy | is_sell, self.estimate_smile_count(winner), 0.0)
+
+        return {
+            'buy_score': buy_score,
+            'sell_score': sell_score,
+            'prediction': prediction,
+            'confidence': confidence,
+            'smile_count': smile_count
+        }
+
+    def predict_codes(self, columns: Dict[str, np.ndarray], weights: Dict = None,
+                      thresholds: Dict = None) -> np.ndarray:
+        """
+        只计算预测结果编码（参数调优时无需置信度和笑脸数量）
+
+        Args:
+            columns: encode()的返回结果
+            weights: 权重，规则同score()
+            thresholds: 阈值，规则同score()
+
+        Returns:
+            PREDICTION_LABELS的下标，形状同score()
+        """
+        w, t = self._params(weights, thresholds)
+        is_buy, is_sell = self._classify(*self._scores(columns, w), t)
+        return np.where(is_buy, BUY_SMILE, np.where(is_sell, SELL_SMILE, NO_SMILE))
+
+    def _params(self, weights: Dict = None, thresholds: Dict = None):
+        """合并分析器配置，返回可广播的(权重, 阈值)"""
+        weights = {**self.analyzer.config['weights'], **(weights or {})}
+        thresholds = {**self.analyzer.config['thresholds'], **(thresholds or {})}
+        return ({name: self._param(value) for name, value in weights.items()},
+                {name: self._param(value) for name, value in thresholds.items()})
+
+    def _scores(self, columns: Dict[str, np.ndarray], w: Dict):
+        """
+        计算买入/卖出得分（含信号强度加权）
+
+        加法顺序与predict_smile相同（周期、趋势、风险、逐条操作建议、信号强度），
+        操作建议的权重逐条累加而不是乘以条数，浮点结果与逐条计算逐位一致
+        """
+        buy_score = (columns['cycle_buy'] * w['market_cycle']
+                     + columns['trend_buy'] * w['trend_judgment']
+                     + columns['risk_low'] * w['risk_level'])
+        sell_score = (columns['cycle_sell'] * w['market_cycle']
+                      + columns['trend_sell'] * w['trend_judgment']
+                      + columns['risk_high'] * w['risk_level'])
+        buy_score = self._add_repeated(buy_score, columns['op_buy'], w['operation_suggestion'])
+        sell_score = self._add_repeated(sell_score, columns['op_sell'], w['operation_suggestion'])
+
+        # 信号强度权重加到领先的一方
+        strong = columns['strong'].astype(bool)
+        buy_lead = strong & (buy_score > sell_score)
+        sell_lead = strong & (sell_score > buy_score)
+        return (buy_score + buy_lead * w['confidence'],
+                sell_score + sell_lead * w['confidence'])
+
+    @staticmethod
+    def _add_repeated(score: np.ndarray, counts: np.ndarray, weight) -> np.ndarray:
+        """得分逐次加上counts次weight（第k轮只给条数不少于k的记录加）"""
+        for k in range(1, int(counts.max(initial=0)) + 1):
+            score = score + (counts >= k) * weight
+        return score
+
+    def _classify(self, buy_score: np.ndarray, sell_score: np.ndarray, t: Dict):
+        """判断是否达到买入/卖出笑脸阈值"""
+        is_buy = (buy_score > sell_score) & (buy_score >= t['buy_smile_threshold'])
+        is_sell = (sell_score > buy_score) & (sell_score >= t['sell_smile_threshold'])
+        return is_buy, is_sell
+
+    def predict(self, records: List[Dict]) -> List[Dict]:
+        """
+        批量预测（使用分析器当前配置）
+
+        Args:
+            records: 语义分析的结构化数据列表
+
+        Returns:
+            与predict_smile相同字段的预测结果列表（不含reasoning）
+        """
+        return self.to_dicts(self.score(self.encode(records)))
+
+    @staticmethod
+    def estimate_smile_count(score: np.ndarray) -> np.ndarray:
+        """向量化的SignalAnalyzer._estimate_smile_count"""
+        return np.select([score >= 7, score >= 5.5, score >= 4], [2.0, 1.5, 1.0], 0.5)
+
+    @staticmethod
+    def to_dicts(result: Dict[str, np.ndarray]) -> List[Dict]:
+        """把单组配置的score()结果转换为预测字典列表"""
+        return [
+            {
+                'buy_score': float(buy),
+                'sell_score': float(sell),
+                'prediction': PREDICTION_LABELS[code],
+                'confidence': float(confidence),
+                'smile_count': float(smile_count)
+            }
+            for buy, sell, code, confidence, smile_count in zip(
+                result['buy_score'], result['sell_score'], result['prediction'],
+                result['confidence'], result['smile_count']
+            )
+        ]
+
+    @staticmethod
+    def _param(value) -> np.ndarray:
+        """权重/阈值转为可广播的数组：标量保持不变，K组取值转为(K, 1)"""
+        array = np.asarray(value, dtype=np.float64)
+        return array[:, np.newaxis] if array.ndim == 1 else array
+
+
+if __name__ == '__main__':
+    # 测试代码
+    records = [
+        {
+            "market_cycle": "买入期",
+            "trend_judgment": "看涨",
+            "risk_assessment": {"risk_level": "低"},
+            "operation_suggestions": [{"strategy": "激进", "action": "适当建仓"}],
+            "confidence": "强"
+        },
+        {
+            "market_cycle": "减仓期",
+            "trend_judgment": "看跌",
+            "risk_assessment": {"risk_level": "高"},
+            "operation_suggestions": [{"strategy": "稳健", "action": "不建议加仓"}],
+            "confidence": "中"
+        },
+        {
+            "market_cycle": "持有期",
+            "trend_judgment": "震荡",
+            "operation_suggestions": [],
+            "confidence": "弱"
+        }
+    ]
+
+    scorer = BatchSignalScorer()
+    print(json.dumps(scorer.predict(records), ensure_ascii=False, indent=2))
+
+    # 同时评估三组市场周期权重
+    result = scorer.score(scorer.encode(records), weights={'market_cycle': [2, 3, 4]})
+    print(result['prediction'])
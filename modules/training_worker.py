@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+模型训练进程
+独立于图文处理和反馈接口运行：轮询训练任务队列，在限定时间内训练随机森林模型，
+保存为新版本并在效果不低于当前版本时激活，服务进程会自动热加载
+
+用法:
+    python3 training_worker.py --db /root/maoge_advisor/maoge_predictions.db
+    python3 training_worker.py --db ... --once          # 处理完排队任务后退出
+    python3 training_worker.py --db ... --list          # 列出模型版本
+    python3 training_worker.py --db ... --rollback [版本号]
+"""
+
+import sys
+import time
+import logging
+from typing import Dict, Optional
+
+from feature_store import FeatureStore
+from keyword_matcher import KeywordMatcher, ACTION_LEXICON
+from learning_optimizer import FEATURE_SCHEMA_VERSION, extract_features
+from model_registry import ModelRegistry
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class TrainingWorker:
+    """模型训练进程"""
+
+    def __init__(self, db_path: str, model_dir: str = None, time_budget: float = 300,
+                 poll_interval: float = 10, min_samples: int = 50, tolerance: float = 0.0):
+        """
+        初始化训练进程
+
+        Args:
+            db_path: 预测数据库路径
+            model_dir: 模型文件目录
+            time_budget: 单次训练的时间上限（秒），第一批10棵树总会训练完，可能超出
+            poll_interval: 轮询任务队列的间隔（秒）
+            min_samples: 最少训练样本数
+            tolerance: 新版本允许的测试集准确率下降幅度
+        """
+        self.db_path = db_path
+        self.registry = ModelRegistry(db_path, model_dir)
+        self.time_budget = time_budget
+        self.poll_interval = poll_interval
+        self.min_samples = min_samples
+        self.tolerance = tolerance
+
+        # 与学习优化器共用特征存储和特征提取（只需读取特征，不创建推理和后台优化）
+        action_matcher = KeywordMatcher(ACTION_LEXICON)
+        self.features = FeatureStore(db_path)
+        self.features.register('ml', FEATURE_SCHEMA_VERSION,
+                               lambda data: extract_features(data, action_matcher))
+
+    def run(self, once: bool = False):
+        """
+        处理训练任务
+
+        Args:
+            once: 处理完当前排队任务后退出
+        """
+        self.registry.reset_stale_jobs()
+        logger.info(f"训练进程已启动，时间上限{self.time_budget}秒")
+
+        while True:
+            job_id = self.registry.claim_job()
+            if job_id is None:
+                if once:
+                    break
+                time.sleep(self.poll_interval)
+                continue
+
+            logger.info(f"开始训练任务: ID={job_id}")
+            try:
+                version = self.train()
+                self.registry.finish_job(job_id, model_version=version)
+            except Exception as e:
+                logger.error(f"训练任务失败: ID={job_id}, {e}")
+                self.registry.finish_job(job_id, error=str(e))
+
+    def train(self) -> Optional[str]:
+        """
+        在时间上限内训练模型，保存新版本并择优激活
+
+        Returns:
+            新模型版本号，样本不足时返回None
+        """
+        from sklearn.ensemble import RandomForestClassifier
+        from sklearn.model_selection import train_test_split
+        from sklearn.metrics import classification_report
+
+        deadline = time.time() + self.time_budget
+
+        X, y = self._load_training_data()
+        if len(X) < self.min_samples:
+            logger.warning(f"训练数据不足({len(X)}/{self.min_samples})")
+            return None
+
+        X_train, X_test, y_train, y_test = train_test_split(
+            X, y, test_size=0.2, random_state=42
+        )
+
+        # 分批增加决策树（至少保留第一批）：每批训练前按实测的单棵树耗时估算剩余时间能训练几棵，
+        # 不足一棵时停止，避免最后一批把训练时间拖到上限之后
+        model = RandomForestClassifier(n_estimators=0, warm_start=True, random_state=42)
+        step = 10
+        tree_seconds = 0
+        while model.n_estimators < 100:
+            if model.n_estimators:
+                affordable = int((deadline - time.time()) / tree_seconds) if tree_seconds else step
+                if affordable < 1:
+                    logger.warning(f"达到训练时间上限，使用{model.n_estimators}棵树")
+                    break
+                batch = min(step, affordable, 100 - model.n_estimators)
+            else:
+                batch = step
+
+            started = time.time()
+            model.n_estimators += batch
+            model.fit(X_train, y_train)
+            tree_seconds = (time.time() - started) / batch
+
+        y_pred = model.predict(X_test)
+        metrics = {
+            'samples': len(X),
+            'train_accuracy': model.score(X_train, y_train),
+            'test_accuracy': model.score(X_test, y_test),
+            'n_estimators': model.n_estimators,
+            'feature_schema_version': FEATURE_SCHEMA_VERSION,
+            'report': classification_report(y_test, y_pred, output_dict=True, zero_division=0)
+        }
+
+        logger.info(f"机器学习模型训练完成:")
+        logger.info(f"  训练集准确率: {metrics['train_accuracy']:.2%}")
+        logger.info(f"  测试集准确率: {metrics['test_accuracy']:.2%}")
+
+        version = self.registry.save_version(model, metrics)
+        self.registry.promote_if_better(version, tolerance=self.tolerance)
+        return version
+
+    def _load_training_data(self):
+        """从特征存储一次读取已验证预测的(特征矩阵, 标签)"""
+        _, X, y = self.features.load_matrix('ml')
+        return X, y
+
+
+def print_versions(registry: ModelRegistry):
+    """打印模型版本列表"""
+    print(f"{'版本':<28}{'状态':<12}{'样本':>6}{'训练集':>10}{'测试集':>10}")
+    print("-" * 70)
+    for item in registry.list_versions():
+        print(f"{item['version']:<28}{item['status']:<12}{item['samples'] or 0:>6}"
+              f"{item['train_accuracy'] or 0:>10.2%}{item['test_accuracy'] or 0:>10.2%}")
+
+
+def main():
+    """主函数"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description='模型训练进程')
+    parser.add_argument('--db', required=True, help='预测数据库路径')
+    parser.add_argument('--model-dir', help='模型文件目录')
+    parser.add_argument('--time-budget', type=float, default=300, help='单次训练时间上限（秒）')
+    parser.add_argument('--poll-interval', type=float, default=10, help='轮询间隔（秒）')
+    parser.add_argument('--once', action='store_true', help='处理完排队任务后退出')
+    parser.add_argument('--list', action='store_true', help='列出模型版本')
+    parser.add_argument('--rollback', nargs='?', const='', metavar='VERSION',
+                        help='回滚模型版本（不指定版本时回滚到上一个激活版本）')
+    args = parser.parse_args()
+
+    if args.list or args.rollback is not None:
+        registry = ModelRegistry(args.db, args.model_dir)
+        if args.rollback is not None:
+            version = registry.rollback(args.rollback or None)
+            print(f"✅ 已回滚到: {version}" if version else "❌ 回滚失败")
+        print_versions(registry)
+        return 0
+
+    worker = TrainingWorker(
+        args.db,
+        args.model_dir,
+        time_budget=args.time_budget,
+        poll_interval=args.poll_interval
+    )
+    worker.run(once=args.once)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,352 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+持久化工作队列模块
+文件监控等事件线程只把任务写入SQLite队列（毫秒级），由工作线程池领取并处理；
+服务重启后未完成的任务自动重新排队，队列深度和等待时间可随时查询
+"""
+
+import time
+import logging
+import threading
+from typing import Callable, Dict, Optional, Tuple
+
+from db_manager import connect
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class WorkQueue:
+    """SQLite持久化工作队列（同一队列中排队或处理中的相同任务不会重复入队）"""
+
+    def __init__(self, db_path: str, name: str = 'default', max_depth: int = 100,
+                 max_attempts: int = 3):
+        """
+        初始化工作队列
+
+        Args:
+            db_path: 数据库路径
+            name: 队列名称（同一个库中的多个队列互不干扰）
+            max_depth: 排队任务数上限，超出后阻塞式入队需要等待（背压）
+            max_attempts: 处理异常时的最大尝试次数
+        """
+        self.db_path = db_path
+        self.name = name
+        self.max_depth = max_depth
+        self.max_attempts = max_attempts
+
+        # 本进程入队或任务完成时唤醒等待方，其他进程入队的任务靠轮询发现
+        self._changed = threading.Condition()
+
+        self._create_tables()
+
+    def _connect(self):
+        """每次操作使用独立连接，监控进程和补扫进程可同时入队"""
+        return connect(self.db_path)
+
+    def _create_tables(self):
+        """创建数据表"""
+        conn = self._connect()
+        try:
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS work_queue (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    queue TEXT NOT NULL,
+                    item TEXT NOT NULL,
+                    source TEXT,
+                    status TEXT NOT NULL DEFAULT 'pending',
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    enqueued_at REAL NOT NULL,
+                    started_at REAL,
+                    finished_at REAL,
+                    error TEXT
+                )
+            ''')
+            conn.execute('''
+                CREATE INDEX IF NOT EXISTS idx_work_queue_status
+                ON work_queue(queue, status, id)
+            ''')
+            conn.execute('''
+                CREATE INDEX IF NOT EXISTS idx_work_queue_item
+                ON work_queue(queue, item, status)
+            ''')
+            conn.commit()
+        finally:
+            conn.close()
+
+    def put(self, item: str, source: str = None, block: bool = False,
+            timeout: float = None) -> Optional[int]:
+        """
+        任务入队
+
+        任务总是先写入队列；block为True且排队数超过max_depth时，等待队列消化后才返回
+
+        Args:
+            item: 任务内容（如文件路径）
+            source: 任务来源
+            block: 队列已满时是否等待（事件线程不应等待）
+            timeout: 最长等待时间（秒），None表示一直等待
+
+        Returns:
+            任务ID，相同任务已在排队或处理中时返回已有任务ID
+        """
+        conn = self._connect()
+        try:
+            with conn:
+                conn.execute('BEGIN IMMEDIATE')
+                row = conn.execute('''
+                    SELECT id FROM work_queue
+                    WHERE queue = ? AND item = ? AND status IN ('pending', 'running')
+                ''', (self.name, item)).fetchone()
+                if row:
+                    return row[0]
+
+                cursor = conn.execute('''
+                    INSERT INTO work_queue (queue, item, source, status, enqueued_at)
+                    VALUES (?, ?, ?, 'pending', ?)
+                ''', (self.name, item, source, time.time()))
+                task_id = cursor.lastrowid
+        finally:
+            conn.close()
+
+        with self._changed:
+            self._changed.notify_all()
+
+        if block:
+            self.wait_for_capacity(timeout)
+        return task_id
+
+    def wait_for_capacity(self, timeout: float = None, poll_interval: float = 1) -> bool:
+        """
+        等待排队数降到max_depth以下
+
+        Args:
+            timeout: 最长等待时间（秒），None表示一直等待
+            poll_interval: 检查间隔（秒）
+
+        Returns:
+            是否在超时前降到上限以下
+        """
+        deadline = None if timeout is None else time.time() + timeout
+        while self.depth() > self.max_depth:
+            remaining = None if deadline is None else deadline - time.time()
+            if remaining is not None and remaining <= 0:
+                return False
+            with self._changed:
+                self._changed.wait(poll_interval if remaining is None else min(poll_interval, remaining))
+        return True
+
+    def claim(self, timeout: float = 0, poll_interval: float = 1) -> Optional[Tuple[int, str, int]]:
+        """
+        领取最早的排队任务
+
+        Args:
+            timeout: 没有任务时最长等待时间（秒）
+            poll_interval: 轮询间隔（秒）
+
+        Returns:
+            (任务ID, 任务内容, 已尝试次数)，超时仍没有任务时返回None
+        """
+        deadline = time.time() + timeout
+        while True:
+            task = self._claim_once()
+            if task is not None:
+                return task
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                return None
+            with self._changed:
+                self._changed.wait(min(poll_interval, remaining))
+
+    def _claim_once(self) -> Optional[Tuple[int, str, int]]:
+        """领取一个排队任务"""
+        conn = self._connect()
+        try:
+            with conn:
+                conn.execute('BEGIN IMMEDIATE')
+                row = conn.execute('''
+                    SELECT id, item, attempts FROM work_queue
+                    WHERE queue = ? AND status = 'pending'
+                    ORDER BY id LIMIT 1
+                ''', (self.name,)).fetchone()
+                if not row:
+                    return None
+
+                conn.execute('''
+                    UPDATE work_queue SET status = 'running', started_at = ?, attempts = attempts + 1
+                    WHERE id = ?
+                ''', (time.time(), row[0]))
+                return row[0], row[1], row[2] + 1
+        finally:
+            conn.close()
+
+    def finish(self, task_id: int, error: str = None, retry: bool = False):
+        """
+        结束任务
+
+        Args:
+            task_id: 任务ID
+            error: 失败原因
+            retry: 失败且尝试次数未超过max_attempts时重新排队
+        """
+        conn = self._connect()
+        try:
+            with conn:
+                if error and retry:
+                    cursor = conn.execute('''
+                        UPDATE work_queue SET status = 'pending', started_at = NULL, error = ?
+                        WHERE id = ? AND attempts < ?
+                    ''', (error, task_id, self.max_attempts))
+                    if cursor.rowcount:
+                        return
+                conn.execute('''
+                    UPDATE work_queue SET status = ?, finished_at = ?, error = ?
+                    WHERE id = ?
+                ''', ('failed' if error else 'done', time.time(), error, task_id))
+        finally:
+            conn.close()
+            with self._changed:
+                self._changed.notify_all()
+
+    def reset_stale(self) -> int:
+        """把上次异常退出时遗留的处理中任务重新排队"""
+        conn = self._connect()
+        try:
+            with conn:
+                cursor = conn.execute('''
+                    UPDATE work_queue SET status = 'pending', started_at = NULL
+                    WHERE queue = ? AND status = 'running'
+                ''', (self.name,))
+                if cursor.rowcount:
+                    logger.info(f"队列{self.name}: 重新排队{cursor.rowcount}个未完成的任务")
+                return cursor.rowcount
+        finally:
+            conn.close()
+
+    def depth(self) -> int:
+        """排队中的任务数"""
+        conn = self._connect()
+        try:
+            return conn.execute('''
+                SELECT COUNT(*) FROM work_queue WHERE queue = ? AND status = 'pending'
+            ''', (self.name,)).fetchone()[0]
+        finally:
+            conn.close()
+
+    def stats(self, window: float = 3600) -> Dict:
+        """
+        队列指标
+
+        Args:
+            window: 统计最近多少秒内开始处理的任务的等待时间
+
+        Returns:
+            {'queue', 'pending', 'running', 'done', 'failed', 'oldest_pending_seconds',
+             'avg_wait_seconds', 'max_wait_seconds', 'avg_process_seconds', 'processed_in_window'}
+        """
+        now = time.time()
+        conn = self._connect()
+        try:
+            counts = dict(conn.execute('''
+                SELECT status, COUNT(*) FROM work_queue WHERE queue = ? GROUP BY status
+            ''', (self.name,)).fetchall())
+            oldest = conn.execute('''
+                SELECT MIN(enqueued_at) FROM work_queue WHERE queue = ? AND status = 'pending'
+            ''', (self.name,)).fetchone()[0]
+            waits = conn.execute('''
+                SELECT COUNT(*), AVG(started_at - enqueued_at), MAX(started_at - enqueued_at),
+                       AVG(finished_at - started_at)
+                FROM work_queue
+                WHERE queue = ? AND started_at >= ? AND status IN ('done', 'failed')
+            ''', (self.name, now - window)).fetchone()
+        finally:
+            conn.close()
+
+        return {
+            'queue': self.name,
+            'pending': counts.get('pending', 0),
+            'running': counts.get('running', 0),
+            'done': counts.get('done', 0),
+            'failed': counts.get('failed', 0),
+            'oldest_pending_seconds': now - oldest if oldest else 0,
+            'avg_wait_seconds': waits[1] or 0,
+            'max_wait_seconds': waits[2] or 0,
+            'avg_process_seconds': waits[3] or 0,
+            'processed_in_window': waits[0]
+        }
+
+    def purge(self, older_than_days: float = 30) -> int:
+        """删除早于指定天数的已完成任务"""
+        conn = self._connect()
+        try:
+            with conn:
+                cursor = conn.execute('''
+                    DELETE FROM work_queue
+                    WHERE queue = ? AND status IN ('done', 'failed') AND finished_at < ?
+                ''', (self.name, time.time() - older_than_days * 86400))
+                return cursor.rowcount
+        finally:
+            conn.close()
+
+
+class WorkerPool:
+    """工作线程池：持续从队列领取任务并调用处理函数"""
+
+    def __init__(self, queue: WorkQueue, process: Callable[[str], None], workers: int = 2,
+                 poll_interval: float = 2):
+        """
+        初始化线程池
+
+        Args:
+            queue: 工作队列
+            process: 处理函数，参数为任务内容；抛出异常时按队列的max_attempts重试
+            workers: 工作线程数
+            poll_interval: 空闲时检查队列的间隔（秒）
+        """
+        self.queue = queue
+        self.process = process
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self._stop = threading.Event()
+        self._threads = []
+
+    def start(self):
+        """启动工作线程（先把上次遗留的处理中任务重新排队）"""
+        self.queue.reset_stale()
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._run, name=f'{self.queue.name}-worker-{i + 1}',
+                                      daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        logger.info(f"队列{self.queue.name}: 已启动{self.workers}个工作线程")
+
+    def stop(self, timeout: float = None):
+        """停止工作线程（等待正在处理的任务完成）"""
+        self._stop.set()
+        with self.queue._changed:
+            self.queue._changed.notify_all()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def _run(self):
+        """工作线程主循环"""
+        while not self._stop.is_set():
+            try:
+                task = self.queue.claim(timeout=self.poll_interval)
+            except Exception as e:
+                logger.error(f"队列{self.queue.name}: 领取任务失败: {e}")
+                self._stop.wait(self.poll_interval)
+                continue
+            if task is None:
+                continue
+
+            task_id, item, attempts = task
+            try:
+                self.process(item)
+                self.queue.finish(task_id)
+            except Exception as e:
+                logger.error(f"队列{self.queue.name}: 任务处理异常(第{attempts}次): {item}, {e}",
+                             exc_info=True)
+                self.queue.finish(task_id, error=str(e), retry=True)
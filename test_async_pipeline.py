@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+异步分析流水线测试
+本地启动一个保持连接（keep-alive）的模拟API服务，连续两次调用AsyncAnalysisPipeline.run()，
+第二次调用不能因为客户端连接池绑定在已关闭的事件循环上而失败
+"""
+
+import os
+import sys
+import json
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# 添加modules目录到路径
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'modules'))
+
+os.environ.setdefault('ZZZAPI', 'test-key')
+
+from PIL import Image
+
+from ocr_extractor import OCRExtractor
+from semantic_analyzer import SemanticAnalyzer
+from async_pipeline import AsyncAnalysisPipeline
+
+OCR_TEXT = '今日市场分析：黄金波动率22.5，市场处于买入期，建议稳健投资者观望。'
+
+
+class FakeAPIHandler(BaseHTTPRequestHandler):
+    """模拟chat.completions接口（HTTP/1.1保持连接）"""
+
+    protocol_version = 'HTTP/1.1'
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        if body.get('response_format'):
+            content = json.dumps({'market_cycle': '买入期', 'operation_suggestions': []}, ensure_ascii=False)
+        else:
+            content = OCR_TEXT
+
+        data = json.dumps({
+            'id': 'test', 'object': 'chat.completion', 'created': 0, 'model': body['model'],
+            'choices': [{'index': 0, 'finish_reason': 'stop',
+                         'message': {'role': 'assistant', 'content': content}}],
+            'usage': {'prompt_tokens': 1, 'completion_tokens': 1, 'total_tokens': 2}
+        }, ensure_ascii=False).encode('utf-8')
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def make_images(directory, count):
+    """生成测试图片（每张内容不同，避免命中缓存）"""
+    paths = []
+    for i in range(count):
+        path = os.path.join(directory, f'{i}.png')
+        Image.new('RGB', (64, 64), (i * 40 % 256, 100, 200)).save(path)
+        paths.append(path)
+    return paths
+
+
+def main():
+    """主函数"""
+    server = ThreadingHTTPServer(('127.0.0.1', 0), FakeAPIHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    try:
+        pipeline = AsyncAnalysisPipeline(OCRExtractor(), SemanticAnalyzer(use_rules=False), max_workers=2)
+        pipeline.base_url = f'http://127.0.0.1:{server.server_address[1]}/v1'
+
+        failed = 0
+        with tempfile.TemporaryDirectory() as directory:
+            images = make_images(directory, 3)
+            for round_index in (1, 2):
+                results = pipeline.run(images)
+                errors = [item['error'] for item in results if item['error'] or item['text'] != OCR_TEXT]
+                print(f"第{round_index}次run(): {len(results)}张图片，失败{len(errors)}张 {errors[:1]}")
+                failed += len(errors)
+    finally:
+        server.shutdown()
+
+    if failed:
+        print("❌ 连续调用run()失败")
+        return 1
+
+    print("✅ 连续调用run()均成功")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
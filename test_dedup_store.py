@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+去重索引测试
+新建的库和旧版（未启用增量回收）的库打开后都应为auto_vacuum=INCREMENTAL，
+compact()清理九成过期的失败记录后数据库文件至少缩小一半
+"""
+
+import os
+import sys
+import sqlite3
+import tempfile
+from datetime import datetime, timedelta
+
+# 添加modules目录到路径
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'modules'))
+
+from db_manager import connect
+from dedup_store import DedupStore
+
+RECORDS = 20000
+
+
+def create_legacy_db(db_path):
+    """按旧版方式建表（建表后才设置auto_vacuum，不生效）"""
+    conn = sqlite3.connect(db_path)
+    conn.execute('''
+        CREATE TABLE processed_items (
+            namespace TEXT NOT NULL,
+            item_key TEXT NOT NULL,
+            status TEXT NOT NULL,
+            path TEXT,
+            source TEXT,
+            title TEXT,
+            prediction_id INTEGER,
+            error TEXT,
+            first_seen TIMESTAMP,
+            last_seen TIMESTAMP,
+            hits INTEGER NOT NULL DEFAULT 1,
+            PRIMARY KEY (namespace, item_key)
+        ) WITHOUT ROWID
+    ''')
+    conn.commit()
+    conn.close()
+
+
+def file_size(db_path):
+    """WAL内容写回主文件后的数据库文件大小"""
+    conn = connect(db_path)
+    try:
+        conn.execute('PRAGMA wal_checkpoint(TRUNCATE)').fetchall()
+        return os.path.getsize(db_path)
+    finally:
+        conn.close()
+
+
+def check(db_path, legacy):
+    """写入过期的失败记录，检查compact()后文件是否变小"""
+    if legacy:
+        create_legacy_db(db_path)
+
+    store = DedupStore(db_path, failed_days=30)
+    conn = connect(db_path)
+    auto_vacuum = conn.execute('PRAGMA auto_vacuum').fetchone()[0]
+    conn.close()
+
+    store.COMPACT_INTERVAL = RECORDS * 2
+    store.record_many([
+        {'key': f'{i:064x}', 'status': 'done' if i % 10 == 0 else 'failed',
+         'error': '识别失败' * 10, 'path': f'/data/images/{i}.png'}
+        for i in range(RECORDS)
+    ])
+
+    # 把失败记录的最近时间改到保留期之前
+    conn = connect(db_path)
+    with conn:
+        conn.execute("UPDATE processed_items SET last_seen = ? WHERE status = 'failed'",
+                     (datetime.now() - timedelta(days=60),))
+    conn.close()
+
+    before = file_size(db_path)
+    removed = store.compact()
+    after = file_size(db_path)
+    remaining = sum(sum(item.values()) for item in store.get_stats().values())
+
+    name = '旧版库' if legacy else '新建库'
+    ok = auto_vacuum == 2 and after < before // 2 and remaining == RECORDS // 10
+    print(f"{'✅' if ok else '❌'} {name}: auto_vacuum={auto_vacuum}, 清理{removed}条，"
+          f"剩余{remaining}条，文件 {before // 1024}KB -> {after // 1024}KB")
+    return ok
+
+
+def main():
+    """主函数"""
+    failed = 0
+    with tempfile.TemporaryDirectory() as directory:
+        for legacy in (False, True):
+            failed += not check(os.path.join(directory, f'dedup_{int(legacy)}.db'), legacy)
+
+    if failed:
+        print("❌ 去重索引空间回收测试失败")
+        return 1
+
+    print("✅ compact()后数据库文件变小")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+规则提取器测试
+模板化图文应被规则完整提取；投资者类型和操作之间出现否定说法时，
+不能提取成相反的操作建议，覆盖率记为0交给大模型分析
+"""
+
+import os
+import sys
+
+# 添加modules目录到路径
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'modules'))
+
+from rule_extractor import RuleBasedExtractor
+
+TEMPLATE = """
+今日市场分析（2026-02-17）
+黄金波动率：22.5
+市场周期：买入期
+趋势判断：看涨
+风险等级：低
+{suggestion}
+"""
+
+# (操作建议, 期望提取的(策略, 操作), 是否应交给大模型)
+CASES = [
+    ('建议激进投资者可以适当建仓，稳健投资者观望。', [('激进', '建仓'), ('稳健', '观望')], False),
+    ('激进投资者不建议建仓。', [], True),
+    ('稳健投资者暂不加仓。', [], True),
+    ('保守投资者不减仓，继续持有。', [], True),
+    ('激进投资者避免追高加仓。', [], True),
+    ('激进投资者可以建仓；稳健投资者暂不加仓。', [('激进', '建仓')], True),
+]
+
+
+def main():
+    """主函数"""
+    extractor = RuleBasedExtractor()
+
+    failed = 0
+    for suggestion, expected, to_llm in CASES:
+        result, coverage = extractor.extract(TEMPLATE.format(suggestion=suggestion))
+        actions = [(item['strategy'], item['action']) for item in result['operation_suggestions']]
+        ok = actions == expected and (coverage == 0) == to_llm
+        print(f"{'✅' if ok else '❌'} {suggestion} -> {actions}，覆盖率{coverage:.0%}")
+        failed += not ok
+
+    if failed:
+        print(f"❌ 规则提取测试失败（{failed}个用例）")
+        return 1
+
+    print("✅ 规则提取结果正确")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
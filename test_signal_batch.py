@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+批量评分一致性测试
+随机生成结构化数据，逐条调用SignalAnalyzer.predict_smile，
+与BatchSignalScorer的向量化结果逐字段比对（默认配置和多组自定义配置）
+"""
+
+import os
+import sys
+import random
+
+# 添加modules目录到路径
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'modules'))
+
+from signal_analyzer import SignalAnalyzer
+from signal_batch import BatchSignalScorer, PREDICTION_LABELS
+
+FIELDS = ['buy_score', 'sell_score', 'prediction', 'confidence', 'smile_count']
+
+ACTIONS = ['建仓', '适当加仓', '减仓', '清仓', '观望', '持有', '不建议建仓', '不要清仓', '加仓或减仓', '']
+
+# 自定义配置（包含小数权重和阈值，覆盖各种边界）
+CONFIGS = [
+    None,
+    {'weights': {'market_cycle': 2.5, 'trend_judgment': 1.5, 'risk_level': 0.5,
+                 'operation_suggestion': 1.25, 'confidence': 0.75},
+     'thresholds': {'buy_smile_threshold': 3.5, 'sell_smile_threshold': 4.5,
+                    'strong_signal_threshold': 5}},
+    {'weights': {'market_cycle': 4, 'trend_judgment': 0, 'risk_level': 2,
+                 'operation_suggestion': 0.5, 'confidence': 2},
+     'thresholds': {'buy_smile_threshold': 5.5, 'sell_smile_threshold': 2,
+                    'strong_signal_threshold': 8}},
+    # 非二进制精确的小数权重（逐次累加与乘法的浮点结果不同）
+    {'weights': {'market_cycle': 0.7, 'trend_judgment': 0.1, 'risk_level': 0.2,
+                 'operation_suggestion': 0.3, 'confidence': 0.1},
+     'thresholds': {'buy_smile_threshold': 1.0000000000000002, 'sell_smile_threshold': 0.7,
+                    'strong_signal_threshold': 1.3}},
+    {'weights': {'market_cycle': 0.3, 'trend_judgment': 0.7, 'risk_level': 0.1,
+                 'operation_suggestion': 0.1, 'confidence': 0.2},
+     'thresholds': {'buy_smile_threshold': 0.3, 'sell_smile_threshold': 0.6000000000000001,
+                    'strong_signal_threshold': 0.9}},
+]
+
+
+def random_record(rng):
+    """生成一条随机结构化数据"""
+    record = {
+        'market_cycle': rng.choice(['买入期', '持有期', '减仓期', '未明确', None]),
+        'trend_judgment': rng.choice(['看涨', '看跌', '震荡', '未明确']),
+        'confidence': rng.choice(['强', '中', '弱'])
+    }
+    if rng.random() < 0.9:
+        record['risk_assessment'] = {'risk_level': rng.choice(['高', '中', '低', None])}
+    if rng.random() < 0.9:
+        record['operation_suggestions'] = [
+            {'strategy': rng.choice(['激进', '稳健', '保守']), 'action': rng.choice(ACTIONS)}
+            for _ in range(rng.randint(0, 4))
+        ]
+    return record
+
+
+def check_parity(analyzer, scorer, records, config=None):
+    """逐条比对，返回不一致的条数"""
+    if config:
+        analyzer.config['weights'].update(config['weights'])
+        analyzer.config['thresholds'].update(config['thresholds'])
+
+    batch = scorer.to_dicts(scorer.score(scorer.encode(records)))
+
+    mismatches = 0
+    for record, expected, actual in zip(records, map(analyzer.predict_smile, records), batch):
+        for field in FIELDS:
+            if expected[field] != actual[field]:
+                mismatches += 1
+                print(f"❌ {field}: 逐条={expected[field]} 批量={actual[field]} 数据={record}")
+                break
+    return mismatches
+
+
+def check_multi_config(analyzer, scorer, records):
+    """一次传入多组权重，与逐组计算的结果比对"""
+    columns = scorer.encode(records)
+
+    mismatches = 0
+    for name, values in [('market_cycle', [1, 2, 3, 4.5]), ('operation_suggestion', [0.1, 0.3, 0.7])]:
+        stacked = scorer.score(columns, weights={name: values})
+        for k, value in enumerate(values):
+            single = scorer.score(columns, weights={name: value})
+            for field in FIELDS:
+                if not (stacked[field][k] == single[field]).all():
+                    mismatches += 1
+                    print(f"❌ 多组配置 {name}={value} 字段{field}不一致")
+    return mismatches
+
+
+def main():
+    """主函数"""
+    rng = random.Random(20260217)
+    records = [random_record(rng) for _ in range(5000)]
+
+    failed = 0
+    for index, config in enumerate(CONFIGS):
+        analyzer = SignalAnalyzer()
+        scorer = BatchSignalScorer(analyzer)
+        mismatches = check_parity(analyzer, scorer, records, config)
+        predictions = {label: 0 for label in PREDICTION_LABELS}
+        for item in scorer.predict(records):
+            predictions[item['prediction']] += 1
+        print(f"配置{index}: {len(records)}条，不一致{mismatches}条，预测分布{predictions}")
+        failed += mismatches
+
+    failed += check_multi_config(SignalAnalyzer(), BatchSignalScorer(), records)
+
+    if failed:
+        print(f"❌ 一致性测试失败（{failed}处不一致）")
+        return 1
+
+    print("✅ 批量评分与逐条评分结果完全一致")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
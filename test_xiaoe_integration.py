@@ -98,17 +98,15 @@ def test_content_history():
         )
         
         # 测试保存
-        monitor.content_history["images"]["test_id"] = {
-            "title": "测试图文",
-            "time": "2026-02-17",
-            "file": "/test/path.png"
-        }
-        monitor._save_content_history()
-        
-        # 测试加载
-        loaded_history = monitor._load_content_history()
+        monitor.dedup.record(
+            "test_id",
+            namespace=monitor.HISTORY_NAMESPACES["image"],
+            source="test",
+            title="测试图文"
+        )
         
-        if "test_id" in loaded_history["images"]:
+        # 测试查询
+        if monitor.dedup.is_processed("test_id", monitor.HISTORY_NAMESPACES["image"]):
             print("✅ 内容历史记录读写正常")
             return True
         else:
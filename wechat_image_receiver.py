@@ -16,7 +16,8 @@ import os
 import sys
 import time
 import logging
-import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from datetime import datetime
 from watchdog.observers import Observer
@@ -25,7 +26,10 @@ from watchdog.events import FileSystemEventHandler
 # 添加当前目录到路径
 sys.path.insert(0, os.path.dirname(__file__))
 
-from maoge_image_handler import MaogeImageHandler, send_wechat_message, MaogeConfig
+from maoge_image_handler import (MaogeImageHandler, send_wechat_message, MaogeConfig,
+                                 parse_feedback_text, format_feedback_summary)
+from work_queue import WorkQueue, WorkerPool
+from file_hash import quick_signature
 
 # 配置日志
 logging.basicConfig(
@@ -38,120 +42,359 @@ logger = logging.getLogger('wechat_image_receiver')
 
 # ==================== 方式C：目录监控 ====================
 
+# 处理的图片格式
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.gif', '.bmp')
+
+# 上传/下载工具写入中的临时文件（完成后重命名为正式文件名，由移动事件处理）
+PARTIAL_SUFFIXES = ('.part', '.partial', '.tmp', '.temp', '.crdownload', '.download', '.filepart')
+
+# 文件写入完成判断：大小和修改时间保持不变的时长、检查间隔、最长等待时间（秒）
+SETTLE_QUIET = 1.0
+SETTLE_POLL = 0.1
+SETTLE_TIMEOUT = 120
+
+# 图片文件结尾标记（检查最后64KB，写入一半的图片没有结尾标记）
+IMAGE_TRAILERS = {
+    '.png': b'IEND',
+    '.jpg': b'\xff\xd9',
+    '.jpeg': b'\xff\xd9',
+    '.gif': b'\x3b',
+}
+
+
+def is_image_file(file_path):
+    """是否为需要处理的图片（跳过隐藏文件和写入中的临时文件，如rsync的.name.XXXXXX、x.png.part）"""
+    name = os.path.basename(file_path).lower()
+    if name.startswith(('.', '~')) or name.endswith(PARTIAL_SUFFIXES):
+        return False
+    return name.endswith(IMAGE_EXTENSIONS)
+
+
+def has_image_trailer(file_path):
+    """图片结尾标记是否完整（没有对应标记的格式视为完整）"""
+    trailer = IMAGE_TRAILERS.get(os.path.splitext(file_path)[1].lower())
+    if trailer is None:
+        return True
+    
+    try:
+        with open(file_path, 'rb') as f:
+            f.seek(0, os.SEEK_END)
+            f.seek(max(0, f.tell() - 65536))
+            return trailer in f.read()
+    except OSError:
+        return False
+
+
 class ImageDirectoryHandler(FileSystemEventHandler):
-    """图片目录监控处理器"""
+    """图片目录监控处理器（事件线程只负责入队，由工作线程处理）"""
     
-    def __init__(self, handler):
+    def __init__(self, handler, queue):
         """
         初始化
         
         Args:
             handler: MaogeImageHandler实例
+            queue: 待处理图片的WorkQueue
         """
         self.handler = handler
-        self.processed_files = set()
+        self.queue = queue
+        self._lock = threading.Lock()
         
-        # 加载已处理文件列表
-        self._load_processed_files()
+        # 已收到写入关闭或重命名事件的文件（写入已完成，无需等待）
+        self._completed_files = set()
     
-    def _load_processed_files(self):
-        """加载已处理文件列表"""
-        processed_file = os.path.join(
-            os.path.dirname(MaogeConfig.DB_PATH),
-            'processed_images.txt'
-        )
-        
-        if os.path.exists(processed_file):
-            with open(processed_file, 'r') as f:
-                self.processed_files = set(line.strip() for line in f)
-            logger.info(f"加载了{len(self.processed_files)}个已处理文件记录")
-    
-    def _save_processed_file(self, file_path):
-        """保存已处理文件记录"""
-        processed_file = os.path.join(
-            os.path.dirname(MaogeConfig.DB_PATH),
-            'processed_images.txt'
-        )
-        
-        with open(processed_file, 'a') as f:
-            f.write(file_path + '\n')
-        
-        self.processed_files.add(file_path)
-    
-    def _get_file_hash(self, file_path):
-        """获取文件哈希值"""
+    def _enqueue(self, file_path):
+        """加入处理队列"""
         try:
-            with open(file_path, 'rb') as f:
-                return hashlib.md5(f.read()).hexdigest()
-        except:
-            return None
+            self.queue.put(file_path, source='directory_monitor')
+            logger.info(f"检测到新图片，已加入处理队列: {file_path}")
+        except Exception as e:
+            logger.error(f"图片入队失败: {file_path}, {e}", exc_info=True)
+    
+    def _mark_completed(self, file_path):
+        """记录文件写入已完成（等待中的工作线程下次检查时即可开始处理）"""
+        with self._lock:
+            self._completed_files.add(file_path)
     
     def on_created(self, event):
-        """文件创建事件"""
-        if event.is_directory:
+        """文件创建事件（watchdog只有一个事件线程，这里只入队，不做任何耗时操作）"""
+        if event.is_directory or not is_image_file(event.src_path):
             return
         
-        file_path = event.src_path
+        self._enqueue(event.src_path)
+    
+    def on_closed(self, event):
+        """文件写入后关闭事件（inotify的IN_CLOSE_WRITE，写入已完成）"""
+        if event.is_directory or not is_image_file(event.src_path):
+            return
         
-        # 只处理图片文件
-        if not file_path.lower().endswith(('.png', '.jpg', '.jpeg', '.gif', '.bmp')):
+        self._mark_completed(event.src_path)
+        self._enqueue(event.src_path)
+    
+    def on_moved(self, event):
+        """文件重命名事件（先写临时文件再重命名的上传方式，目标文件已完整）"""
+        if event.is_directory or not is_image_file(event.dest_path):
             return
         
-        # 等待文件写入完成
-        time.sleep(2)
+        self._mark_completed(event.dest_path)
+        self._enqueue(event.dest_path)
+    
+    def wait_until_complete(self, file_path):
+        """
+        等待文件写入完成
+        
+        收到写入关闭/重命名事件，或大小和修改时间SETTLE_QUIET秒内没有变化，且图片结尾标记完整时视为完成；
+        已写完的小文件无需等待
         
-        # 检查是否已处理
-        file_hash = self._get_file_hash(file_path)
-        if file_hash and file_hash in self.processed_files:
-            logger.info(f"文件已处理过，跳过: {file_path}")
+        Args:
+            file_path: 图片路径
+        
+        Returns:
+            True表示写入完成，False表示超时仍未完成，None表示文件已不存在
+        """
+        deadline = time.time() + SETTLE_TIMEOUT
+        last_signature = None
+        changed_at = time.time()
+        
+        while True:
+            try:
+                stat = os.stat(file_path)
+            except FileNotFoundError:
+                return None
+            
+            now = time.time()
+            signature = (stat.st_size, stat.st_mtime_ns)
+            if signature != last_signature:
+                last_signature, changed_at = signature, now
+            
+            with self._lock:
+                completed = file_path in self._completed_files
+            
+            settled = (completed
+                       or now - stat.st_mtime >= SETTLE_QUIET
+                       or now - changed_at >= SETTLE_QUIET)
+            if settled and stat.st_size > 0 and has_image_trailer(file_path):
+                return True
+            
+            if now >= deadline:
+                return False
+            time.sleep(SETTLE_POLL)
+    
+    def process_file(self, file_path):
+        """
+        处理一张图片（在工作线程中执行）
+        
+        处理结果失败时通知并结束；抛出异常时由队列重新排队重试
+        
+        Args:
+            file_path: 图片路径
+        """
+        try:
+            complete = self.wait_until_complete(file_path)
+        finally:
+            with self._lock:
+                self._completed_files.discard(file_path)
+        
+        if complete is None:
+            logger.warning(f"文件已不存在，跳过: {file_path}")
             return
+        if not complete:
+            # 上传中断或仍在写入，稍后由队列重试
+            raise RuntimeError(f"文件{SETTLE_TIMEOUT}秒内未写入完成")
         
-        logger.info(f"检测到新图片: {file_path}")
+        logger.info(f"开始处理图片: {file_path}")
         
         try:
-            # 处理图片
-            result = self.handler.process_image(file_path, source='directory_monitor')
-            
-            if result['success']:
-                # 发送分析结果
-                send_wechat_message(result['message'])
-                
-                # 记录已处理
-                if file_hash:
-                    self._save_processed_file(file_hash)
-                
-                logger.info(f"图片处理成功: {file_path}")
-            else:
-                error_msg = f"⚠️ 图片处理失败\n\n文件: {os.path.basename(file_path)}\n错误: {result.get('error', '未知错误')}"
-                send_wechat_message(error_msg)
-                logger.error(f"图片处理失败: {file_path}, 错误: {result.get('error')}")
-                
+            # 处理图片（已处理过的图片由去重索引跳过，处理结果记入索引）
+            result = self.handler.process_unique_image(file_path, source='directory_monitor')
         except Exception as e:
-            logger.error(f"处理图片异常: {file_path}, {e}", exc_info=True)
             error_msg = f"⚠️ 图片处理异常\n\n文件: {os.path.basename(file_path)}\n异常: {str(e)}"
             send_wechat_message(error_msg)
+            raise
+        
+        if result.get('duplicate'):
+            return
+        
+        if result['success']:
+            # 发送分析结果
+            send_wechat_message(result['message'])
+            logger.info(f"图片处理成功: {file_path}")
+        else:
+            error_msg = f"⚠️ 图片处理失败\n\n文件: {os.path.basename(file_path)}\n错误: {result.get('error', '未知错误')}"
+            send_wechat_message(error_msg)
+            logger.error(f"图片处理失败: {file_path}, 错误: {result.get('error')}")
+
+
+class DirectoryReconciler:
+    """
+    目录补扫
+    
+    启动时及定期扫描监控目录，与已处理记录比对，把停机期间写入或漏掉事件的图片按限定速率加入处理队列；
+    文件未变化时使用缓存的哈希，新文件先用快速签名预筛，从未出现过的内容直接入队，由工作线程计算完整哈希
+    """
+    
+    def __init__(self, event_handler, watch_dir, interval=None, rate=None, hash_workers=None):
+        """
+        初始化
+        
+        Args:
+            event_handler: ImageDirectoryHandler实例（提供处理队列和图片处理器）
+            watch_dir: 监控目录路径
+            interval: 定期补扫间隔（秒），默认MaogeConfig.RECONCILE_INTERVAL
+            rate: 每秒最多入队的图片数，默认MaogeConfig.RECONCILE_RATE
+            hash_workers: 并行计算签名和哈希的线程数，默认MaogeConfig.RECONCILE_HASH_WORKERS
+        """
+        self.event_handler = event_handler
+        self.watch_dir = watch_dir
+        self.interval = interval or MaogeConfig.RECONCILE_INTERVAL
+        self.rate = rate or MaogeConfig.RECONCILE_RATE
+        self.hash_workers = hash_workers or MaogeConfig.RECONCILE_HASH_WORKERS
+        
+        # 上次扫描到的图片（删除的图片同时清理哈希缓存）
+        self._files = set()
+        # 本进程已补入队列的(路径, 大小, 修改时间)，处理失败的图片不在每次补扫时反复重试；
+        # 每次扫描时去掉已删除或已变化的文件，集合大小不超过目录中的图片数
+        self._enqueued = set()
+        self._stop = threading.Event()
+        self._thread = None
+    
+    def _list_images(self):
+        """列出监控目录中的图片及其(大小, 修改时间)"""
+        files = {}
+        try:
+            with os.scandir(self.watch_dir) as entries:
+                for entry in entries:
+                    if entry.is_file() and is_image_file(entry.path):
+                        stat = entry.stat()
+                        files[entry.path] = (stat.st_size, stat.st_mtime_ns)
+        except FileNotFoundError:
+            pass
+        return files
+    
+    def scan(self):
+        """
+        扫描一次监控目录，未处理的图片加入处理队列
+        
+        Returns:
+            {'files': 图片数, 'prefiltered': 预筛确定为新内容的数量,
+             'hashed': 计算完整哈希的数量, 'enqueued': 入队数}
+        """
+        files = self._list_images()
+        handler = self.event_handler.handler
+        
+        # 删除已不存在的文件的哈希缓存，入队记录只保留仍存在且未变化的文件
+        handler.hasher.forget(self._files - set(files))
+        self._files = set(files)
+        self._enqueued = {item for item in self._enqueued if files.get(item[0]) == item[1:]}
+        
+        # 文件未变化的直接使用缓存的哈希（不读取文件）
+        digests = handler.hasher.cached_digests(files)
+        unknown = [path for path in files if path not in digests]
+        
+        # 其余文件按大小+首尾采样预筛，只有可能与已知内容相同的才计算完整哈希
+        def signature(path):
+            try:
+                return quick_signature(path)
+            except OSError:
+                return None
+        
+        with ThreadPoolExecutor(max_workers=self.hash_workers) as executor:
+            signatures = {path: (files[path][0], quick)
+                          for path, quick in zip(unknown, executor.map(signature, unknown)) if quick}
+        maybe_known = handler.hasher.known_signatures(signatures)
+        new_content = {path for path, known in maybe_known.items() if not known}
+        to_hash = [path for path, known in maybe_known.items() if known]
+        digests.update(handler.hasher.digest_many(to_hash, self.hash_workers))
+        
+        # 按批查询去重索引
+        processed = handler.dedup.processed_keys(set(digests.values()))
+        pending = sorted(
+            (path for path in files
+             if (path in new_content or (path in digests and digests[path] not in processed))
+             and (path,) + files[path] not in self._enqueued),
+            key=lambda path: files[path][1]
+        )
+        
+        enqueued = 0
+        for path in pending:
+            if self._stop.is_set():
+                break
+            # 队列积压时等待工作线程消化，再按限定速率入队
+            self.event_handler.queue.put(path, source='reconcile', block=True)
+            self._enqueued.add((path,) + files[path])
+            enqueued += 1
+            self._stop.wait(1 / self.rate)
+        
+        if enqueued:
+            logger.info(f"目录补扫: {len(files)}个图片，{enqueued}个未处理，已加入处理队列")
+        return {'files': len(files), 'prefiltered': len(new_content), 'hashed': len(to_hash),
+                'enqueued': enqueued}
+    
+    def _run(self):
+        """补扫线程主循环：启动时迁移旧版哈希记录并立即扫描一次，之后定期扫描"""
+        try:
+            self.event_handler.handler.migrate_legacy_hashes(list(self._list_images()), self.hash_workers)
+        except Exception as e:
+            logger.error(f"旧版哈希记录迁移异常: {e}", exc_info=True)
+        
+        while not self._stop.is_set():
+            try:
+                self.scan()
+            except Exception as e:
+                logger.error(f"目录补扫异常: {e}", exc_info=True)
+            self._stop.wait(self.interval)
+    
+    def start(self):
+        """启动补扫线程"""
+        self._thread = threading.Thread(target=self._run, name='directory-reconciler', daemon=True)
+        self._thread.start()
+        logger.info(f"目录补扫已启动: 每{self.interval}秒扫描一次，每秒最多入队{self.rate}个")
+    
+    def stop(self):
+        """停止补扫线程"""
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+
 
+def format_queue_stats(stats):
+    """格式化队列指标日志"""
+    return (f"处理队列: 排队{stats['pending']} 处理中{stats['running']} "
+            f"完成{stats['done']} 失败{stats['failed']} "
+            f"最早排队{stats['oldest_pending_seconds']:.0f}秒 "
+            f"平均等待{stats['avg_wait_seconds']:.1f}秒 最长等待{stats['max_wait_seconds']:.1f}秒")
 
-def start_directory_monitor(watch_dir):
+
+def start_directory_monitor(watch_dir, workers=None):
     """
     启动目录监控
     
     Args:
         watch_dir: 监控目录路径
+        workers: 处理队列的工作线程数（默认MaogeConfig.QUEUE_WORKERS）
     """
     # 确保目录存在
     Path(watch_dir).mkdir(parents=True, exist_ok=True)
     
-    # 初始化处理器
-    handler = MaogeImageHandler()
+    # 初始化处理器（常驻服务负责执行反馈后的后台优化，包括其他进程和重启前留下的）
+    handler = MaogeImageHandler(run_pending_optimize=True)
+    
+    # 持久化处理队列（重启后继续处理未完成的图片）
+    queue = WorkQueue(MaogeConfig.DB_PATH, name='directory_images',
+                      max_depth=MaogeConfig.QUEUE_MAX_DEPTH)
     
     # 创建监控器
-    event_handler = ImageDirectoryHandler(handler)
+    event_handler = ImageDirectoryHandler(handler, queue)
+    pool = WorkerPool(queue, event_handler.process_file,
+                      workers=workers or MaogeConfig.QUEUE_WORKERS)
     observer = Observer()
     observer.schedule(event_handler, watch_dir, recursive=False)
+    reconciler = DirectoryReconciler(event_handler, watch_dir)
     
-    # 启动监控
+    # 启动监控（先监听事件再补扫，两者之间写入的图片不会遗漏）
+    pool.start()
     observer.start()
+    reconciler.start()
     logger.info(f"目录监控已启动: {watch_dir}")
     
     # 发送启动通知
@@ -172,11 +415,16 @@ def start_directory_monitor(watch_dir):
     try:
         while True:
             time.sleep(60)
+            stats = queue.stats()
+            if stats['pending'] or stats['running'] or stats['processed_in_window']:
+                logger.info(format_queue_stats(stats))
     except KeyboardInterrupt:
         observer.stop()
         logger.info("目录监控已停止")
     
     observer.join()
+    reconciler.stop()
+    pool.stop()
 
 
 # ==================== 方式B：HTTP服务 ====================
@@ -193,6 +441,7 @@ def start_http_server(port=8888):
     
     app = Flask(__name__)
     handler = MaogeImageHandler()
+    queue = WorkQueue(MaogeConfig.DB_PATH, name='directory_images')
     
     @app.route('/upload', methods=['POST'])
     def upload_image():
@@ -216,8 +465,16 @@ def start_http_server(port=8888):
             file.save(save_path)
             logger.info(f"文件已保存: {save_path}")
             
-            # 处理图片
-            result = handler.process_image(save_path, source='http_upload')
+            # 处理图片（已分析过的图片直接返回原预测ID）
+            result = handler.process_unique_image(save_path, source='http_upload')
+            
+            if result.get('duplicate'):
+                return jsonify({
+                    'success': True,
+                    'duplicate': True,
+                    'prediction_id': result['prediction_id'],
+                    'message': '该图片已分析过，未重复推送'
+                })
             
             if result['success']:
                 # 发送分析结果
@@ -274,6 +531,41 @@ def start_http_server(port=8888):
             logger.error(f"反馈处理异常: {e}", exc_info=True)
             return jsonify({'success': False, 'error': str(e)}), 500
     
+    @app.route('/feedback/batch', methods=['POST'])
+    def feedback_batch():
+        """
+        批量笑脸反馈接口
+        
+        请求体: {"feedbacks": [{"prediction_id": 1, "actual_smile": "buy_smile", "actual_count": 2}, ...]}
+        或 {"text": "1:buy_smile:2, 3:no_smile"}
+        """
+        try:
+            data = request.get_json() or {}
+            
+            feedbacks = data.get('feedbacks')
+            if feedbacks is None and data.get('text'):
+                feedbacks = parse_feedback_text(data['text'])
+            
+            if not feedbacks or not isinstance(feedbacks, list):
+                return jsonify({'success': False, 'error': '缺少反馈列表'}), 400
+            
+            # 一个事务保存全部反馈，只触发一次模型优化
+            results = handler.save_feedbacks(feedbacks)
+            
+            if any(r['success'] for r in results):
+                send_wechat_message(format_feedback_summary(results))
+            
+            return jsonify({
+                'success': all(r['success'] for r in results),
+                'saved': sum(1 for r in results if r['success']),
+                'failed': sum(1 for r in results if not r['success']),
+                'results': results
+            })
+        
+        except Exception as e:
+            logger.error(f"批量反馈处理异常: {e}", exc_info=True)
+            return jsonify({'success': False, 'error': str(e)}), 500
+    
     @app.route('/stats', methods=['GET'])
     def get_stats():
         """获取性能统计"""
@@ -290,6 +582,16 @@ def start_http_server(port=8888):
             logger.error(f"统计查询异常: {e}", exc_info=True)
             return jsonify({'success': False, 'error': str(e)}), 500
     
+    @app.route('/queue', methods=['GET'])
+    def get_queue_stats():
+        """目录监控处理队列指标（深度、等待时间）"""
+        try:
+            return jsonify({'success': True, 'queue': queue.stats()})
+            
+        except Exception as e:
+            logger.error(f"队列查询异常: {e}", exc_info=True)
+            return jsonify({'success': False, 'error': str(e)}), 500
+    
     @app.route('/health', methods=['GET'])
     def health_check():
         """健康检查"""
@@ -331,6 +633,8 @@ def main():
                        help='监控目录路径')
     parser.add_argument('--port', type=int, default=8888,
                        help='HTTP服务端口')
+    parser.add_argument('--workers', type=int, default=None,
+                       help='目录监控处理图片的工作线程数')
     
     args = parser.parse_args()
     
@@ -339,7 +643,7 @@ def main():
     
     if args.mode == 'directory':
         # 只启动目录监控
-        start_directory_monitor(args.watch_dir)
+        start_directory_monitor(args.watch_dir, args.workers)
         
     elif args.mode == 'http':
         # 只启动HTTP服务
@@ -349,7 +653,7 @@ def main():
         # 同时启动两个服务（需要多进程）
         import multiprocessing
         
-        p1 = multiprocessing.Process(target=start_directory_monitor, args=(args.watch_dir,))
+        p1 = multiprocessing.Process(target=start_directory_monitor, args=(args.watch_dir, args.workers))
         p2 = multiprocessing.Process(target=start_http_server, args=(args.port,))
         
         p1.start()
@@ -22,7 +22,8 @@ from werkzeug.utils import secure_filename
 # 添加当前目录到路径
 sys.path.insert(0, os.path.dirname(__file__))
 
-from maoge_image_handler import MaogeImageHandler, send_wechat_message, MaogeConfig
+from maoge_image_handler import (MaogeImageHandler, send_wechat_message, MaogeConfig,
+                                 parse_feedback_text, format_feedback_summary)
 
 # 配置日志
 logging.basicConfig(
@@ -130,8 +131,12 @@ def process_image_message(media_id, pic_url):
         
         logger.info(f"图片已保存: {image_path}")
         
-        # 处理图片
-        result = handler.process_image(image_path, source='wechat_message')
+        # 处理图片（已分析过的图片不再重复分析和推送）
+        result = handler.process_unique_image(image_path, source='wechat_message')
+        
+        if result.get('duplicate'):
+            logger.info(f"图片已分析过，预测ID: {result['prediction_id']}")
+            return
         
         if result['success']:
             # 发送分析结果
@@ -200,8 +205,16 @@ def upload_image():
         else:
             return jsonify({'success': False, 'error': '不支持的请求格式'}), 400
         
-        # 处理图片
-        result = handler.process_image(save_path, source='http_upload')
+        # 处理图片（已分析过的图片直接返回原预测ID）
+        result = handler.process_unique_image(save_path, source='http_upload')
+        
+        if result.get('duplicate'):
+            return jsonify({
+                'success': True,
+                'duplicate': True,
+                'prediction_id': result['prediction_id'],
+                'message': '该图片已分析过，未重复推送'
+            })
         
         if result['success']:
             # 发送分析结果
@@ -260,6 +273,42 @@ def feedback():
         return jsonify({'success': False, 'error': str(e)}), 500
 
 
+@app.route('/feedback/batch', methods=['POST'])
+def feedback_batch():
+    """
+    批量笑脸反馈接口
+    
+    请求体: {"feedbacks": [{"prediction_id": 1, "actual_smile": "buy_smile", "actual_count": 2}, ...]}
+    或 {"text": "1:buy_smile:2, 3:no_smile"}
+    """
+    try:
+        data = request.get_json() or {}
+        
+        feedbacks = data.get('feedbacks')
+        if feedbacks is None and data.get('text'):
+            feedbacks = parse_feedback_text(data['text'])
+        
+        if not feedbacks or not isinstance(feedbacks, list):
+            return jsonify({'success': False, 'error': '缺少反馈列表'}), 400
+        
+        # 一个事务保存全部反馈，只触发一次模型优化
+        results = handler.save_feedbacks(feedbacks)
+        
+        if any(r['success'] for r in results):
+            send_wechat_message(format_feedback_summary(results))
+        
+        return jsonify({
+            'success': all(r['success'] for r in results),
+            'saved': sum(1 for r in results if r['success']),
+            'failed': sum(1 for r in results if not r['success']),
+            'results': results
+        })
+    
+    except Exception as e:
+        logger.error(f"批量反馈处理异常: {e}", exc_info=True)
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
 @app.route('/', methods=['GET'])
 def index():
     """上传页面"""
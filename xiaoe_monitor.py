@@ -27,7 +27,7 @@ import chinese_calendar
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'modules'))
 
-from maoge_image_handler import MaogeImageHandler
+from maoge_image_handler import MaogeImageHandler, send_wechat_message
 
 # 配置日志
 logging.basicConfig(
@@ -47,6 +47,9 @@ class XiaoeMonitor:
     # 圈子URL常量
     QUANZI_URL = "https://quanzi.xiaoe-tech.com/c_6978813bd0343_9o1Xxs5A9981/feed_list"
     
+    # 内容类型对应的去重索引命名空间
+    HISTORY_NAMESPACES = {'image': 'xiaoe_image', 'video': 'xiaoe_video'}
+    
     def __init__(self, phone=None, check_interval=180):
         """
         初始化监控器
@@ -71,12 +74,13 @@ class XiaoeMonitor:
         self.state_file = self.data_dir / "monitor_state.json"
         self.content_db = self.data_dir / "content_history.json"
         
-        # 加载历史记录
-        self.content_history = self._load_content_history()
-        
         # 图文处理器
         self.image_handler = MaogeImageHandler()
         
+        # 已下载内容记录在共用的去重索引中
+        self.dedup = self.image_handler.dedup
+        self._import_content_history()
+        
         # 交易时间配置
         self.trading_start = "09:30"  # 交易开始时间
         self.trading_end = "15:00"    # 交易结束时间
@@ -86,24 +90,20 @@ class XiaoeMonitor:
         logger.info(f"交易时间: {self.trading_start} - {self.trading_end}")
         logger.info(f"检查间隔: {check_interval}秒 ({check_interval/60}分钟)")
     
-    def _load_content_history(self):
-        """加载内容历史记录"""
-        if self.content_db.exists():
-            try:
-                with open(self.content_db, 'r', encoding='utf-8') as f:
-                    return json.load(f)
-            except Exception as e:
-                logger.error(f"加载内容历史失败: {e}")
-                return {"images": {}, "videos": {}}
-        return {"images": {}, "videos": {}}
-    
-    def _save_content_history(self):
-        """保存内容历史记录"""
+    def _import_content_history(self):
+        """把旧版的content_history.json导入去重索引（只导入一次）"""
+        if not self.content_db.exists():
+            return
+        
         try:
-            with open(self.content_db, 'w', encoding='utf-8') as f:
-                json.dump(self.content_history, f, ensure_ascii=False, indent=2)
+            self.dedup.import_json_history(
+                str(self.content_db),
+                {'images': self.HISTORY_NAMESPACES['image'], 'videos': self.HISTORY_NAMESPACES['video']},
+                source='xiaoe_monitor'
+            )
+            self.content_db.rename(self.content_db.with_name(self.content_db.name + '.imported'))
         except Exception as e:
-            logger.error(f"保存内容历史失败: {e}")
+            logger.error(f"导入内容历史失败: {e}")
     
     def login(self, page):
         """
@@ -265,10 +265,12 @@ class XiaoeMonitor:
                             content_type = content_info['type']
                             
                             # 检查是否是新内容
-                            if content_type == 'image' and content_id not in self.content_history['images']:
+                            is_new = not self.dedup.is_processed(
+                                content_id, self.HISTORY_NAMESPACES[content_type])
+                            if content_type == 'image' and is_new:
                                 new_content['images'].append(content_info)
                                 logger.info(f"🆕 发现新图文: {content_info['title']}")
-                            elif content_type == 'video' and content_id not in self.content_history['videos']:
+                            elif content_type == 'video' and is_new:
                                 new_content['videos'].append(content_info)
                                 logger.info(f"🆕 发现新视频: {content_info['title']}")
                     
@@ -364,13 +366,13 @@ class XiaoeMonitor:
                 # 下载视频
                 self._download_video(page, content_info)
             
-            # 记录到历史
-            history_key = 'images' if content_info['type'] == 'image' else 'videos'
-            self.content_history[history_key][content_info['id']] = {
-                'title': content_info['title'],
-                'downloaded_at': datetime.now().isoformat()
-            }
-            self._save_content_history()
+            # 记录到去重索引
+            self.dedup.record(
+                content_info['id'],
+                namespace=self.HISTORY_NAMESPACES[content_info['type']],
+                source='xiaoe_monitor',
+                title=content_info['title']
+            )
             
         except Exception as e:
             logger.error(f"下载内容失败: {e}")
@@ -457,11 +459,12 @@ class XiaoeMonitor:
                 title=content_info['title']
             )
             
-            if result:
+            if result.get('success'):
                 logger.info("✅ 图文分析完成")
-                logger.info(f"分析结果: {result}")
+                logger.info(f"吞吐量: {result['throughput']}")
+                send_wechat_message(result['message'])
             else:
-                logger.warning("⚠️ 图文分析未返回结果")
+                logger.warning(f"⚠️ 图文分析失败: {result.get('error')}")
         
         except Exception as e:
             logger.error(f"分析图文失败: {e}")